@@ -9,207 +9,419 @@ Optimisé pour LM Studio + modèle Qwen2-VL-7B-Instruct
 
 import requests
 import json
-import base64
+import os
 import sys
 import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
 from pathlib import Path
 
+from cv_capabilities import LMSTUDIO, CapabilityRegistry
+from cv_cascade import StageStats, escalation_reason, parse_analysis
+from cv_deadline import current_deadline, deadline_scope, request_timeout
+from cv_hedge import hedged_call
+from cv_image import LOW_RES_PIXELS, downscale_image
+from cv_ocr_quality import DEFAULT_THRESHOLD, score_ocr_text
+from cv_microbatch import BATCH_OCR_PROMPT, DEFAULT_PACK_SIZE, plan_packs, split_batched_output
+from cv_narrative import SCORES_OUTPUT_TOKENS, scores_prompt
+from cv_payload import IMAGE_PLACEHOLDER, StreamingChatBody, image_placeholder
+from cv_salvage import continuation_for, recover_analysis
+from cv_scheduler import NORMAL, PRIORITY_HEADER, normalize_priority
+from cv_tiles import split_layout
+from cv_tokens import (ANALYSIS_OUTPUT_TOKENS, OCR_TOKENS_PER_PAGE, PromptAssembler,
+                       estimate_tokens, image_tokens_for)
+from cv_tuning import GenerationProfile
+
+# Prompt OCR optimisé pour Qwen2-VL
+OCR_PROMPT = """Extrait tout le texte de l'image et respecte la mise en forme originale. Pas d'introduction ni conclusion , extraction de texte seulement. Ne rate aucun mot."""
+
+# Gabarit du prompt d'analyse RH (str.format : {job_summary}, {cv_summary})
+ANALYSIS_PROMPT = """Vous êtes un expert RH très exigeant. 
+Votre mission : analyser le CV en fonction de l’offre d’emploi fournie.
+
+
+⚠️ Règles strictes :
+- Le JSON doit contenir **exactement et uniquement** les champs suivants, sans en ajouter d'autres.
+- Les champs numériques doivent rester des nombres (pas de texte).
+- Les détails et explications doivent être intégrés **uniquement** dans les champs texte comme "commentaires" ou "experience_pertinente".
+- N'utilisez pas de sous-objets ou de champs imbriqués.
+
+Champs attendus dans le JSON final :
+{{
+  "nom_prenom": "Nom et prénom du candidat (extrait du CV)",
+  "score_technique": [nombre sur 40],
+  "score_experience": [nombre sur 30],
+  "score_formation": [nombre sur 15],
+  "score_soft_skills": [nombre sur 15],
+  "score_global": [nombre sur 100],
+  "points_forts": ["liste des points forts du candidat"],
+  "points_faibles": ["liste des points faibles ou manques"],
+  "competences_matchees": ["compétences qui correspondent à l'offre"],
+  "competences_manquantes": ["compétences requises mais absentes"],
+  "experience_pertinente": "description détaillée de l'expérience pertinente", 
+  "recommandation": "Recommandé / À considérer / Non recommandé",
+  "commentaires": "analyse détaillée du profil",
+  "methode_analyse": "Qwen2-VL"
+}}
+
+Critères de notation :
+- Compétences techniques requises : 40 points max
+- Expérience pertinente : 30 points max
+- Formation et qualifications : 15 points max
+- Compétences soft skills : 15 points max
+POSTE: {job_summary}
+CV: {cv_summary}
+"""
+
+# Notation seule : champs rédigés retirés (détail à la demande, cf. cv_narrative.py)
+SCORES_ANALYSIS_PROMPT = scores_prompt(ANALYSIS_PROMPT)
+
+
 class CVAnalyzer:
-    def __init__(self, base_url="http://localhost:1234/v1"):
+    def __init__(self, base_url="http://localhost:1234/v1", scheduler=None, priority=NORMAL, registry=None,
+                 ocr_low_res_pixels=LOW_RES_PIXELS, ocr_quality_threshold=DEFAULT_THRESHOLD,
+                 ocr_tiles=False, ocr_tile_workers=4, ocr_model=None,
+                 analysis_url=None, analysis_model=None, cascade_model=None, hedger=None, profile=None,
+                 scores_only=False, analysis_scheduler=None):
         """
         Analyseur CV utilisant LM Studio avec Qwen2-VL
         Port par défaut LM Studio: 1234
+        ocr_low_res_pixels : taille de la première passe OCR (None = pleine résolution directe)
+        ocr_tiles          : découper les CV multi-colonnes en zones lues en parallèle (cv_tiles.py)
+        ocr_model          : modèle vision de l'OCR (défaut : Qwen2-VL chargé)
+        analysis_url       : serveur de l'analyse RH (défaut : celui de l'OCR)
+        analysis_model     : modèle de l'analyse RH (défaut : le modèle de l'OCR)
+        cascade_model      : petit modèle texte essayé d'abord, le grand modèle
+                             n'est appelé que si sa réponse est douteuse (cv_cascade.py)
+        hedger             : appels OCR lents doublés sur un serveur de secours (cv_hedge.py)
+        profile            : réglages de génération (cv_tuning.py, défaut : valeurs historiques)
+        scores_only        : analyse RH réduite au nom, aux scores et à la recommandation
+                             (détail rédigé à la demande, cf. cv_narrative.py)
+        analysis_scheduler : ordonnanceur du serveur d'analyse (défaut : celui de l'OCR)
         """
         self.base_url = base_url
-        self.headers = {"Content-Type": "application/json"}
+        self.scheduler = scheduler
+        self.analysis_scheduler = analysis_scheduler or scheduler
+        self.priority = normalize_priority(priority)
+        self.headers = {"Content-Type": "application/json", PRIORITY_HEADER: self.priority}
+        self.registry = registry or CapabilityRegistry(base_url, backend=LMSTUDIO)
+        self.ocr_low_res_pixels = ocr_low_res_pixels
+        self.ocr_quality_threshold = ocr_quality_threshold
+        self.ocr_tiles = ocr_tiles
+        self.ocr_tile_workers = max(1, ocr_tile_workers)
+        self.ocr_stats = {"low_res": 0, "high_res_retry": 0, "full_res": 0, "tiled": 0,
+                          "batched": 0, "batch_fallback": 0}
+        self.ocr_model = ocr_model
+        self.analysis_url = analysis_url or base_url
+        self.analysis_registry = (self.registry if self.analysis_url == base_url
+                                  else CapabilityRegistry(self.analysis_url, backend=LMSTUDIO))
+        self.analysis_model = analysis_model
+        self.cascade_model = cascade_model
+        self.stage_stats = StageStats()
+        self.hedger = hedger
+        self.profile = profile or GenerationProfile()
+        if self.profile.image_pixels:
+            self.ocr_low_res_pixels = self.profile.image_pixels
+        self.scores_only = scores_only
         
+    def _model_slot(self, kind="ocr", scheduler=None):
+        """
+        Créneau d'appel modèle (ordonnanceur de priorité si configuré, kind : type d'appel)
+        Produit le ticket du créneau (None sans ordonnanceur) : l'appelant y signale un échec HTTP
+        scheduler : ordonnanceur d'un autre serveur (défaut : celui de l'OCR)
+        """
+        scheduler = scheduler or self.scheduler
+        if scheduler is None:
+            return nullcontext()
+        return scheduler.slot(self.priority, kind)
+
+    def _vision_model(self):
+        """Modèle vision à utiliser (configuré, sinon Qwen2-VL de préférence), None si aucun"""
+        if self.ocr_model:
+            return self.registry.get(self.ocr_model)
+        return self.registry.pick(vision=True, prefer=("qwen2", "vl"))
+    
+    def _analysis_model(self, model_id):
+        """Capacités d'un modèle texte configuré (None si le serveur ne le déclare pas)"""
+        return self.analysis_registry.get(model_id)
+
     def check_connection(self):
-        """Vérifier LM Studio et modèle Qwen2-VL"""
+        """Vérifier LM Studio et modèle Qwen2-VL (capacités en cache, cf. cv_capabilities.py)"""
         print("🔍 Vérification de la connexion LM Studio...")
-        try:
-            response = requests.get(f"{self.base_url}/models", timeout=5)
-            if response.status_code == 200:
-                models = response.json()
-                model_names = [model['id'] for model in models.get('data', [])]
-                
-                print("✅ LM Studio connecté")
-                
-                # Vérifier Qwen2-VL
-                qwen_models = [m for m in model_names if 'qwen2' in m.lower() and 'vl' in m.lower()]
-                if qwen_models:
-                    print(f"🎯 Qwen2-VL détecté: {qwen_models[0]}")
-                    return True
-                else:
-                    print("⚠️ Qwen2-VL non chargé")
-                    print("💡 Chargez Qwen2-VL-7B-Instruct dans LM Studio")
-                    return False
-            return False
-        except Exception as e:
-            print(f"❌ Erreur connexion: {e}")
+        model = self._vision_model()
+        if model:
+            print("✅ LM Studio connecté")
+            print(f"🎯 Modèle vision: {model.id} (contexte {model.context_length} tokens)")
+            if self.analysis_model or self.cascade_model or self.analysis_url != self.base_url:
+                cascade = f", petit modèle {self.cascade_model} d'abord" if self.cascade_model else ""
+                print(f"📊 Analyse RH: {self.analysis_model or model.id} sur {self.analysis_url}{cascade}")
+            return True
+        if self.registry.models():
+            print("✅ LM Studio connecté")
+            print("⚠️ Qwen2-VL non chargé")
+            print("💡 Chargez Qwen2-VL-7B-Instruct dans LM Studio")
+        else:
             print("💡 Démarrez Local Server dans LM Studio")
-            return False
+        return False
     
     def extract_cv_text(self, image_path):
         """
         Extraction OCR professionnelle avec Qwen2-VL
-        Précision maximale pour les CV
+        Première passe en basse résolution, relecture en pleine résolution
+        seulement si la qualité du texte obtenu est insuffisante
         """
         print("🔍 Extraction OCR...")
         
-        # Encoder l'image
+        if self.ocr_tiles:
+            extracted_text = self._ocr_tiled(image_path)
+            if extracted_text:
+                print(f"🎯 Qualité OCR: {score_ocr_text(extracted_text).summary()}")
+                return extracted_text
+        
+        low_res = None
+        if self.ocr_low_res_pixels:
+            try:
+                low_res = downscale_image(image_path, self.ocr_low_res_pixels)
+            except Exception as e:
+                print(f"⚠️ Réduction impossible ({e}), lecture en pleine résolution")
+        
+        if low_res is not None:
+            extracted_text = self._ocr_pass(low_res, "basse résolution")
+            if extracted_text:
+                quality = score_ocr_text(extracted_text)
+                print(f"🎯 Qualité OCR: {quality.summary()}")
+                if quality.score >= self.ocr_quality_threshold:
+                    print("✅ Extraction de haute qualité")
+                    self.ocr_stats["low_res"] += 1
+                    return extracted_text
+                print("⚠️ Qualité insuffisante, relecture en pleine résolution")
+            self.ocr_stats["high_res_retry"] += 1
+        else:
+            self.ocr_stats["full_res"] += 1
+        
+        extracted_text = self._ocr_pass(image_path, "pleine résolution")
+        if extracted_text:
+            quality = score_ocr_text(extracted_text)
+            print(f"🎯 Qualité OCR: {quality.summary()}")
+            if quality.score >= self.ocr_quality_threshold:
+                print("✅ Extraction de haute qualité")
+            else:
+                print("⚠️ Extraction partielle")
+        return extracted_text
+    
+    def _ocr_tiled(self, image_path):
+        """
+        OCR par zones (colonnes, blocs) lues en parallèle puis recollées dans l'ordre de lecture.
+        None si la page ne se découpe pas ou si une zone échoue (lecture de la page entière)
+        """
         try:
-            with open(image_path, "rb") as image_file:
-                base64_image = base64.b64encode(image_file.read()).decode('utf-8')
+            tiles = split_layout(image_path)
         except Exception as e:
-            print(f"❌ Erreur lecture image: {e}")
+            print(f"⚠️ Découpage impossible ({e})")
+            return None
+        if len(tiles) < 2:
+            print("🧩 Mise en page simple, lecture de la page entière")
+            return None
+        
+        print(f"🧩 {len(tiles)} zones lues en parallèle")
+        start_time = time.time()
+        # Les threads des zones reprennent l'échéance du CV
+        deadline = current_deadline()
+        
+        def read_tile(item):
+            with deadline_scope(deadline):
+                return self._ocr_pass(item[1], f"zone {item[0] + 1}/{len(tiles)}")
+        
+        with ThreadPoolExecutor(max_workers=min(self.ocr_tile_workers, len(tiles))) as pool:
+            texts = list(pool.map(read_tile, enumerate(tiles)))
+        if any(text is None for text in texts):
+            print("⚠️ Zone(s) en échec, lecture de la page entière")
             return None
         
-        # Prompt OCR optimisé pour Qwen2-VL
-        ocr_prompt = """Extrait tout le texte de l'image et respecte la mise en forme originale. Pas d'introduction ni conclusion , extraction de texte seulement. Ne rate aucun mot."""
+        self.ocr_stats["tiled"] += 1
+        extracted_text = "\n\n".join(text.strip() for text in texts if text.strip())
+        print(f"⚡ OCR par zones terminé: {time.time() - start_time:.1f}s")
+        return extracted_text
+    
+    def extract_cv_texts(self, image_paths, pack_size=DEFAULT_PACK_SIZE):
+        """
+        OCR de plusieurs CV : les petits CV d'une page sont lus par micro-lots
+        de `pack_size` images par requête (cv_microbatch.py), les autres un par un.
+        Renvoie {chemin: texte ou None}
+        """
+        model = self._vision_model()
+        packs = plan_packs(image_paths, pack_size, model.context_length if model and model.context_known else None)
+        texts = {}
+        for pack in packs:
+            if len(pack) > 1:
+                print(f"📚 Micro-lot OCR: {len(pack)} CV en une requête")
+                prompt = BATCH_OCR_PROMPT.format(count=len(pack))
+                sections = split_batched_output(
+                    self._ocr_pass(pack, f"micro-lot de {len(pack)}", prompt=prompt,
+                                   expected_tokens=OCR_TOKENS_PER_PAGE * len(pack)),
+                    len(pack)
+                )
+                if sections:
+                    self.ocr_stats["batched"] += len(pack)
+                    texts.update(zip(pack, sections))
+                    continue
+                print("⚠️ Réponse du micro-lot incohérente, lecture CV par CV")
+                self.ocr_stats["batch_fallback"] += 1
+            for path in pack:
+                texts[path] = self.extract_cv_text(path)
+        return texts
+    
+    def _ocr_pass(self, image, label, prompt=OCR_PROMPT, expected_tokens=OCR_TOKENS_PER_PAGE):
+        """
+        Un appel OCR sur une image (chemin ou octets JPEG), ou sur une liste
+        d'images (micro-lot), renvoie le texte ou None
+        """
+        images = image if isinstance(image, list) else [image]
+        markers = ([image_placeholder(i) for i in range(len(images))] if isinstance(image, list)
+                   else [IMAGE_PLACEHOLDER])
 
+        model = self._vision_model()
+        # Sortie réduite seulement si les images ne laissent pas la place dans un contexte connu
+        prompt_tokens = estimate_tokens(prompt) + sum(image_tokens_for(img) for img in images)
+        max_tokens = PromptAssembler(model).output_budget(expected_tokens, prompt_tokens)
         payload = {
-            "model": "auto",
+            "model": model.id if model else (self.ocr_model or "auto"),
             "messages": [
                 {
                     "role": "user",
-                    "content": [
-                        {"type": "text", "text": ocr_prompt},
+                    "content": [{"type": "text", "text": prompt}] + [
                         {
                             "type": "image_url", 
-                            "image_url": {"url": f"data:image/jpeg;base64,{base64_image}"}
+                            "image_url": {"url": f"data:image/jpeg;base64,{marker}"}
                         }
+                        for marker in markers
                     ]
                 }
             ],
-            "max_tokens": 2000,
-            "temperature": 0.05,  # Maximum de précision
-            "top_p": 0.8
+            "max_tokens": max_tokens,
+            "temperature": self.profile.ocr_temperature,  # Maximum de précision
+            "top_p": self.profile.ocr_top_p
         }
         
+        # Corps JSON produit en flux depuis le fichier (pas de copie base64 complète en mémoire)
+        try:
+            body = StreamingChatBody(payload, image)
+        except Exception as e:
+            print(f"❌ Erreur lecture image: {e}")
+            return None
+        
+        kind = "ocr" if len(images) == 1 else "ocr_batch"
         start_time = time.time()
         
         try:
-            response = requests.post(
-                f"{self.base_url}/chat/completions",
-                headers=self.headers,
-                json=payload,
-                timeout=150
-            )
+            with self._model_slot(kind) as ticket:
+                response = hedged_call(self.hedger, kind, self.base_url, lambda url, session: session.post(
+                    f"{url}/chat/completions",
+                    headers=self.headers,
+                    data=body,
+                    timeout=request_timeout(150)
+                ))
+                if ticket is not None:
+                    # Erreur serveur : signe de saturation pour la limite adaptative
+                    ticket.ok = response.status_code < 500
             
             duration = time.time() - start_time
+            self.stage_stats.record(kind, duration, ok=response.status_code == 200)
             
             if response.status_code == 200:
                 result = response.json()
                 extracted_text = result['choices'][0]['message']['content']
                 
-                print(f"⚡ OCR terminé: {duration:.1f}s")
+                print(f"⚡ OCR terminé ({label}): {duration:.1f}s")
                 print(f"📊 Texte extrait: {len(extracted_text)} caractères")
                 
-                # Validation qualité
-                quality_indicators = {
-                    "Nom détecté": any(name in extracted_text.lower() for name in ['aymane', 'abounay']),
-                    "Email trouvé": '@' in extracted_text and '.com' in extracted_text,
-                    "Téléphone trouvé": any(char.isdigit() for char in extracted_text),
-                    "Compétences tech": any(tech in extracted_text.lower() for tech in ['python', 'django', 'react', 'javascript']),
-                    "Formation mentionnée": any(word in extracted_text.lower() for word in ['école', 'université', 'formation', 'ingénieur'])
-                }
-                
-                quality_score = sum(quality_indicators.values())
-                print(f"🎯 Qualité OCR: {quality_score}/5")
-                
-                if quality_score >= 4:
-                    print("✅ Extraction de haute qualité")
-                else:
-                    print("⚠️ Extraction partielle")
-                
                 return extracted_text
             else:
                 print(f"❌ Erreur HTTP: {response.status_code}")
+                self.registry.invalidate()
                 return None
                 
         except Exception as e:
+            self.stage_stats.record(kind, time.time() - start_time, ok=False)
             print(f"❌ Erreur OCR: {e}")
+            self.registry.invalidate()
             return None
     
     def analyze_cv_rh(self, cv_text, job_offer):
         """
         Analyse RH professionnelle du CV
         Évaluation objective basée sur le contenu réel
+        Avec cascade_model : petit modèle d'abord, grand modèle si la réponse est douteuse
         """
         print("📊 Analyse RH...")
         
-        # Optimiser les longueurs pour éviter timeouts
-        job_summary = job_offer[:400] if len(job_offer) > 400 else job_offer
-        cv_summary = cv_text[:1500] if len(cv_text) > 1500 else cv_text
+        if not self.cascade_model:
+            return self._analysis_call(cv_text, job_offer, self.analysis_model, "analysis")
+        
+        raw = self._analysis_call(cv_text, job_offer, self.cascade_model, "analysis_small")
+        reason = escalation_reason(parse_analysis(raw))
+        self.stage_stats.cascade(reason)
+        if reason is None:
+            return raw
+        print(f"🪜 Escalade vers le grand modèle ({reason})")
+        return self._analysis_call(cv_text, job_offer, self.analysis_model, "analysis_large") or raw
+    
+    def _analysis_call(self, cv_text, job_offer, model_id, stage):
+        """Un appel d'analyse RH sur le modèle `model_id` (None = modèle de l'OCR)"""
+        if model_id:
+            model = self._analysis_model(model_id)
+        else:
+            # Même modèle que l'OCR : évite un changement de modèle côté LM Studio
+            model = self._vision_model() if self.analysis_registry is self.registry else None
+        
+        # CV et offre ajustés au contexte du modèle (au lieu d'une coupe fixe en caractères)
+        assembled = PromptAssembler(model).fit(
+            SCORES_ANALYSIS_PROMPT if self.scores_only else ANALYSIS_PROMPT,
+            {"job_summary": self.profile.clip_offer(job_offer), "cv_summary": self.profile.clip_cv(cv_text)},
+            expected_output=self.profile.output_tokens(
+                SCORES_OUTPUT_TOKENS if self.scores_only else ANALYSIS_OUTPUT_TOKENS)
+        )
+        if assembled.truncated:
+            print(f"✂️ Raccourci pour tenir dans le contexte: {assembled.truncated} tokens")
         
-        analysis_prompt = f"""Vous êtes un expert RH très exigeant. 
-Votre mission : analyser le CV en fonction de l’offre d’emploi fournie.
-
-
-⚠️ Règles strictes :
-- Le JSON doit contenir **exactement et uniquement** les champs suivants, sans en ajouter d'autres.
-- Les champs numériques doivent rester des nombres (pas de texte).
-- Les détails et explications doivent être intégrés **uniquement** dans les champs texte comme "commentaires" ou "experience_pertinente".
-- N'utilisez pas de sous-objets ou de champs imbriqués.
-
-Champs attendus dans le JSON final :
-{{
-  "nom_prenom": "Nom et prénom du candidat (extrait du CV)",
-  "score_technique": [nombre sur 40],
-  "score_experience": [nombre sur 30],
-  "score_formation": [nombre sur 15],
-  "score_soft_skills": [nombre sur 15],
-  "score_global": [nombre sur 100],
-  "points_forts": ["liste des points forts du candidat"],
-  "points_faibles": ["liste des points faibles ou manques"],
-  "competences_matchees": ["compétences qui correspondent à l'offre"],
-  "competences_manquantes": ["compétences requises mais absentes"],
-  "experience_pertinente": "description détaillée de l'expérience pertinente", 
-  "recommandation": "Recommandé / À considérer / Non recommandé",
-  "commentaires": "analyse détaillée du profil",
-  "methode_analyse": "Qwen2-VL"
-}}
-
-Critères de notation :
-- Compétences techniques requises : 40 points max
-- Expérience pertinente : 30 points max
-- Formation et qualifications : 15 points max
-- Compétences soft skills : 15 points max
-POSTE: {job_summary}
-CV: {cv_summary}
-"""
-
         payload = {
-            "model": "auto",
-            "messages": [{"role": "user", "content": analysis_prompt}],
-            "max_tokens": 800,
-            "temperature": 0.1,
-            "top_p": 0.9
+            "model": model.id if model else (model_id or "auto"),
+            "messages": [{"role": "user", "content": assembled.prompt}],
+            "max_tokens": assembled.max_tokens,
+            "temperature": self.profile.temperature,
+            "top_p": self.profile.top_p
         }
         
         start_time = time.time()
         
         try:
-            response = requests.post(
-                f"{self.base_url}/chat/completions",
-                headers=self.headers,
-                json=payload,
-                timeout=120
-            )
+            with self._model_slot(stage, self.analysis_scheduler) as ticket:
+                response = requests.post(
+                    f"{self.analysis_url}/chat/completions",
+                    headers=self.headers,
+                    json=payload,
+                    timeout=request_timeout(120)
+                )
+                if ticket is not None:
+                    ticket.ok = response.status_code < 500
             
             duration = time.time() - start_time
+            self.stage_stats.record(stage, duration, ok=response.status_code == 200)
             
             if response.status_code == 200:
                 result = response.json()
                 analysis_result = result['choices'][0]['message']['content']
-                print(f"⚡ Analyse terminée: {duration:.1f}s")
+                print(f"⚡ Analyse terminée ({payload['model']}): {duration:.1f}s")
                 return analysis_result
             else:
                 print(f"❌ Erreur HTTP: {response.status_code}")
+                self.analysis_registry.invalidate()
                 return None
                 
         except Exception as e:
+            self.stage_stats.record(stage, time.time() - start_time, ok=False)
             print(f"❌ Erreur analyse: {e}")
+            self.analysis_registry.invalidate()
             return None
     
     def save_results(self, cv_text, analysis_json, image_name):
@@ -308,38 +520,27 @@ CV: {cv_summary}
             return False
         
         # Étape 3: Traitement des résultats
-        try:
-            # Parser le JSON de l'analyse
-            json_start = analysis_raw.find('{')
-            json_end = analysis_raw.rfind('}') + 1
-            
-            if json_start != -1 and json_end != -1:
-                json_str = analysis_raw[json_start:json_end]
-                analysis_json = json.loads(json_str)
-                
-                total_time = time.time() - total_start
-                
-                # Affichage des résultats
-                self.display_results(analysis_json)
-                
-                # Sauvegarde
-                text_file, json_file = self.save_results(cv_text, analysis_json, image_path)
-                
-                print(f"\n🚀 ANALYSE TERMINÉE EN {total_time:.1f}s")
-                print("🎉 Votre GPU AMD RX 6700 XT a travaillé efficacement !")
-                
-                return True
-            else:
-                print("❌ Format JSON invalide dans la réponse")
-                print("Réponse brute:")
-                print(analysis_raw)
-                return False
-                
-        except json.JSONDecodeError as e:
-            print(f"❌ Erreur parsing JSON: {e}")
+        # JSON tronqué réparé, champs obligatoires manquants complétés par un appel texte
+        analysis_json = recover_analysis(analysis_raw, continuation_for(self), context=cv_text)
+        if analysis_json is None:
+            print("❌ Format JSON invalide dans la réponse")
             print("Réponse brute:")
             print(analysis_raw)
             return False
+        
+        total_time = time.time() - total_start
+        
+        # Affichage des résultats
+        self.display_results(analysis_json)
+        
+        # Sauvegarde
+        text_file, json_file = self.save_results(cv_text, analysis_json, image_path)
+        
+        print(f"\n🚀 ANALYSE TERMINÉE EN {total_time:.1f}s")
+        print(f"⏱️ Étapes: {self.stage_stats.summary()}")
+        print("🎉 Votre GPU AMD RX 6700 XT a travaillé efficacement !")
+        
+        return True
 
 def main():
     """Interface principale"""
@@ -360,6 +561,12 @@ def main():
         print("• LM Studio ouvert avec Local Server actif")
         print("• Modèle Qwen2-VL-7B-Instruct chargé")
         print("• GPU AMD détecté et utilisé")
+        print("\n🚦 OPTIONS (variables d'environnement):")
+        print("• CV_BASE_URL : URL du serveur (ex: proxy cv_scheduler.py)")
+        print("• CV_PRIORITY : interactive / normal / bulk")
+        print("• CV_OCR_TILES=1 : OCR par zones en parallèle (CV multi-colonnes, Pillow requis)")
+        print("• CV_OCR_MODEL / CV_ANALYSIS_MODEL / CV_ANALYSIS_URL : modèle et serveur par étape")
+        print("• CV_CASCADE_MODEL : petit modèle texte essayé avant le grand pour l'analyse RH")
         print("\n💡 AVANTAGES:")
         print("• OCR haute précision pour CV")
         print("• Analyse RH objective et détaillée")
@@ -375,7 +582,15 @@ def main():
     
     # Lancement de l'analyse
     print("DEBUG: Création de l'analyzer...")
-    analyzer = CVAnalyzer()
+    analyzer = CVAnalyzer(
+        base_url=os.environ.get("CV_BASE_URL", "http://localhost:1234/v1"),
+        priority=os.environ.get("CV_PRIORITY", NORMAL),
+        ocr_tiles=os.environ.get("CV_OCR_TILES") == "1",
+        ocr_model=os.environ.get("CV_OCR_MODEL"),
+        analysis_url=os.environ.get("CV_ANALYSIS_URL"),
+        analysis_model=os.environ.get("CV_ANALYSIS_MODEL"),
+        cascade_model=os.environ.get("CV_CASCADE_MODEL")
+    )
     print("DEBUG: Lancement de l'analyse...")
     success = analyzer.analyze_cv_complete(image_path, job_offer)
     
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+🗜️ LECTURE DE CV DIRECTEMENT DANS LES ARCHIVES (ZIP / TAR)
+
+Les exports de l'ATS arrivent en zip ou tar de milliers de fichiers.
+Plutôt que de tout extraire sur disque, les membres sont lus un par un
+et leurs octets passent directement aux analyseurs (réduction, tuiles,
+encodage base64 en flux acceptent des octets en mémoire).
+
+- zip : index central lu une fois, chaque membre décompressé à la demande
+- tar, tar.gz, tar.bz2, tar.xz : lecture séquentielle en flux (mode "r|*"),
+  sans retour en arrière
+- membres ignorés : dossiers, extensions non prises en charge, fichiers
+  système (__MACOSX, ._*), membres trop gros, membres illisibles
+- chaque CV est référencé par "archive.zip::dossier/cv.jpg" dans le
+  journal et le rapport
+
+Seuls les membres en cours de traitement sont en mémoire (BatchRunner
+borne leur nombre à deux par worker) : un export de 5 Go se traite sans
+espace disque supplémentaire et avec une mémoire constante.
+
+Usage:
+python cv_batch.py export_ats.zip "Développeur Python Junior"
+python cv_archive.py export_ats.tar.gz          # contenu pris en compte / ignoré
+"""
+import argparse
+import hashlib
+import tarfile
+import zipfile
+from pathlib import Path
+from typing import Dict, Iterator, NamedTuple
+
+from cv_image import image_format
+
+# Séparateur archive / membre dans les références de CV
+MEMBER_SEP = "::"
+ARCHIVE_SUFFIXES = (".zip", ".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tbz2", ".tar.xz", ".txz")
+# Au-delà, un membre n'est pas un CV (et ne doit pas être chargé en mémoire)
+MAX_MEMBER_BYTES = 50 * 1024 * 1024
+CV_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp"}
+
+
+class ArchiveMember(NamedTuple):
+    ref: str
+    name: str
+    data: bytes
+
+    @property
+    def sha256(self) -> str:
+        return hashlib.sha256(self.data).hexdigest()
+
+
+def is_archive(path) -> bool:
+    name = str(path).lower()
+    return Path(path).is_file() and name.endswith(ARCHIVE_SUFFIXES)
+
+
+def member_ref(archive, name: str) -> str:
+    """Référence d'un CV d'archive dans le journal et les rapports"""
+    return f"{archive}{MEMBER_SEP}{name}"
+
+
+def output_name(ref: str) -> str:
+    """Nom servant aux fichiers de résultats : le membre seul (":" interdit dans un nom Windows)"""
+    return ref.rsplit(MEMBER_SEP, 1)[-1]
+
+
+class ArchiveReader:
+    def __init__(self, path: str, extensions=CV_EXTENSIONS, max_member_bytes: int = MAX_MEMBER_BYTES):
+        """
+        Parcours paresseux des CV d'une archive
+        extensions       : extensions de membres retenues
+        max_member_bytes : taille maximale d'un membre chargé en mémoire
+        """
+        self.path = str(path)
+        self.extensions = {e.lower() for e in extensions}
+        self.max_member_bytes = max_member_bytes
+        self.stats: Dict[str, int] = {"members": 0, "cv": 0, "extension": 0, "size": 0, "unreadable": 0}
+
+    def __iter__(self) -> Iterator[ArchiveMember]:
+        if self.path.lower().endswith(".zip"):
+            return self._iter_zip()
+        return self._iter_tar()
+
+    def _keep(self, name: str, size: int) -> bool:
+        """Membre à traiter ? (compte la raison sinon)"""
+        self.stats["members"] += 1
+        base = name.rsplit("/", 1)[-1]
+        if name.startswith("__MACOSX/") or base.startswith(".") or Path(base).suffix.lower() not in self.extensions:
+            self.stats["extension"] += 1
+            return False
+        if size > self.max_member_bytes:
+            self.stats["size"] += 1
+            print(f"⚠️ Membre ignoré (trop gros, {size / 1e6:.0f} Mo): {name}")
+            return False
+        return True
+
+    def _member(self, name: str, data: bytes):
+        if image_format(data[:16]) == "inconnu":
+            # Extension d'image mais contenu d'autre chose
+            self.stats["unreadable"] += 1
+            return None
+        self.stats["cv"] += 1
+        return ArchiveMember(member_ref(self.path, name), name, data)
+
+    def _iter_zip(self) -> Iterator[ArchiveMember]:
+        with zipfile.ZipFile(self.path) as zf:
+            for info in zf.infolist():
+                if info.is_dir() or not self._keep(info.filename, info.file_size):
+                    continue
+                try:
+                    with zf.open(info) as f:
+                        data = f.read(self.max_member_bytes + 1)
+                except (zipfile.BadZipFile, RuntimeError, OSError) as e:
+                    # Membre corrompu ou chiffré
+                    self.stats["unreadable"] += 1
+                    print(f"⚠️ Membre illisible {info.filename}: {e}")
+                    continue
+                member = self._member(info.filename, data)
+                if member:
+                    yield member
+
+    def _iter_tar(self) -> Iterator[ArchiveMember]:
+        # Mode flux : les membres sont lus dans l'ordre, l'archive n'est jamais chargée entière
+        with tarfile.open(self.path, mode="r|*") as tar:
+            for info in tar:
+                if not info.isfile() or not self._keep(info.name, info.size):
+                    continue
+                f = tar.extractfile(info)
+                if f is None:
+                    self.stats["unreadable"] += 1
+                    continue
+                member = self._member(info.name, f.read())
+                if member:
+                    yield member
+
+    def summary(self) -> str:
+        s = self.stats
+        skipped = s["extension"] + s["size"] + s["unreadable"]
+        return (f"{s['cv']} CV sur {s['members']} membres ({skipped} ignorés : {s['extension']} extension, "
+                f"{s['size']} taille, {s['unreadable']} illisibles)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="CV contenus dans une archive zip / tar")
+    parser.add_argument("archive")
+    args = parser.parse_args()
+    reader = ArchiveReader(args.archive)
+    for member in reader:
+        print(f"📄 {member.name} ({len(member.data) / 1024:.0f} Ko, {image_format(member.data[:16])})")
+    print(f"🗜️ {reader.summary()}")
+
+
+if __name__ == "__main__":
+    main()
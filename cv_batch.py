@@ -0,0 +1,559 @@
+#!/usr/bin/env python3
+"""
+📦 ANALYSE CV PAR LOTS (REPRISE POSSIBLE)
+
+Traite un dossier complet de CV avec l'un des analyseurs existants :
+- two-step : CVAnalyzer (OCR puis analyse RH)
+- oneshot  : CVAnalyzerOneShot (LM Studio, un seul appel)
+- ollama   : OllamaCVOneShot (Ollama, un seul appel)
+- auto     : choix CV par CV entre two-step et one-shot (cv_router.py)
+
+Chaque étape est inscrite dans un journal JSONL durable (cv_journal.py).
+Avec --resume, les CV déjà analysés sont sautés et les CV two-step
+interrompus après l'OCR reprennent directement à l'analyse RH, à partir
+du texte OCR stocké dans le journal.
+
+L'offre est compilée une fois en profil d'exigences compact (cv_offer.py),
+réutilisé dans le prompt de chaque CV ; le journal reste indexé sur
+l'empreinte de l'offre d'origine.
+
+Avec --deadline (lot) et --cv-timeout (par CV), les appels modèle en
+cours sont coupés à l'échéance (cv_deadline.py) : le CV est inscrit en
+timeout avec l'étape atteinte, et --resume repart de son texte OCR.
+
+Usage:
+python cv_batch.py cvs/ "Développeur Python Junior"
+python cv_batch.py cvs/ "Développeur Python Junior" --resume
+python cv_batch.py cv1.jpg cv2.jpg "Développeur Python Junior" --mode oneshot --workers 2
+python cv_batch.py cvs/ "Développeur Python Junior" --mode auto --oneshot-backend ollama
+python cv_batch.py cvs/ "Développeur Python Junior" --pipeline --stage-workers ocr=2,analyse=1
+python cv_batch.py cvs/ "Développeur Python Junior" --deadline 3600 --cv-timeout 240
+python cv_batch.py cvs/ "Développeur Python Junior" --workers 8 --adaptive
+python cv_batch.py cvs/ "Développeur Python Junior" --raw-offer   # offre brute dans chaque prompt
+python cv_batch.py export_ats.zip "Développeur Python Junior"       # CV lus dans l'archive
+python cv_batch.py cvs/ "Développeur Python Junior" --mode oneshot --hedge-url http://gpu2:1234/v1
+python cv_batch.py cvs/ "Développeur Python Junior" --mode oneshot --profile cv_tuning_profile.json
+"""
+import argparse
+import json
+import os
+import sys
+import tarfile
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from cv_archive import ArchiveReader, is_archive, output_name
+from cv_deadline import Deadline, DeadlineExceeded, deadline_expired, deadline_scope
+from cv_hedge import DEFAULT_MAX_RATE, Hedger
+from cv_image import image_info
+from cv_journal import (ANALYSIS_DONE, FAILED, OCR_DONE, QUEUED, TIMEOUT, CheckpointJournal,
+                        entry_key, file_sha256, text_sha256)
+from cv_limiter import AdaptiveLimit
+from cv_narrative import DEFAULT_CACHE as NARRATIVE_CACHE, NarrativeCache, NarrativeWriter, detail_top
+from cv_offer import DEFAULT_CACHE, OfferCompiler, completion_for
+from cv_pipeline import PipelinedRunner, parse_stage_workers
+from cv_report import ReportWriter
+from cv_router import ONESHOT, TWO_STEP, HybridRouter
+from cv_salvage import continuation_for, recover_analysis
+from cv_scheduler import BULK, PriorityScheduler
+from cv_tuning import load_profile
+
+MODES = ("two-step", "oneshot", "ollama", "auto")
+STATUS_ICONS = {"done": "✅", "skipped": "⏭️", "failed": "❌", "timeout": "⏱️"}
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp"}
+DEFAULT_BASE_URLS = {"lmstudio": "http://localhost:1234/v1", "ollama": "http://localhost:11434"}
+
+
+def collect_images(inputs: List[str]) -> List[str]:
+    """Liste triée des images à traiter (fichiers et contenus de dossiers)"""
+    paths = []
+    for item in inputs:
+        p = Path(item)
+        if p.is_dir():
+            paths.extend(str(f) for f in sorted(p.iterdir())
+                         if f.is_file() and f.suffix.lower() in IMAGE_EXTENSIONS)
+        elif p.is_file():
+            paths.append(str(p))
+        else:
+            print(f"⚠️ Ignoré (introuvable): {item}")
+    return paths
+
+
+def split_archives(paths: List[str]) -> Tuple[List[str], List[str]]:
+    """Séparer les images des archives zip / tar (lues sans extraction, cf. cv_archive.py)"""
+    archives = [p for p in paths if is_archive(p)]
+    return [p for p in paths if p not in archives], archives
+
+
+def build_analyzer(mode: str, base_url: Optional[str] = None, scheduler=None, priority: str = BULK,
+                   hedger: Optional[Hedger] = None, profile=None, scores_only: bool = False,
+                   **stage_options):
+    """
+    Instancier l'analyseur correspondant au mode
+    hedger        : appels lents doublés sur des serveurs de secours (cv_hedge.py)
+    profile       : réglages de génération (cv_tuning.py), défaut : valeurs historiques
+    scores_only   : notation seule, détail rédigé à la demande (cv_narrative.py)
+    stage_options : réglages par étape du two-step (ocr_tiles, ocr_model, analysis_url,
+                    analysis_model, cascade_model, analysis_scheduler), cf. CVAnalyzer
+    """
+    if mode == "two-step":
+        from cv_analyzer import CVAnalyzer
+        return CVAnalyzer(base_url=base_url or DEFAULT_BASE_URLS["lmstudio"],
+                          scheduler=scheduler, priority=priority, hedger=hedger, profile=profile,
+                          scores_only=scores_only, **stage_options)
+    if mode == "oneshot":
+        from cv_oneshot import CVAnalyzerOneShot
+        return CVAnalyzerOneShot(base_url=base_url or DEFAULT_BASE_URLS["lmstudio"],
+                                 scheduler=scheduler, priority=priority, hedger=hedger, profile=profile,
+                                 scores_only=scores_only)
+    if mode == "ollama":
+        from cv_oneshot_ollama import OllamaCVOneShot
+        return OllamaCVOneShot(base_url=base_url or DEFAULT_BASE_URLS["ollama"],
+                               scheduler=scheduler, priority=priority, hedger=hedger, profile=profile,
+                               scores_only=scores_only)
+    raise ValueError(f"Mode inconnu: {mode}")
+
+
+class BatchRunner:
+    def __init__(self, analyzers: Dict[str, object], mode: str, job_offer: str, journal: CheckpointJournal,
+                 workers: int = 1, save: bool = True, router: Optional[HybridRouter] = None,
+                 reporter: Optional[ReportWriter] = None, ocr_pack: int = 1,
+                 cv_timeout: Optional[float] = None, batch_timeout: Optional[float] = None,
+                 prompt_offer: Optional[str] = None):
+        """
+        Exécuteur de lot
+        analyzers : analyseurs par mode ("two-step", "oneshot", "ollama"), cf. build_analyzer
+        mode      : mode fixe, ou "auto" pour laisser le routeur choisir CV par CV
+        journal   : journal de reprise (ouvert par l'appelant)
+        workers   : CV traités en parallèle
+        reporter  : rapport CSV/JSONL et classement en direct (cv_report.py)
+        ocr_pack  : CV par requête OCR en two-step (micro-lots, cf. cv_microbatch.py), 1 = désactivé
+        cv_timeout    : durée maximale d'un CV en secondes (None = sans limite)
+        batch_timeout : durée maximale du lot, comptée à partir de run()
+        prompt_offer  : offre telle qu'envoyée au modèle (profil compilé, cf. cv_offer.py),
+                        défaut : job_offer
+        """
+        if mode == "auto" and router is None:
+            raise ValueError("Le mode auto nécessite un routeur")
+        self.analyzers = analyzers
+        self.mode = mode
+        self.oneshot_mode = "ollama" if "ollama" in analyzers else "oneshot"
+        self.job_offer = job_offer
+        self.offer_sha256 = text_sha256(job_offer)
+        self.prompt_offer = prompt_offer or job_offer
+        self.journal = journal
+        self.workers = max(1, workers)
+        self.save = save
+        self.router = router
+        self.reporter = reporter
+        self.ocr_pack = max(1, ocr_pack)
+        self._prefetched: Dict[str, str] = {}
+        # Réponses tronquées : champs manquants demandés au serveur de chaque analyseur (cv_salvage.py)
+        self._continuations = {mode: continuation_for(analyzer) for mode, analyzer in analyzers.items()}
+        self.cv_timeout = cv_timeout
+        self.batch_timeout = batch_timeout
+        self.batch_deadline = Deadline()
+
+    # ---------------------- Orchestration ----------------------
+    def run(self, paths: List[str], resume: bool = False, archives: Sequence[str] = ()) -> dict:
+        """Traiter tous les CV (images, puis CV des archives), renvoie le nombre de CV par statut"""
+        counts = {"done": 0, "skipped": 0, "failed": 0, "timeout": 0}
+        start = time.time()
+        self.batch_deadline = Deadline(self.batch_timeout)
+        print(f"📦 Lot: {len(paths)} CV{f' + {len(archives)} archive(s)' if archives else ''} | mode {self.mode} | {self.workers} worker(s)"
+              f"{' | reprise' if resume else ''}"
+              f"{f' | échéance {self.batch_timeout:.0f}s' if self.batch_timeout else ''}"
+              f"{f' | {self.cv_timeout:.0f}s par CV' if self.cv_timeout else ''}")
+
+        # Micro-lots OCR : l'OCR d'une fenêtre de CV est faite d'abord, par paquets
+        batched = self.ocr_pack > 1 and self.mode == "two-step"
+        window = self.ocr_pack * self.workers if batched else max(1, len(paths))
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for i in range(0, len(paths), window):
+                chunk = paths[i:i + window]
+                if batched:
+                    self._prefetch_ocr(pool, chunk, resume)
+                for path, status in zip(chunk, pool.map(lambda p: self.process(p, resume), chunk)):
+                    counts[status] += 1
+                    print(f"{STATUS_ICONS[status]} {path}")
+            for archive in archives:
+                self._run_archive(pool, archive, resume, counts)
+
+        print(f"\n🚀 Lot terminé en {time.time() - start:.1f}s: "
+              f"{counts['done']} analysés, {counts['skipped']} déjà faits, {counts['failed']} échecs"
+              + (f", {counts['timeout']} hors délai (reprise avec --resume)" if counts["timeout"] else ""))
+        if self.reporter:
+            print("\n" + self.reporter.leaderboard.render())
+            print(f"📄 Rapport: {', '.join(self.reporter.paths)}")
+        if self.router:
+            print(f"🧭 Stratégies choisies: {self.router.summary()}")
+            self.router.save_stats()
+        return counts
+
+    def _run_archive(self, pool: ThreadPoolExecutor, archive: str, resume: bool, counts: dict):
+        """CV d'une archive lus au fil de l'eau, au plus deux par worker en mémoire"""
+        reader = ArchiveReader(archive, extensions=IMAGE_EXTENSIONS)
+        pending = deque()
+
+        def drain(limit: int):
+            while len(pending) > limit:
+                ref, future = pending.popleft()
+                status = future.result()
+                counts[status] += 1
+                print(f"{STATUS_ICONS[status]} {ref}")
+
+        try:
+            for member in reader:
+                pending.append((member.ref, pool.submit(self.process, member.ref, resume,
+                                                        member.sha256, member.data)))
+                drain(2 * self.workers)
+        except (OSError, EOFError, zipfile.BadZipFile, tarfile.TarError) as e:
+            print(f"❌ Archive illisible {archive}: {e}")
+        drain(0)
+        print(f"🗜️ {archive}: {reader.summary()}")
+
+    def process(self, path: str, resume: bool = False, image_sha256: Optional[str] = None,
+                data: Optional[bytes] = None) -> str:
+        """
+        Traiter un CV, renvoie 'done', 'skipped', 'failed' ou 'timeout' (empreinte recalculée si absente)
+        data : octets du CV déjà en mémoire (membre d'archive, `path` n'est alors qu'une référence)
+        """
+        source = data if data is not None else path
+        try:
+            image_sha256 = image_sha256 or file_sha256(path)
+        except OSError as e:
+            print(f"❌ Lecture impossible {path}: {e}")
+            return "failed"
+        key = entry_key(image_sha256, self.offer_sha256)
+        fields = {"path": path, "image_sha256": image_sha256,
+                  "offer_sha256": self.offer_sha256, "mode": self.mode}
+
+        previous = self.journal.get(key) if resume else None
+        if previous and previous["state"] == ANALYSIS_DONE:
+            # Déjà analysé : reste dans le rapport et le classement
+            self._report(path, previous.get("analysis"), previous.get("mode", self.mode))
+            return "skipped"
+        if not previous:
+            self.journal.record(key, QUEUED, **fields)
+        cached_text = previous.get("ocr_text") if previous else None
+
+        # Échéance du CV, bornée par celle du lot, lue par chaque appel modèle
+        deadline = Deadline(self.cv_timeout, parent=self.batch_deadline)
+        if deadline.expired():
+            self.journal.record(key, TIMEOUT, reason="échéance du lot atteinte avant traitement",
+                                stage="attente", **fields)
+            return "timeout"
+        with deadline_scope(deadline):
+            try:
+                if self.mode == "auto":
+                    cached_text = cached_text or self.journal.find_ocr_text(image_sha256)
+                    return self._routed(path, key, fields, cached_text, source)
+                if self.mode == "two-step":
+                    return self._two_step(path, key, fields, cached_text, source)
+                return self._one_shot(self.mode, path, key, fields, source)
+            except DeadlineExceeded as e:
+                return self._failed(key, f"exception: {e}", fields)
+            except Exception as e:
+                self.journal.record(key, FAILED, reason=f"exception: {e}", **fields)
+                return "failed"
+
+    def _failed(self, key: str, reason: str, fields: dict) -> str:
+        """Inscrire un échec, ou un timeout si l'échéance du CV est passée entre-temps"""
+        if deadline_expired():
+            stage = reason.split(":")[0]
+            self.journal.record(key, TIMEOUT, reason=f"échéance dépassée ({stage})", stage=stage, **fields)
+            return "timeout"
+        self.journal.record(key, FAILED, reason=reason, **fields)
+        return "failed"
+
+    def _prefetch_ocr(self, pool: ThreadPoolExecutor, paths: List[str], resume: bool):
+        """OCR par micro-lots des CV qui n'ont pas encore de texte"""
+        todo = []
+        for path in paths:
+            try:
+                key = entry_key(file_sha256(path), self.offer_sha256)
+            except OSError:
+                continue
+            previous = self.journal.get(key) if resume else None
+            if previous and (previous["state"] == ANALYSIS_DONE or previous.get("ocr_text")):
+                continue
+            todo.append(path)
+        if len(todo) < 2:
+            return
+        analyzer = self.analyzers["two-step"]
+        groups = [todo[i:i + self.ocr_pack] for i in range(0, len(todo), self.ocr_pack)]
+
+        def read_group(group):
+            with deadline_scope(self.batch_deadline):
+                return analyzer.extract_cv_texts(group, self.ocr_pack)
+
+        for texts in pool.map(read_group, groups):
+            self._prefetched.update({path: text for path, text in texts.items() if text})
+
+    def _report(self, path: str, analysis: Optional[dict], mode: str):
+        if self.reporter and analysis:
+            self.reporter.add(path, analysis, mode=mode)
+
+    # ---------------------- Étapes ----------------------
+    def _routed(self, path: str, key: str, fields: dict, cached_text: Optional[str], source) -> str:
+        try:
+            info = image_info(source)
+        except OSError:
+            info = None
+        decision = self.router.choose(info, has_ocr_text=bool(cached_text))
+        print(f"🧭 {path}: {decision.strategy} sur {decision.backend} ({decision.reason})")
+        fields = dict(fields, route=decision.strategy, route_backend=decision.backend,
+                      route_reason=decision.reason)
+
+        start = time.time()
+        if decision.strategy == ONESHOT:
+            status = self._one_shot(self.oneshot_mode, path, key, fields, source)
+        else:
+            status = self._two_step(path, key, fields, cached_text, source)
+        self.router.observe(decision, info, time.time() - start, ok=status == "done")
+        return status
+
+    def _two_step(self, path: str, key: str, fields: dict, cached_text: Optional[str], source=None) -> str:
+        analyzer = self.analyzers["two-step"]
+        cv_text = cached_text
+        if cv_text:
+            print(f"♻️ OCR repris du journal: {path}")
+        else:
+            cv_text = self._prefetched.pop(path, None) or analyzer.extract_cv_text(source or path)
+            if not cv_text:
+                return self._failed(key, "ocr: aucune réponse", fields)
+            self.journal.record(key, OCR_DONE, ocr_text=cv_text, **fields)
+
+        analysis = recover_analysis(analyzer.analyze_cv_rh(cv_text, self.prompt_offer),
+                                    self._continuations["two-step"], context=cv_text)
+        if analysis is None:
+            return self._failed(key, "analyse: JSON invalide ou absent", fields)
+        self.journal.record(key, ANALYSIS_DONE, analysis=analysis, **fields)
+        self._report(path, analysis, fields["mode"])
+        if self.save:
+            analyzer.save_results(cv_text, analysis, output_name(path))
+        return "done"
+
+    def _one_shot(self, mode: str, path: str, key: str, fields: dict, source=None) -> str:
+        analyzer = self.analyzers[mode]
+        if mode == "ollama":
+            raw = analyzer.analyze_oneshot(source or path, self.prompt_offer)
+        else:
+            raw = analyzer.analyze_cv_oneshot(source or path, self.prompt_offer)
+        if mode == "ollama" and analyzer.last_timings():
+            # Chargement du modèle et inférence séparés dans le journal
+            fields = dict(fields, timings=analyzer.last_timings())
+        if raw and deadline_expired():
+            # Génération coupée à l'échéance : champs récupérés sans continuation, CV inscrit hors délai
+            partial = recover_analysis(raw)
+            if partial:
+                fields = dict(fields, analysis=partial)
+            return self._failed(key, "analyse: réponse partielle", fields)
+        analysis = recover_analysis(raw, self._continuations[mode])
+        if analysis is None:
+            return self._failed(key, "analyse: JSON invalide ou absent", fields)
+        self.journal.record(key, ANALYSIS_DONE, analysis=analysis, **fields)
+        self._report(path, analysis, fields["mode"])
+        if self.save:
+            if mode == "ollama":
+                analyzer.save(analysis, output_name(path))
+            else:
+                analyzer.save_results(analysis, output_name(path))
+        return "done"
+
+
+def _detail_leaderboard(analyzers: Dict[str, object], prompt_offer: str, job_offer: str,
+                        journal: CheckpointJournal, reporter: ReportWriter, k: int, args):
+    """Détail rédigé des K premiers du classement (mode --scores-only), écrit dans <rapport>_detail.jsonl"""
+    rows = reporter.leaderboard.top(k)
+    if not rows:
+        return
+    print(f"\n📝 Détail des {len(rows)} premiers du classement...")
+    writer = NarrativeWriter(analyzers, prompt_offer, NarrativeCache(args.narrative_cache))
+    detailed = detail_top(writer, journal, rows, text_sha256(job_offer), workers=args.workers)
+    if args.report:
+        path = f"{args.report}_detail.jsonl"
+        with open(path, "w", encoding="utf-8") as f:
+            for row, analysis in detailed:
+                f.write(json.dumps({"fichier": row["fichier"], "analyse": analysis}, ensure_ascii=False) + "\n")
+        print(f"📄 Détails: {path}")
+    print(f"📝 Détails: {writer.summary()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyse CV par lots avec journal de reprise")
+    parser.add_argument("inputs", nargs="+", help="images ou dossiers de CV, puis l'offre d'emploi")
+    parser.add_argument("--mode", choices=MODES, default="two-step")
+    parser.add_argument("--journal", default="cv_batch_journal.jsonl", help="fichier journal JSONL")
+    parser.add_argument("--resume", action="store_true", help="sauter les CV déjà analysés")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--priority", default=os.environ.get("CV_PRIORITY", BULK),
+                        help="interactive / normal / bulk")
+    parser.add_argument("--base-url", default=os.environ.get("CV_BASE_URL"))
+    parser.add_argument("--no-save", action="store_true", help="ne pas écrire les fichiers par CV")
+    parser.add_argument("--top", type=int, default=10, help="taille du classement final")
+    parser.add_argument("--report", default="cv_batch_report",
+                        help="préfixe des rapports .csv et .jsonl (\"\" = aucun fichier)")
+    parser.add_argument("--ocr-tiles", action="store_true",
+                        help="OCR par zones en parallèle pour les CV multi-colonnes (two-step)")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="two-step en chaîne : OCR du CV suivant pendant l'analyse du précédent")
+    parser.add_argument("--stage-workers", default="",
+                        help="workers par étape du pipeline, ex: ocr=2,analyse=1")
+    parser.add_argument("--queue-size", type=int, default=4, help="capacité des files du pipeline")
+    parser.add_argument("--ocr-pack", type=int, default=1,
+                        help="petits CV lus par requête OCR (micro-lots, two-step), 1 = désactivé")
+    parser.add_argument("--ocr-model", help="modèle vision de l'OCR (two-step)")
+    parser.add_argument("--analysis-url", help="serveur de l'analyse RH si différent de celui de l'OCR")
+    parser.add_argument("--analysis-model", help="modèle de l'analyse RH (two-step)")
+    parser.add_argument("--cascade-model",
+                        help="petit modèle texte essayé d'abord, escalade vers --analysis-model si douteux")
+    parser.add_argument("--deadline", type=float,
+                        help="durée maximale du lot en secondes (CV restants inscrits en timeout)")
+    parser.add_argument("--cv-timeout", type=float,
+                        help="durée maximale d'un CV en secondes, appels modèle en cours coupés")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="appels simultanés ajustés par serveur (AIMD), --workers = plafond")
+    parser.add_argument("--hedge-url", action="append", default=[],
+                        help="serveur LM Studio de secours (même modèle) pour doubler les appels lents, répétable")
+    parser.add_argument("--hedge-ollama-url", action="append", default=[],
+                        help="serveur Ollama de secours pour doubler les appels lents, répétable")
+    parser.add_argument("--hedge-rate", type=float, default=DEFAULT_MAX_RATE,
+                        help="part maximale des appels doublés")
+    parser.add_argument("--profile", default=os.environ.get("CV_PROFILE"),
+                        help="profils de génération issus de cv_tuning.py (JSON)")
+    parser.add_argument("--scores-only", action="store_true",
+                        help="nom, scores et recommandation seulement ; détail rédigé pour le classement")
+    parser.add_argument("--detail-top", type=int,
+                        help="candidats du classement détaillés en fin de lot avec --scores-only (défaut : --top)")
+    parser.add_argument("--narrative-cache", default=NARRATIVE_CACHE, help="détails déjà rédigés (JSON)")
+    parser.add_argument("--raw-offer", action="store_true",
+                        help="offre brute dans chaque prompt (sans profil compilé)")
+    parser.add_argument("--offer-cache", default=DEFAULT_CACHE, help="profils d'offres compilés (JSON)")
+    parser.add_argument("--oneshot-backend", choices=("lmstudio", "ollama"), default="lmstudio",
+                        help="serveur utilisé pour le one-shot en mode auto")
+    parser.add_argument("--router-stats", default="cv_router_stats.json",
+                        help="mesures de latence conservées entre les lots (mode auto)")
+    args = parser.parse_args()
+
+    if len(args.inputs) < 2:
+        parser.error("il faut au moins une image/un dossier et l'offre d'emploi")
+    *inputs, job_offer = args.inputs
+    if args.pipeline and args.mode != "two-step":
+        parser.error("--pipeline ne s'applique qu'au mode two-step")
+    try:
+        stage_workers = parse_stage_workers(args.stage_workers)
+    except ValueError as e:
+        parser.error(str(e))
+
+    paths, archives = split_archives(collect_images(inputs))
+    if not paths and not archives:
+        print("❌ Aucune image à traiter")
+        sys.exit(1)
+
+    # Plafond d'appels simultanés par serveur (threads du lot ou des étapes du pipeline)
+    ceiling = max(1, args.workers, sum(stage_workers.values()) if args.pipeline else 0)
+
+    def make_scheduler():
+        limiter = AdaptiveLimit(initial=1, max_limit=ceiling) if args.adaptive else None
+        return PriorityScheduler(max_concurrent=ceiling, limiter=limiter)
+
+    def server_url(mode):
+        if mode == "ollama":
+            return (None if args.mode == "auto" else args.base_url) or DEFAULT_BASE_URLS["ollama"]
+        return args.base_url or DEFAULT_BASE_URLS["lmstudio"]
+
+    # Un ordonnanceur (et une limite adaptative) par serveur, repéré par son URL :
+    # l'OCR et un --analysis-url distinct ne partagent pas la même limite
+    schedulers = {}
+
+    def scheduler_for(url):
+        if url not in schedulers:
+            schedulers[url] = make_scheduler()
+        return schedulers[url]
+
+    router = None
+    if args.mode == "auto":
+        oneshot_mode = "ollama" if args.oneshot_backend == "ollama" else "oneshot"
+        modes = ["two-step", oneshot_mode]
+        # La charge de chaque serveur alimente le routeur
+        router = HybridRouter(backends={TWO_STEP: server_url("two-step"), ONESHOT: server_url(oneshot_mode)},
+                              stats_path=args.router_stats, load_fn=lambda url: scheduler_for(url).load())
+    else:
+        modes = [args.mode]
+    use_schedulers = args.mode == "auto" or args.adaptive
+    # Doublement des appels lents : un hedger par type de serveur
+    hedge_urls = {"lmstudio": args.hedge_url, "ollama": args.hedge_ollama_url}
+    hedgers = {backend: Hedger(urls, max_rate=args.hedge_rate) for backend, urls in hedge_urls.items() if urls}
+    stage_options = {"ocr_tiles": args.ocr_tiles, "ocr_model": args.ocr_model,
+                     "analysis_url": args.analysis_url, "analysis_model": args.analysis_model,
+                     "cascade_model": args.cascade_model}
+    analyzers = {}
+    for mode in modes:
+        backend = "ollama" if mode == "ollama" else "lmstudio"
+        base_url = server_url(mode)
+        options = dict(stage_options) if mode == "two-step" else {}
+        if options and use_schedulers:
+            options["analysis_scheduler"] = scheduler_for(args.analysis_url or base_url)
+        profile = load_profile(args.profile, mode)
+        if profile:
+            print(f"🎛️ Profil {mode}: {profile.label()}")
+        analyzers[mode] = build_analyzer(mode, base_url=base_url,
+                                         scheduler=scheduler_for(base_url) if use_schedulers else None,
+                                         priority=args.priority, hedger=hedgers.get(backend), profile=profile,
+                                         scores_only=args.scores_only, **options)
+        if not analyzers[mode].check_connection():
+            sys.exit(1)
+
+    prompt_offer = job_offer
+    if not args.raw_offer:
+        # Une seule compilation de l'offre pour tout le lot (et les lots suivants, via le cache)
+        prompt_offer = OfferCompiler(completion_for(analyzers[modes[0]]), args.offer_cache).prompt_text(job_offer)
+        if prompt_offer != job_offer:
+            print(f"📋 Offre compilée en profil d'exigences ({len(prompt_offer)} car. au lieu de {len(job_offer)})")
+
+    report_paths = (f"{args.report}.csv", f"{args.report}.jsonl") if args.report else (None, None)
+    with CheckpointJournal(args.journal) as journal, ExitStack() as lifecycle, \
+            ReportWriter(*report_paths, top_k=args.top) as reporter:
+        # Modèles Ollama préchargés et gardés en mémoire pendant tout le lot
+        for analyzer in analyzers.values():
+            if hasattr(analyzer, "resident"):
+                lifecycle.enter_context(analyzer.resident())
+        if args.pipeline:
+            runner = PipelinedRunner(analyzers["two-step"], job_offer, journal, workers=stage_workers,
+                                     queue_size=args.queue_size, save=not args.no_save, reporter=reporter,
+                                     cv_timeout=args.cv_timeout, batch_timeout=args.deadline,
+                                     prompt_offer=prompt_offer)
+        else:
+            runner = BatchRunner(analyzers, args.mode, job_offer, journal,
+                                 workers=args.workers, save=not args.no_save, router=router,
+                                 reporter=reporter, ocr_pack=args.ocr_pack,
+                                 cv_timeout=args.cv_timeout, batch_timeout=args.deadline,
+                                 prompt_offer=prompt_offer)
+        counts = runner.run(paths, resume=args.resume, archives=archives)
+        detail_k = args.top if args.detail_top is None else args.detail_top
+        if args.scores_only and detail_k > 0:
+            _detail_leaderboard(analyzers, prompt_offer, job_offer, journal, reporter, detail_k, args)
+        for analyzer in analyzers.values():
+            if hasattr(analyzer, "stage_stats"):
+                print(f"⏱️ Étapes: {analyzer.stage_stats.summary()}")
+            if hasattr(analyzer, "timing_stats"):
+                stats = analyzer.timing_stats
+                print(f"🔥 Ollama: {stats['requests']} requêtes, {stats['cold_loads']} chargement(s) à froid "
+                      f"({stats['load_s']:.1f}s), inférence {stats['inference_s']:.1f}s")
+        for url, scheduler in schedulers.items():
+            if scheduler.limiter:
+                print(f"🎚️ Concurrence {url}: {scheduler.limiter.summary()}")
+        for backend, hedger in hedgers.items():
+            print(f"🪁 Doublements {backend}: {hedger.summary()}")
+        print(f"📓 Journal: {args.journal} {journal.summary()}")
+    sys.exit(1 if counts["failed"] or counts["timeout"] else 0)
+
+
+if __name__ == "__main__":
+    main()
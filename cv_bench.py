@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+⏱️ BANCS DE MESURE (SANS SERVEUR MODÈLE)
+
+payload    : mémoire de pointe par requête en cours, construction classique
+             (base64 complet + dict + JSON) contre corps en flux (cv_payload.py)
+microbatch : débit de l'OCR two-step avec et sans micro-lots (cv_microbatch.py),
+             sur un serveur simulé (coût fixe + pré-remplissage + génération)
+             ou sur un vrai serveur avec --base-url
+
+Usage:
+python cv_bench.py payload test.jpg
+python cv_bench.py payload --size-mb 8 --concurrency 32
+python cv_bench.py microbatch --cv 16 --packs 1,2,4,8
+python cv_bench.py microbatch cvs/ --base-url http://localhost:1234/v1
+"""
+import argparse
+import base64
+import json
+import os
+import shutil
+import struct
+import tempfile
+import threading
+import time
+import tracemalloc
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from cv_image import image_size_from_bytes
+from cv_payload import IMAGE_PLACEHOLDER, StreamingChatBody
+from cv_tokens import estimate_image_tokens, estimate_tokens
+
+OCR_PROMPT = "Extrait tout le texte de l'image et respecte la mise en forme originale."
+
+
+def _chat_payload(image_url: str) -> dict:
+    return {
+        "model": "auto",
+        "messages": [{
+            "role": "user",
+            "content": [
+                {"type": "text", "text": OCR_PROMPT},
+                {"type": "image_url", "image_url": {"url": image_url}},
+            ],
+        }],
+        "max_tokens": 2000,
+        "temperature": 0.05,
+        "top_p": 0.8,
+    }
+
+
+def _legacy_body(image_path: str) -> int:
+    """Construction d'origine : tout est matérialisé avant l'envoi"""
+    with open(image_path, "rb") as f:
+        base64_image = base64.b64encode(f.read()).decode('utf-8')
+    payload = _chat_payload(f"data:image/jpeg;base64,{base64_image}")
+    # Ce que fait requests.post(json=payload)
+    body = json.dumps(payload, allow_nan=False).encode('utf-8')
+    return len(body)
+
+
+def _streaming_body(image_path: str) -> int:
+    """Corps en flux : chaque morceau est envoyé puis libéré"""
+    body = StreamingChatBody(_chat_payload(f"data:image/jpeg;base64,{IMAGE_PLACEHOLDER}"), image_path)
+    sent = 0
+    for chunk in body:
+        sent += len(chunk)
+    assert sent == len(body)
+    return sent
+
+
+def _measure(fn, image_path: str):
+    tracemalloc.start()
+    start = time.perf_counter()
+    size = fn(image_path)
+    duration = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size, peak, duration
+
+
+def bench_payload(image_path: str, concurrency: int):
+    image_size = os.path.getsize(image_path)
+    print(f"📨 Corps de requête: {image_path} ({image_size / 1e6:.2f} Mo)")
+    print(f"{'méthode':<12}{'corps (Mo)':>12}{'pic/requête (Mo)':>19}{'ratio image':>13}"
+          f"{f'pic x{concurrency} (Mo)':>16}{'temps (ms)':>12}")
+    for name, fn in (("classique", _legacy_body), ("flux", _streaming_body)):
+        size, peak, duration = _measure(fn, image_path)
+        print(f"{name:<12}{size / 1e6:>12.2f}{peak / 1e6:>19.2f}{peak / image_size:>13.2f}"
+              f"{peak * concurrency / 1e6:>16.1f}{duration * 1000:>12.1f}")
+
+
+class SimulatedVisionServer:
+    def __init__(self, overhead: float = 0.4, prefill_tps: float = 600.0, decode_tps: float = 40.0,
+                 output_tokens: int = 350, time_scale: float = 0.05):
+        """
+        Serveur compatible OpenAI au coût modélisé, pour comparer des stratégies d'envoi :
+        durée = coût fixe + tokens d'entrée / prefill_tps + tokens générés / decode_tps,
+        le tout multiplié par time_scale (banc plus rapide, mêmes proportions).
+        Un seul créneau de calcul, comme LM Studio par défaut.
+        """
+        self.overhead = overhead
+        self.prefill_tps = prefill_tps
+        self.decode_tps = decode_tps
+        self.output_tokens = output_tokens
+        self.time_scale = time_scale
+        self.requests = 0
+        self._gpu = threading.Lock()
+        self._server = None
+
+    def cost(self, prompt_tokens: int, images: int) -> float:
+        return (self.overhead + prompt_tokens / self.prefill_tps
+                + images * self.output_tokens / self.decode_tps)
+
+    def _answer(self, payload: dict) -> str:
+        content = payload["messages"][0]["content"]
+        prompt = "".join(part.get("text", "") for part in content if part["type"] == "text")
+        images = [part["image_url"]["url"].split(",", 1)[1] for part in content if part["type"] == "image_url"]
+        prompt_tokens = estimate_tokens(prompt)
+        for data in images:
+            width, height = image_size_from_bytes(base64.b64decode(data[:4096])) or (0, 0)
+            prompt_tokens += estimate_image_tokens(width, height)
+        with self._gpu:
+            self.requests += 1
+            time.sleep(self.cost(prompt_tokens, len(images)) * self.time_scale)
+        text = "Jean Dupont\nExpérience: développeur Python 2019-2024\nFormation: Master informatique 2018"
+        if len(images) == 1:
+            return text
+        return "\n".join(f"=== CV {i} ===\n{text}" for i in range(1, len(images) + 1))
+
+    def start(self) -> str:
+        bench = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _send(self, body: dict):
+                data = json.dumps(body).encode('utf-8')
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self._send({"data": [{"id": "qwen2-vl-7b-instruct", "type": "vlm",
+                                       "max_context_length": 32768, "state": "loaded"}]})
+
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                self._send({"choices": [{"message": {"content": bench._answer(payload)}}]})
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return f"http://127.0.0.1:{self._server.server_port}/v1"
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+
+
+def _synthetic_png(path: str, width: int, height: int, size_bytes: int):
+    """Fichier PNG dont seul l'en-tête compte (dimensions), complété à la taille voulue"""
+    ihdr = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    chunk = b"IHDR" + ihdr
+    header = b"\x89PNG\r\n\x1a\n" + struct.pack(">I", len(ihdr)) + chunk + struct.pack(">I", zlib.crc32(chunk))
+    with open(path, "wb") as f:
+        f.write(header + os.urandom(max(0, size_bytes - len(header))))
+
+
+def bench_microbatch(paths, packs, base_url=None, workers: int = 1, time_scale: float = 0.05,
+                     overhead: float = 0.4):
+    """CV OCRisés par seconde pour chaque taille de micro-lot"""
+    import contextlib
+    import io
+
+    from cv_analyzer import CVAnalyzer
+    from cv_capabilities import CapabilityRegistry
+
+    server = None
+    if base_url is None:
+        server = SimulatedVisionServer(overhead=overhead, time_scale=time_scale)
+        base_url = server.start()
+        print(f"🧪 Serveur simulé: coût fixe {server.overhead}s, pré-remplissage {server.prefill_tps:.0f} tok/s, "
+              f"génération {server.decode_tps:.0f} tok/s, {server.output_tokens} tokens/CV "
+              f"(temps x{time_scale}, résultats ramenés à l'échelle réelle)")
+    scale = time_scale if server else 1.0
+    print(f"📚 Micro-lots OCR: {len(paths)} CV, {workers} worker(s)")
+    print(f"{'CV/requête':>10}{'requêtes':>10}{'durée (s)':>11}{'s/CV':>8}{'CV/min':>9}{'gain':>7}{'échecs':>8}")
+    baseline = None
+    try:
+        for pack in packs:
+            analyzer = CVAnalyzer(base_url=base_url, ocr_low_res_pixels=None,
+                                  registry=CapabilityRegistry(base_url, cache_path=None))
+            groups = [paths[i:i + pack] for i in range(0, len(paths), pack)]
+            requests_before = server.requests if server else 0
+            start = time.perf_counter()
+            # Les messages de l'analyseur masqueraient le tableau
+            with contextlib.redirect_stdout(io.StringIO()):
+                analyzer.check_connection()
+                start = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=workers) as pool:
+                    results = {}
+                    for texts in pool.map(lambda g: analyzer.extract_cv_texts(g, pack), groups):
+                        results.update(texts)
+            duration = (time.perf_counter() - start) / scale
+            failed = sum(1 for p in paths if not results.get(p))
+            n_requests = server.requests - requests_before if server else len(groups)
+            per_cv = duration / len(paths)
+            baseline = baseline or per_cv
+            print(f"{pack:>10}{n_requests:>10}{duration:>11.1f}{per_cv:>8.2f}{60 / per_cv:>9.1f}"
+                  f"{baseline / per_cv:>6.2f}x{failed:>8}")
+    finally:
+        if server:
+            server.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bancs de mesure de l'analyseur CV")
+    sub = parser.add_subparsers(dest="bench", required=True)
+
+    p = sub.add_parser("payload", help="mémoire de pointe de construction des requêtes")
+    p.add_argument("image", nargs="?", default="test.jpg")
+    p.add_argument("--size-mb", type=float, help="image synthétique de cette taille à la place")
+    p.add_argument("--concurrency", type=int, default=32)
+
+    p = sub.add_parser("microbatch", help="débit OCR avec et sans micro-lots")
+    p.add_argument("inputs", nargs="*", help="images ou dossiers de CV (défaut : CV synthétiques)")
+    p.add_argument("--cv", type=int, default=16, help="nombre de CV synthétiques")
+    p.add_argument("--packs", default="1,2,4,8", help="tailles de micro-lot comparées")
+    p.add_argument("--workers", type=int, default=1)
+    p.add_argument("--base-url", help="vrai serveur compatible OpenAI (sinon serveur simulé)")
+    p.add_argument("--time-scale", type=float, default=0.05, help="accélération du serveur simulé")
+    p.add_argument("--overhead", type=float, default=0.4, help="coût fixe par requête du serveur simulé (s)")
+
+    args = parser.parse_args()
+    if args.bench == "payload":
+        if args.size_mb:
+            with tempfile.NamedTemporaryFile(suffix=".jpg", delete=False) as tmp:
+                tmp.write(os.urandom(int(args.size_mb * 1e6)))
+            try:
+                bench_payload(tmp.name, args.concurrency)
+            finally:
+                os.unlink(tmp.name)
+        else:
+            bench_payload(args.image, args.concurrency)
+    elif args.bench == "microbatch":
+        packs = [int(x) for x in args.packs.split(",") if x.strip()]
+        if args.inputs:
+            from cv_batch import collect_images
+            bench_microbatch(collect_images(args.inputs), packs, args.base_url, args.workers, args.time_scale,
+                             args.overhead)
+        else:
+            # Petits CV d'une page : 1240x1754 (A4 à 150 dpi), ~300 Ko
+            tmpdir = tempfile.mkdtemp(prefix="cv_bench_")
+            try:
+                paths = []
+                for i in range(args.cv):
+                    path = os.path.join(tmpdir, f"cv_{i:03d}.png")
+                    _synthetic_png(path, 1240, 1754, 300_000)
+                    paths.append(path)
+                bench_microbatch(paths, packs, args.base_url, args.workers, args.time_scale,
+                             args.overhead)
+            finally:
+                shutil.rmtree(tmpdir)
+
+
+if __name__ == "__main__":
+    main()
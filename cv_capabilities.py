@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+🗂️ REGISTRE DES CAPACITÉS DES MODÈLES (LM Studio / Ollama)
+
+Découvre une fois les modèles disponibles sur un serveur et garde le
+résultat en cache (mémoire + disque) pendant `ttl` secondes, au lieu
+d'interroger /models ou /api/tags à chaque lancement.
+
+Pour chaque modèle :
+- vision            : accepte des images
+- context_length    : fenêtre de contexte (tokens)
+- max_output_tokens : sortie maximale raisonnable (tokens)
+- loaded            : déjà chargé en mémoire (LM Studio)
+
+Les analyseurs s'en servent pour envoyer un identifiant de modèle réel
+(au lieu de "model": "auto") et dimensionner max_tokens selon le modèle.
+Le cache est rafraîchi à la demande (refresh) ou après un échec (invalidate).
+
+Usage:
+python cv_capabilities.py                      # LM Studio
+python cv_capabilities.py --backend ollama --refresh
+"""
+import argparse
+import json
+import threading
+import time
+from pathlib import Path
+from typing import List, NamedTuple, Optional
+
+import requests
+
+LMSTUDIO = "lmstudio"
+OLLAMA = "ollama"
+
+DEFAULT_CACHE_PATH = Path.home() / ".cache" / "ia_cv_local" / "capabilities.json"
+
+# Fenêtre de contexte supposée quand le serveur ne l'indique pas
+DEFAULT_CONTEXT_LENGTH = 4096
+# Sortie plafonnée : au-delà, le JSON d'analyse ne gagne rien
+MAX_OUTPUT_CAP = 8192
+
+# Indices de nom pour les serveurs qui ne déclarent pas la vision
+VISION_NAME_HINTS = ("-vl", "vl-", "_vl", "vl:", "vision", "llava", "pixtral", "minicpm-v",
+                     "moondream", "gemma-3", "gemma3", "bakllava")
+
+
+class ModelCapabilities(NamedTuple):
+    id: str
+    vision: bool
+    context_length: int
+    max_output_tokens: int
+    loaded: bool = True
+    # False quand le serveur n'a pas indiqué le contexte (DEFAULT_CONTEXT_LENGTH supposé)
+    context_known: bool = True
+
+    def clamp_output(self, requested: int, prompt_tokens: int = 0) -> int:
+        """max_tokens compatible avec la sortie max et la place restante dans le contexte"""
+        room = self.context_length - prompt_tokens
+        return max(1, min(requested, self.max_output_tokens, room))
+
+
+def _looks_like_vision(name: str) -> bool:
+    name = name.lower()
+    return any(hint in name for hint in VISION_NAME_HINTS) or name.endswith("vl")
+
+
+def _default_max_output(context_length: int) -> int:
+    return min(context_length // 2, MAX_OUTPUT_CAP)
+
+
+class CapabilityRegistry:
+    def __init__(self, base_url: str, backend: str = LMSTUDIO, ttl: float = 600.0,
+                 cache_path: Optional[Path] = DEFAULT_CACHE_PATH, timeout: float = 5.0):
+        """
+        base_url   : URL de l'analyseur (ex: http://localhost:1234/v1 ou http://localhost:11434)
+        backend    : "lmstudio" ou "ollama"
+        ttl        : durée de validité du cache (s)
+        cache_path : fichier de cache partagé entre les lancements (None = mémoire seule)
+        """
+        self.base_url = base_url.rstrip('/')
+        self.backend = backend
+        self.ttl = ttl
+        self.cache_path = Path(cache_path) if cache_path else None
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._models: Optional[List[ModelCapabilities]] = None
+        self._fetched_at = 0.0
+        self._load_disk_cache()
+
+    # ---------------------- Cache ----------------------
+    def _cache_key(self) -> str:
+        return f"{self.backend}|{self.base_url}"
+
+    def _load_disk_cache(self):
+        if not self.cache_path or not self.cache_path.exists():
+            return
+        try:
+            data = json.loads(self.cache_path.read_text(encoding='utf-8'))
+        except (OSError, json.JSONDecodeError):
+            return
+        entry = data.get(self._cache_key())
+        if entry and time.time() - entry["fetched_at"] < self.ttl:
+            self._models = [ModelCapabilities(**m) for m in entry["models"]]
+            self._fetched_at = entry["fetched_at"]
+
+    def _save_disk_cache(self):
+        if not self.cache_path:
+            return
+        try:
+            data = json.loads(self.cache_path.read_text(encoding='utf-8')) if self.cache_path.exists() else {}
+        except (OSError, json.JSONDecodeError):
+            data = {}
+        data[self._cache_key()] = {"fetched_at": self._fetched_at,
+                                   "models": [m._asdict() for m in self._models]}
+        try:
+            self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+            self.cache_path.write_text(json.dumps(data, indent=2), encoding='utf-8')
+        except OSError as e:
+            print(f"⚠️ Cache des capacités non écrit: {e}")
+
+    def _expired(self) -> bool:
+        return self._models is None or time.time() - self._fetched_at >= self.ttl
+
+    def invalidate(self):
+        """Oublier le cache (après un échec d'appel modèle par exemple)"""
+        with self._lock:
+            self._models = None
+            self._fetched_at = 0.0
+
+    # ---------------------- Découverte ----------------------
+    def models(self, refresh: bool = False) -> List[ModelCapabilities]:
+        """Modèles connus (découverte si cache absent, expiré ou refresh=True)"""
+        with self._lock:
+            if refresh or self._expired():
+                discovered = self._discover()
+                self._models = discovered
+                # Une découverte vide (serveur arrêté) n'est pas mise en cache
+                self._fetched_at = time.time() if discovered else 0.0
+                if discovered:
+                    self._save_disk_cache()
+            return list(self._models)
+
+    def refresh(self) -> List[ModelCapabilities]:
+        return self.models(refresh=True)
+
+    def _discover(self) -> List[ModelCapabilities]:
+        try:
+            if self.backend == OLLAMA:
+                return self._discover_ollama()
+            return self._discover_lmstudio()
+        except Exception as e:
+            print(f"❌ Découverte des modèles impossible: {e}")
+            return []
+
+    def _discover_lmstudio(self) -> List[ModelCapabilities]:
+        # L'API REST de LM Studio (/api/v0) donne le type et le contexte
+        root = self.base_url[:-3] if self.base_url.endswith("/v1") else self.base_url
+        try:
+            r = requests.get(f"{root}/api/v0/models", timeout=self.timeout)
+            if r.status_code == 200:
+                found = []
+                for m in r.json().get("data", []):
+                    if m.get("type") == "embeddings":
+                        continue
+                    declared = m.get("loaded_context_length") or m.get("max_context_length")
+                    ctx = int(declared or DEFAULT_CONTEXT_LENGTH)
+                    found.append(ModelCapabilities(
+                        id=m["id"],
+                        vision=m.get("type") == "vlm" or _looks_like_vision(m["id"]),
+                        context_length=ctx,
+                        max_output_tokens=_default_max_output(ctx),
+                        loaded=m.get("state", "loaded") == "loaded",
+                        context_known=bool(declared),
+                    ))
+                return found
+        except requests.RequestException:
+            pass
+
+        # Repli : API compatible OpenAI, identifiants seulement
+        r = requests.get(f"{self.base_url}/models", timeout=self.timeout)
+        r.raise_for_status()
+        return [ModelCapabilities(id=m['id'], vision=_looks_like_vision(m['id']),
+                                  context_length=DEFAULT_CONTEXT_LENGTH,
+                                  max_output_tokens=_default_max_output(DEFAULT_CONTEXT_LENGTH),
+                                  context_known=False)
+                for m in r.json().get('data', []) if 'embed' not in m['id'].lower()]
+
+    def _discover_ollama(self) -> List[ModelCapabilities]:
+        r = requests.get(f"{self.base_url}/api/tags", timeout=self.timeout)
+        r.raise_for_status()
+        found = []
+        for m in r.json().get("models", []):
+            name = m.get("name", "")
+            vision = _looks_like_vision(name)
+            ctx = None
+            try:
+                show = requests.post(f"{self.base_url}/api/show", json={"model": name}, timeout=self.timeout)
+                if show.status_code == 200:
+                    info = show.json()
+                    if "capabilities" in info:
+                        vision = "vision" in info["capabilities"]
+                    for key, value in (info.get("model_info") or {}).items():
+                        if key.endswith(".context_length"):
+                            ctx = int(value)
+                            break
+            except requests.RequestException:
+                pass
+            found.append(ModelCapabilities(id=name, vision=vision, context_length=ctx or DEFAULT_CONTEXT_LENGTH,
+                                           max_output_tokens=_default_max_output(ctx or DEFAULT_CONTEXT_LENGTH),
+                                           context_known=ctx is not None))
+        return found
+
+    # ---------------------- Sélection ----------------------
+    def get(self, model_id: str) -> Optional[ModelCapabilities]:
+        """Modèle exact, sinon variante du même nom (ex: qwen2.5-vl:7b -> qwen2.5-vl:latest)"""
+        models = self.models()
+        for m in models:
+            if m.id == model_id:
+                return m
+        base = model_id.split(':')[0].lower()
+        for m in models:
+            if base in m.id.lower():
+                return m
+        return None
+
+    def pick(self, vision: bool = True, prefer: tuple = ()) -> Optional[ModelCapabilities]:
+        """
+        Meilleur modèle pour un usage :
+        vision requise si demandée, modèles chargés d'abord, puis ceux
+        dont le nom contient tous les mots de `prefer`, puis le plus grand contexte
+        """
+        candidates = [m for m in self.models() if m.vision or not vision]
+        if not candidates:
+            return None
+
+        def rank(m):
+            preferred = all(p in m.id.lower() for p in prefer) if prefer else False
+            return (m.loaded, preferred, m.context_length)
+
+        return max(candidates, key=rank)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Capacités des modèles LM Studio / Ollama")
+    parser.add_argument("--backend", choices=(LMSTUDIO, OLLAMA), default=LMSTUDIO)
+    parser.add_argument("--base-url")
+    parser.add_argument("--refresh", action="store_true", help="ignorer le cache")
+    args = parser.parse_args()
+
+    base_url = args.base_url or ("http://localhost:11434" if args.backend == OLLAMA
+                                 else "http://localhost:1234/v1")
+    registry = CapabilityRegistry(base_url, backend=args.backend)
+    models = registry.models(refresh=args.refresh)
+    if not models:
+        print("❌ Aucun modèle trouvé")
+        return
+    print(f"{'modèle':<40}{'vision':>8}{'contexte':>10}{'sortie max':>12}{'chargé':>8}")
+    for m in models:
+        print(f"{m.id:<40}{'oui' if m.vision else 'non':>8}{m.context_length:>10}"
+              f"{m.max_output_tokens:>12}{'oui' if m.loaded else 'non':>8}")
+
+
+if __name__ == "__main__":
+    main()
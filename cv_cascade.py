@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+🪜 CASCADE DE MODÈLES POUR L'ANALYSE RH
+
+L'analyse RH ne lit que du texte : un petit modèle texte rapide suffit
+pour la plupart des CV. Le grand modèle n'est appelé que si la réponse
+du petit est douteuse :
+- JSON absent ou invalide
+- validation échouée (champ manquant, score hors barème, total incohérent)
+- cas limite : recommandation "À considérer" ou score global dans la zone grise
+
+Les temps par étape (OCR, petit modèle, grand modèle) et les taux
+d'escalade sont comptés pour régler la cascade.
+"""
+import json
+import threading
+from typing import Dict, List, Optional
+
+# Barème des scores (cf. prompt d'analyse)
+SCORE_LIMITS = {
+    "score_technique": 40,
+    "score_experience": 30,
+    "score_formation": 15,
+    "score_soft_skills": 15,
+    "score_global": 100,
+}
+REQUIRED_FIELDS = ("nom_prenom", "recommandation") + tuple(SCORE_LIMITS)
+RECOMMENDATIONS = ("Recommandé", "À considérer", "Non recommandé")
+BORDERLINE = "À considérer"
+# Zone grise du score global : le petit modèle y départage mal
+GREY_ZONE = (45, 65)
+# Écart toléré entre le score global et la somme des sous-scores
+MAX_TOTAL_GAP = 10
+
+
+def parse_analysis(raw: Optional[str]) -> Optional[dict]:
+    """Extraire le JSON d'analyse de la réponse brute du modèle"""
+    if not raw:
+        return None
+    start = raw.find('{')
+    end = raw.rfind('}') + 1
+    if start == -1 or end <= start:
+        return None
+    try:
+        return json.loads(raw[start:end])
+    except json.JSONDecodeError:
+        return None
+
+
+def validate_analysis(analysis: dict) -> List[str]:
+    """Problèmes détectés dans une analyse (liste vide si valide)"""
+    problems = [f"{name} manquant" for name in REQUIRED_FIELDS if name not in analysis]
+    scores = {}
+    for name, limit in SCORE_LIMITS.items():
+        value = analysis.get(name)
+        if name not in analysis:
+            continue
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            problems.append(f"{name} non numérique")
+        elif not 0 <= value <= limit:
+            problems.append(f"{name} hors barème ({value}/{limit})")
+        else:
+            scores[name] = value
+    parts = [scores.get(name) for name in SCORE_LIMITS if name != "score_global"]
+    if "score_global" in scores and None not in parts and abs(sum(parts) - scores["score_global"]) > MAX_TOTAL_GAP:
+        problems.append(f"score_global incohérent ({scores['score_global']} pour {sum(parts)})")
+    if "recommandation" in analysis and analysis["recommandation"] not in RECOMMENDATIONS:
+        problems.append("recommandation inconnue")
+    return problems
+
+
+def escalation_reason(analysis: Optional[dict]) -> Optional[str]:
+    """Raison de refaire l'analyse avec le grand modèle, None si la réponse est fiable"""
+    if analysis is None:
+        return "json invalide"
+    problems = validate_analysis(analysis)
+    if problems:
+        return "validation: " + ", ".join(problems[:3])
+    if analysis.get("recommandation") == BORDERLINE:
+        return "cas limite"
+    if GREY_ZONE[0] <= analysis.get("score_global", 0) <= GREY_ZONE[1]:
+        return "zone grise"
+    return None
+
+
+class StageStats:
+    def __init__(self):
+        """Temps cumulés par étape et escalades de la cascade (partagé entre workers)"""
+        self._lock = threading.Lock()
+        self.stages: Dict[str, Dict[str, float]] = {}
+        self.escalations: Dict[str, int] = {}
+        self.cascades = 0
+
+    def record(self, stage: str, seconds: float, ok: bool = True):
+        with self._lock:
+            entry = self.stages.setdefault(stage, {"count": 0, "failed": 0, "seconds": 0.0})
+            entry["count"] += 1
+            entry["failed"] += 0 if ok else 1
+            entry["seconds"] += seconds
+
+    def cascade(self, reason: Optional[str]):
+        """Une analyse passée par la cascade, avec sa raison d'escalade éventuelle"""
+        with self._lock:
+            self.cascades += 1
+            if reason:
+                # Regroupement par type ("validation", "cas limite"...)
+                kind = reason.split(":")[0]
+                self.escalations[kind] = self.escalations.get(kind, 0) + 1
+
+    def escalation_rate(self) -> float:
+        return sum(self.escalations.values()) / self.cascades if self.cascades else 0.0
+
+    def summary(self) -> str:
+        with self._lock:
+            parts = [f"{stage} {e['count']}x moy {e['seconds'] / e['count']:.1f}s"
+                     + (f" ({e['failed']:.0f} échecs)" if e['failed'] else "")
+                     for stage, e in self.stages.items() if e["count"]]
+            if self.cascades:
+                detail = ", ".join(f"{k} {v}" for k, v in self.escalations.items())
+                parts.append(f"escalade {self.escalation_rate():.0%} sur {self.cascades}"
+                             + (f" [{detail}]" if detail else ""))
+        return " | ".join(parts) if parts else "aucune mesure"
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+📼 ENREGISTREMENT / REJEU DES ÉCHANGES AVEC LE SERVEUR MODÈLE
+
+Proxy local placé devant LM Studio ou Ollama :
+- record : transmet les requêtes au vrai serveur et enregistre chaque
+           réponse (statut, morceaux reçus et leur instant d'arrivée)
+           dans une cassette JSON, nommée d'après l'empreinte de la requête
+- replay : ne contacte aucun serveur, rejoue les cassettes à la vitesse
+           enregistrée, accélérée (--speed 4) ou instantanément (--speed 0)
+- auto   : rejoue si la cassette existe, enregistre sinon
+
+L'empreinte couvre la méthode, le chemin et le corps JSON (clés triées) :
+même image, même offre, même modèle -> même cassette. Les analyseurs
+(CVAnalyzer, CVAnalyzerOneShot, OllamaCVOneShot) tournent ainsi sans
+serveur, de façon déterministe, pour les tests de bout en bout et la
+mesure du coût côté client (--speed 0 : il ne reste que lui).
+
+Usage:
+python cv_cassette.py record --upstream http://localhost:1234/v1 --port 1250
+CV_BASE_URL=http://localhost:1250/v1 python cv_analyzer.py test.jpg "Développeur Python Junior"
+python cv_cassette.py replay --upstream http://localhost:1234/v1 --port 1250 --speed 0
+python cv_cassette.py list
+"""
+import argparse
+import base64
+import hashlib
+import json
+import threading
+import time
+from pathlib import Path
+from typing import Iterator, Optional, Tuple
+
+from cv_scheduler import ChunkedResponse, _path_prefix, _upstream_headers
+
+RECORD = "record"
+REPLAY = "replay"
+AUTO = "auto"
+DEFAULT_DIR = "cassettes"
+
+
+def request_key(method: str, path: str, body: Optional[bytes]) -> str:
+    """Empreinte d'une requête (corps JSON normalisé, sinon octets bruts)"""
+    h = hashlib.sha256(f"{method.upper()} {path}\n".encode('utf-8'))
+    if body:
+        try:
+            h.update(json.dumps(json.loads(body), sort_keys=True, ensure_ascii=False).encode('utf-8'))
+        except (ValueError, UnicodeDecodeError):
+            h.update(body)
+    return h.hexdigest()[:32]
+
+
+def _request_summary(method: str, path: str, body: Optional[bytes]) -> dict:
+    summary = {"method": method, "path": path, "body_bytes": len(body or b"")}
+    try:
+        payload = json.loads(body) if body else {}
+        if isinstance(payload, dict) and "model" in payload:
+            summary["model"] = payload["model"]
+    except (ValueError, UnicodeDecodeError):
+        pass
+    return summary
+
+
+def _encode_chunk(offset: float, data: bytes) -> dict:
+    try:
+        return {"t": round(offset, 4), "text": data.decode('utf-8')}
+    except UnicodeDecodeError:
+        return {"t": round(offset, 4), "b64": base64.b64encode(data).decode('ascii')}
+
+
+def _decode_chunk(chunk: dict) -> bytes:
+    if "text" in chunk:
+        return chunk["text"].encode('utf-8')
+    return base64.b64decode(chunk["b64"])
+
+
+class CassetteStore:
+    def __init__(self, directory: str = DEFAULT_DIR):
+        """Une cassette JSON par empreinte de requête"""
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self.stats = {"recorded": 0, "replayed": 0, "missing": 0}
+
+    def _file(self, key: str) -> Path:
+        return self.directory / f"{key}.json"
+
+    def has(self, key: str) -> bool:
+        return self._file(key).exists()
+
+    def load(self, key: str) -> Optional[dict]:
+        try:
+            return json.loads(self._file(key).read_text(encoding='utf-8'))
+        except (OSError, json.JSONDecodeError):
+            return None
+
+    def save(self, key: str, cassette: dict):
+        path = self._file(key)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(cassette, indent=1, ensure_ascii=False), encoding='utf-8')
+        tmp.replace(path)
+
+    def count(self, name: str):
+        with self._lock:
+            self.stats[name] += 1
+
+    def cassettes(self) -> Iterator[Tuple[str, dict]]:
+        for path in sorted(self.directory.glob("*.json")):
+            try:
+                yield path.stem, json.loads(path.read_text(encoding='utf-8'))
+            except (OSError, json.JSONDecodeError):
+                continue
+
+
+def replay_chunks(cassette: dict, speed: float = 1.0) -> Iterator[bytes]:
+    """Morceaux de la réponse, aux instants enregistrés divisés par `speed` (0 = sans attente)"""
+    start = time.perf_counter()
+    for chunk in cassette["response"]["chunks"]:
+        if speed > 0:
+            delay = chunk["t"] / speed - (time.perf_counter() - start)
+            if delay > 0:
+                time.sleep(delay)
+        yield _decode_chunk(chunk)
+
+
+def serve_cassettes(upstream: str, port: int, store: CassetteStore, mode: str = REPLAY,
+                    speed: float = 1.0, host: str = "127.0.0.1"):
+    """Proxy d'enregistrement / rejeu devant le serveur modèle"""
+    import requests
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    upstream = upstream.rstrip('/')
+    prefix = _path_prefix(upstream)
+    root = upstream[:-len(prefix)] if prefix else upstream
+    session = requests.Session()
+
+    class Handler(BaseHTTPRequestHandler):
+        # HTTP/1.1 en morceaux, comme le proxy de cv_scheduler.py : une coupure reste visible du client
+        protocol_version = "HTTP/1.1"
+
+        def _handle(self, method):
+            length = int(self.headers.get("Content-Length") or 0)
+            body = self.rfile.read(length) if length else None
+            if prefix and self.path.startswith(prefix):
+                # Le chemin du proxy reprend celui de l'amont (ex: /v1/chat/completions)
+                path = self.path[len(prefix):]
+                target = upstream + path
+            else:
+                # Hors préfixe (ex: /api/v0/models de LM Studio) : racine du serveur amont
+                path = self.path
+                target = root + path
+            key = request_key(method, path, body)
+
+            if mode != RECORD and store.has(key):
+                cassette = store.load(key)
+                if cassette:
+                    store.count("replayed")
+                    self._send(cassette["response"]["status"], cassette["response"]["content_type"],
+                               replay_chunks(cassette, speed))
+                    return
+            if mode == REPLAY:
+                store.count("missing")
+                message = json.dumps({"error": f"cassette absente pour {method} {path} ({key})"})
+                self._send(404, "application/json", iter([message.encode('utf-8')]))
+                return
+            self._record(method, target, path, body, key)
+
+        def _record(self, method, target, path, body, key):
+            headers = _upstream_headers(self.headers)
+            chunks = []
+            start = time.perf_counter()
+            response = None
+            try:
+                with session.request(method, target, data=body, headers=headers,
+                                     stream=True, timeout=600) as r:
+                    content_type = r.headers.get("Content-Type", "application/json")
+                    response = ChunkedResponse(self, r.status_code, content_type)
+                    for data in r.iter_content(chunk_size=None):
+                        chunks.append(_encode_chunk(time.perf_counter() - start, data))
+                        response.write(data)
+                    status = r.status_code
+                response.finish()
+            except Exception as e:
+                if response is not None:
+                    # Réponse déjà commencée : pas de morceau final, connexion coupée, rien n'est enregistré
+                    self.close_connection = True
+                else:
+                    self.send_error(502, f"Upstream: {e}")
+                return
+            store.save(key, {
+                "request": _request_summary(method, path, body),
+                "response": {"status": status, "content_type": content_type, "chunks": chunks,
+                             "duration": round(time.perf_counter() - start, 4)},
+                "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            })
+            store.count("recorded")
+
+        def _send(self, status, content_type, chunks):
+            response = ChunkedResponse(self, status, content_type)
+            for data in chunks:
+                response.write(data)
+            response.finish()
+
+        def do_GET(self):
+            self._handle("GET")
+
+        def do_POST(self):
+            self._handle("POST")
+
+        def log_message(self, fmt, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    speed_label = "instantané" if speed <= 0 else f"x{speed:g}"
+    print(f"📼 Cassettes ({mode}, {speed_label}): http://{host}:{port} -> {upstream} | {store.directory}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n📊 Cassettes:", store.stats)
+    finally:
+        server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Enregistrement / rejeu des échanges avec le serveur modèle")
+    parser.add_argument("mode", choices=(RECORD, REPLAY, AUTO, "list"))
+    parser.add_argument("--upstream", default="http://localhost:1234/v1",
+                        help="serveur modèle (ex: http://localhost:11434 pour Ollama)")
+    parser.add_argument("--port", type=int, default=1250)
+    parser.add_argument("--dir", default=DEFAULT_DIR, help="dossier des cassettes")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="vitesse de rejeu (1 = enregistrée, 0 = instantanée)")
+    args = parser.parse_args()
+
+    store = CassetteStore(args.dir)
+    if args.mode == "list":
+        for key, cassette in store.cassettes():
+            req, resp = cassette["request"], cassette["response"]
+            print(f"{key}  {req['method']:<5}{req['path']:<24}{req.get('model', ''):<28}"
+                  f"{resp['status']:>4}{len(resp['chunks']):>5} morceaux{resp['duration']:>8.2f}s")
+        return
+    serve_cassettes(args.upstream, args.port, store, args.mode, args.speed)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+⏳ ÉCHÉANCES PAR LOT, PAR CV ET PAR APPEL MODÈLE
+
+Les délais fixes des requêtes (150 s OCR, 120 s analyse, 180 s one-shot
+LM Studio, 600 s Ollama) ne bornent pas la durée totale d'un CV, ni celle
+d'un lot. Une échéance se propage vers le bas :
+
+    lot (--deadline) -> CV (--cv-timeout) -> étape -> appel HTTP
+
+- Deadline : instant limite absolu, jamais plus tard que celui du parent
+- deadline_scope : échéance courante du thread (contextvars), lue par
+  les analyseurs sans changer leurs signatures
+- request_timeout(150) : délai d'un appel HTTP réduit au temps restant ;
+  lève DeadlineExceeded si l'échéance est déjà passée (le créneau modèle
+  est rendu aussitôt, sans envoyer la requête)
+
+Un appel en cours est coupé à l'échéance : sans réponse à ce moment-là,
+requests abandonne la lecture et ferme la connexion, ce qui interrompt
+la génération côté LM Studio / Ollama. Les générations en flux vérifient
+l'échéance à chaque morceau (check_deadline) et ferment la réponse.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+# En dessous, un appel n'a aucune chance d'aboutir : inutile de l'envoyer
+MIN_CALL_SECONDS = 1.0
+
+
+class DeadlineExceeded(Exception):
+    """Échéance atteinte avant ou pendant un appel modèle"""
+
+
+class Deadline:
+    def __init__(self, seconds: Optional[float] = None, parent: Optional["Deadline"] = None):
+        """
+        Échéance dans `seconds` secondes (None = aucune limite propre)
+        parent : échéance englobante (lot pour un CV), jamais dépassée
+        """
+        at = time.monotonic() + seconds if seconds is not None else None
+        if parent is not None and parent.at is not None:
+            at = parent.at if at is None else min(at, parent.at)
+        self.at = at
+
+    def remaining(self) -> Optional[float]:
+        """Secondes restantes (négatif si dépassée), None sans limite"""
+        return None if self.at is None else self.at - time.monotonic()
+
+    def expired(self) -> bool:
+        return self.at is not None and time.monotonic() >= self.at
+
+    def child(self, seconds: Optional[float] = None) -> "Deadline":
+        return Deadline(seconds, parent=self)
+
+    def __repr__(self):
+        remaining = self.remaining()
+        return "Deadline(∞)" if remaining is None else f"Deadline({remaining:.1f}s)"
+
+
+_current: ContextVar[Optional[Deadline]] = ContextVar("cv_deadline", default=None)
+
+
+def current_deadline() -> Optional[Deadline]:
+    """Échéance courante du thread, None hors de tout deadline_scope"""
+    return _current.get()
+
+
+@contextmanager
+def deadline_scope(deadline: Optional[Deadline]):
+    """
+    Rendre `deadline` courante dans ce bloc (None = aucune)
+    Les threads lancés dans le bloc ne l'héritent pas : y rouvrir un
+    deadline_scope avec la même échéance (cf. OCR par zones).
+    """
+    token = _current.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current.reset(token)
+
+
+def check_deadline(what: str = "appel modèle"):
+    """Lever DeadlineExceeded si l'échéance courante est passée"""
+    deadline = current_deadline()
+    if deadline is not None and deadline.expired():
+        raise DeadlineExceeded(f"échéance dépassée ({what})")
+
+
+def request_timeout(default: float) -> float:
+    """Délai d'un appel HTTP : `default`, réduit au temps restant de l'échéance courante"""
+    deadline = current_deadline()
+    remaining = deadline.remaining() if deadline is not None else None
+    if remaining is None:
+        return default
+    if remaining < MIN_CALL_SECONDS:
+        raise DeadlineExceeded("échéance dépassée avant l'appel modèle")
+    return min(default, remaining)
+
+
+def deadline_expired() -> bool:
+    """L'échéance courante est-elle passée (pour classer un échec en timeout)"""
+    deadline = current_deadline()
+    return deadline is not None and deadline.expired()
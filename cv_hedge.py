@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+🪁 REQUÊTES DOUBLÉES (HEDGING) VERS DES SERVEURS REDONDANTS
+
+De temps en temps une génération prend 3 à 5 fois la médiane (créneau GPU
+partagé avec une longue requête, modèle rechargé...) et tout le lot
+l'attend. Avec plusieurs serveurs portant le même modèle, un appel qui
+dépasse le p95 récent de son étape est doublé sur un autre serveur sain :
+
+- la première réponse réussie gagne
+- l'autre appel est coupé (connexion fermée : LM Studio / Ollama arrêtent
+  la génération)
+- le taux de doublement est plafonné (10 % des appels par défaut) : un
+  serveur saturé ne reçoit pas deux fois plus de travail
+- un serveur en erreur est écarté des doublements pendant 30 s
+
+Le p95 est calculé par étape (ocr, oneshot...) sur les derniers appels
+réussis ; tant qu'il y a trop peu de mesures, rien n'est doublé.
+Les serveurs de secours doivent servir le même modèle que le principal.
+
+Usage:
+python cv_batch.py cvs/ "Développeur Python Junior" --mode oneshot --hedge-url http://gpu2:1234/v1
+python cv_hedge.py --simulate                # simulation sans serveur
+"""
+import argparse
+import math
+import queue
+import random
+import socket
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional, Sequence
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from cv_deadline import DeadlineExceeded, current_deadline, deadline_expired, deadline_scope
+
+# Part maximale des appels doublés
+DEFAULT_MAX_RATE = 0.1
+DEFAULT_PERCENTILE = 0.95
+# Mesures nécessaires avant de doubler (p95 fiable)
+MIN_SAMPLES = 20
+LATENCY_WINDOW = 200
+# Serveur écarté des doublements après une erreur
+UNHEALTHY_SECONDS = 30.0
+
+
+class HedgeCancelled(Exception):
+    """Appel coupé : l'autre serveur a répondu d'abord"""
+
+
+def _server_fault(exc: Exception) -> bool:
+    """Erreur imputable au serveur (transport, HTTP), pas à l'échéance du CV ni à l'annulation"""
+    return not isinstance(exc, (DeadlineExceeded, HedgeCancelled)) and not deadline_expired()
+
+
+class CancellableSession(requests.Session):
+    def __init__(self):
+        """Session dont les appels en cours peuvent être coupés depuis un autre thread (cancel)"""
+        super().__init__()
+        self._connections = []
+        self.cancelled = threading.Event()
+        session = self
+
+        def tracked(pool_cls):
+            class Pool(pool_cls):
+                def _new_conn(self):
+                    if session.cancelled.is_set():
+                        raise HedgeCancelled("appel annulé")
+                    conn = super()._new_conn()
+                    session._connections.append(conn)
+                    return conn
+            return Pool
+
+        adapter = HTTPAdapter(max_retries=0)
+        adapter.poolmanager.pool_classes_by_scheme = {"http": tracked(HTTPConnectionPool),
+                                                      "https": tracked(HTTPSConnectionPool)}
+        self.mount("http://", adapter)
+        self.mount("https://", adapter)
+
+    def cancel(self):
+        """Fermer les connexions en cours : l'appel bloqué lève une erreur de connexion"""
+        self.cancelled.set()
+        for conn in list(self._connections):
+            sock = getattr(conn, "sock", None)
+            if sock is None:
+                continue
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+class Hedger:
+    def __init__(self, backups: Sequence[str], max_rate: float = DEFAULT_MAX_RATE,
+                 percentile: float = DEFAULT_PERCENTILE, min_samples: int = MIN_SAMPLES,
+                 cooldown: float = UNHEALTHY_SECONDS):
+        """
+        Doublement des appels lents vers des serveurs de secours
+        backups     : URL de base des serveurs de secours (même API que le principal)
+        max_rate    : part maximale des appels doublés
+        percentile  : latence récente au-delà de laquelle on double
+        min_samples : mesures par étape avant le premier doublement
+        cooldown    : secondes d'exclusion d'un serveur après une erreur
+        """
+        self.backups = [url.rstrip('/') for url in backups]
+        self.max_rate = max_rate
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.cooldown = cooldown
+        self._latencies: Dict[str, deque] = {}
+        self._down_until: Dict[str, float] = {}
+        self._next = 0
+        self.stats = {"calls": 0, "hedged": 0, "hedge_won": 0, "primary_won": 0,
+                      "cancelled": 0, "capped": 0}
+        self._lock = threading.Lock()
+
+    # ---------------------- Mesures ----------------------
+    def threshold(self, stage: str) -> Optional[float]:
+        """Latence p95 récente de l'étape, None si trop peu de mesures"""
+        with self._lock:
+            recent = sorted(self._latencies.get(stage, ()))
+        if len(recent) < self.min_samples:
+            return None
+        # Rang le plus proche : p95 de 20 mesures = 19e valeur
+        return recent[max(0, math.ceil(self.percentile * len(recent)) - 1)]
+
+    def _record(self, stage: str, latency: float):
+        with self._lock:
+            self._latencies.setdefault(stage, deque(maxlen=LATENCY_WINDOW)).append(latency)
+
+    def _count(self, name: str):
+        with self._lock:
+            self.stats[name] += 1
+
+    def _mark_down(self, url: str):
+        with self._lock:
+            self._down_until[url] = time.monotonic() + self.cooldown
+
+    def _backup_for(self, primary: str) -> Optional[str]:
+        """Serveur de secours sain suivant (tourniquet), None si aucun"""
+        now = time.monotonic()
+        with self._lock:
+            healthy = [url for url in self.backups
+                       if url != primary.rstrip('/') and self._down_until.get(url, 0.0) <= now]
+            if not healthy:
+                return None
+            self._next += 1
+            return healthy[self._next % len(healthy)]
+
+    def _budget_left(self) -> bool:
+        with self._lock:
+            if self.stats["hedged"] < self.max_rate * self.stats["calls"]:
+                self.stats["hedged"] += 1
+                return True
+            self.stats["capped"] += 1
+            return False
+
+    # ---------------------- Appel ----------------------
+    def call(self, stage: str, primary: str, leg: Callable):
+        """
+        Appel `leg(url, session)` sur le serveur principal, doublé sur un
+        serveur de secours s'il dépasse le p95 de l'étape.
+        Un résultat faux (None, réponse HTTP en erreur) est un échec ;
+        renvoie le premier succès, sinon le dernier résultat ou lève la dernière erreur.
+        """
+        self._count("calls")
+        threshold = self.threshold(stage)
+        if threshold is None or not self._backup_for(primary):
+            start = time.monotonic()
+            try:
+                result = leg(primary, requests)
+            except Exception as e:
+                if _server_fault(e):
+                    self._mark_down(primary.rstrip('/'))
+                raise
+            if result:
+                self._record(stage, time.monotonic() - start)
+            return result
+
+        deadline = current_deadline()
+        outcomes = queue.Queue()
+        sessions: List[CancellableSession] = []
+        start = time.monotonic()
+
+        def launch(url: str):
+            session = CancellableSession()
+            sessions.append(session)
+
+            def run():
+                with deadline_scope(deadline):
+                    try:
+                        outcomes.put((session, url, leg(url, session), None))
+                    except Exception as e:
+                        outcomes.put((session, url, None, e))
+
+            threading.Thread(target=run, daemon=True, name=f"hedge-{stage}").start()
+
+        launch(primary)
+        try:
+            first = [outcomes.get(timeout=threshold)]
+        except queue.Empty:
+            first = []
+            backup = self._backup_for(primary)
+            if backup and self._budget_left():
+                print(f"🪁 {stage} au-delà de {threshold:.1f}s (p95), doublé sur {backup}")
+                launch(backup)
+
+        winner, last, error = None, None, None
+        for _ in range(len(sessions)):
+            session, url, result, exc = first.pop() if first else outcomes.get()
+            if exc is not None and not session.cancelled.is_set():
+                if _server_fault(exc):
+                    self._mark_down(url.rstrip('/'))
+                error = exc
+            if result:
+                winner = session
+                last = result
+                break
+            last = result if result is not None else last
+        for session in sessions:
+            if session is not winner and winner is not None and not session.cancelled.is_set():
+                session.cancel()
+                self._count("cancelled")
+        for session in sessions:
+            if session is not winner:
+                session.close()
+
+        if winner is not None:
+            self._record(stage, time.monotonic() - start)
+            self._count("primary_won" if winner is sessions[0] else "hedge_won")
+            return last
+        if last is None and error is not None:
+            raise error
+        return last
+
+    def metrics(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+        thresholds = {stage: self.threshold(stage) for stage in list(self._latencies)}
+        stats["thresholds"] = {stage: round(t, 2) for stage, t in thresholds.items() if t is not None}
+        return stats
+
+    def summary(self) -> str:
+        m = self.metrics()
+        thresholds = ", ".join(f"{stage} {t:.1f}s" for stage, t in m["thresholds"].items())
+        return (f"{m['hedged']} doublés sur {m['calls']} appels ({m['hedge_won']} gagnés par le secours, "
+                f"{m['primary_won']} par le principal), {m['cancelled']} coupés, {m['capped']} refusés (plafond)"
+                + (f" | p95 {thresholds}" if thresholds else ""))
+
+
+def hedged_call(hedger: Optional[Hedger], stage: str, primary: str, leg: Callable):
+    """`leg(primary, requests)` sans hedger, sinon appel doublé si lent (cf. Hedger.call)"""
+    if hedger is None:
+        return leg(primary, requests)
+    return hedger.call(stage, primary, leg)
+
+
+# ---------------------- Simulation ----------------------
+def simulate(calls: int = 400, max_rate: float = DEFAULT_MAX_RATE, slow_rate: float = 0.05,
+             service: float = 0.02):
+    """Serveur principal avec 5 % d'appels 4x plus lents, secours identique (sans réseau)"""
+    hedger = Hedger(["http://secours"], max_rate=max_rate)
+
+    def leg(url, session):
+        slow = random.random() < slow_rate
+        end = time.monotonic() + service * (4 if slow else 1) * random.uniform(0.9, 1.2)
+        cancelled = getattr(session, "cancelled", None)
+        while time.monotonic() < end:
+            if cancelled is not None and cancelled.is_set():
+                raise HedgeCancelled("appel annulé")
+            time.sleep(0.002)
+        return url
+
+    latencies = []
+    for _ in range(calls):
+        start = time.monotonic()
+        hedger.call("simulé", "http://principal", leg)
+        latencies.append(time.monotonic() - start)
+    latencies.sort()
+    p50, p99 = latencies[len(latencies) // 2], latencies[int(0.99 * len(latencies))]
+    print(f"🧪 Simulation: {calls} appels, {slow_rate:.0%} lents (x4), plafond {max_rate:.0%}")
+    print(f"🪁 {hedger.summary()}")
+    print(f"📈 p50 {p50 * 1000:.0f} ms | p99 {p99 * 1000:.0f} ms | max {latencies[-1] * 1000:.0f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Requêtes doublées vers des serveurs redondants")
+    parser.add_argument("--simulate", action="store_true", help="simulation sans serveur")
+    parser.add_argument("--calls", type=int, default=400)
+    parser.add_argument("--max-rate", type=float, default=DEFAULT_MAX_RATE)
+    args = parser.parse_args()
+    if not args.simulate:
+        parser.error("seul --simulate est disponible (sinon : cv_batch.py --hedge-url)")
+    simulate(args.calls, args.max_rate)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+🖼️ OUTILS IMAGE POUR LES CV
+
+Lecture des dimensions d'une image (JPEG, PNG, WebP, GIF) directement
+dans l'en-tête du fichier, sans dépendance externe, et nombre de pages
+d'un PDF. Utilisé pour estimer le coût d'un CV avant de l'envoyer au modèle.
+
+Le redimensionnement (OCR en basse résolution) utilise Pillow s'il est
+installé ; sans Pillow, les images sont envoyées telles quelles.
+
+Une image se donne par son chemin ou par ses octets déjà en mémoire
+(membre d'une archive, cf. cv_archive.py).
+"""
+import io
+import math
+import re
+import struct
+from pathlib import Path
+from typing import NamedTuple, Optional, Tuple
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow optionnel : pas de redimensionnement
+    Image = None
+
+# Première passe OCR : ~1 Mpx suffit à lire un CV imprimé (≈ 100 dpi sur A4)
+LOW_RES_PIXELS = 1_000_000
+
+
+class ImageInfo(NamedTuple):
+    width: int
+    height: int
+    size_bytes: int
+    pages: int
+    format: str
+
+    @property
+    def megapixels(self) -> float:
+        return self.width * self.height * self.pages / 1_000_000
+
+
+_PDF_PAGE = re.compile(rb"/Type\s*/Page(?!s)")
+
+
+def _jpeg_size(data: bytes) -> Optional[Tuple[int, int]]:
+    i = 2
+    while i + 9 < len(data):
+        if data[i] != 0xFF:
+            i += 1
+            continue
+        marker = data[i + 1]
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7 or marker == 0xFF:
+            i += 1 if marker == 0xFF else 2
+            continue
+        length = struct.unpack(">H", data[i + 2:i + 4])[0]
+        # SOF0..SOF15 sauf DHT (C4), JPG (C8), DAC (CC)
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            height, width = struct.unpack(">HH", data[i + 5:i + 9])
+            return width, height
+        i += 2 + length
+    return None
+
+
+def _png_size(data: bytes) -> Optional[Tuple[int, int]]:
+    if data[12:16] == b"IHDR":
+        return struct.unpack(">II", data[16:24])
+    return None
+
+
+def _webp_size(data: bytes) -> Optional[Tuple[int, int]]:
+    chunk = data[12:16]
+    if chunk == b"VP8 " and len(data) >= 30:
+        w, h = struct.unpack("<HH", data[26:30])
+        return w & 0x3FFF, h & 0x3FFF
+    if chunk == b"VP8L" and len(data) >= 25:
+        b = data[21:25]
+        w = 1 + (((b[1] & 0x3F) << 8) | b[0])
+        h = 1 + (((b[3] & 0x0F) << 10) | (b[2] << 2) | ((b[1] & 0xC0) >> 6))
+        return w, h
+    if chunk == b"VP8X" and len(data) >= 30:
+        w = 1 + int.from_bytes(data[24:27], "little")
+        h = 1 + int.from_bytes(data[27:30], "little")
+        return w, h
+    return None
+
+
+def image_size_from_bytes(data: bytes) -> Optional[Tuple[int, int]]:
+    """Dimensions (largeur, hauteur) lues dans l'en-tête, None si format inconnu"""
+    try:
+        if data[:2] == b"\xff\xd8":
+            return _jpeg_size(data)
+        if data[:8] == b"\x89PNG\r\n\x1a\n":
+            return _png_size(data)
+        if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+            return _webp_size(data)
+        if data[:6] in (b"GIF87a", b"GIF89a"):
+            return struct.unpack("<HH", data[6:10])
+    except struct.error:
+        return None
+    return None
+
+
+def image_format(data: bytes) -> str:
+    """Format d'après les premiers octets (jpg, png, webp, gif, pdf), "inconnu" sinon"""
+    if data[:2] == b"\xff\xd8":
+        return "jpg"
+    if data[:8] == b"\x89PNG\r\n\x1a\n":
+        return "png"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "webp"
+    if data[:6] in (b"GIF87a", b"GIF89a"):
+        return "gif"
+    if data[:5] == b"%PDF-":
+        return "pdf"
+    return "inconnu"
+
+
+def _open(source):
+    """Chemin tel quel, octets enveloppés en fichier (pour Image.open)"""
+    return io.BytesIO(source) if isinstance(source, (bytes, bytearray)) else source
+
+
+def image_info(path) -> ImageInfo:
+    """Dimensions, taille et nombre de pages d'un CV (image ou PDF, chemin ou octets)"""
+    if isinstance(path, (bytes, bytearray)):
+        data = bytes(path)
+        fmt = image_format(data)
+        if fmt == "pdf":
+            return ImageInfo(1240, 1754, len(data), max(1, len(_PDF_PAGE.findall(data))), "pdf")
+        width, height = image_size_from_bytes(data[:256 * 1024]) or (0, 0)
+        return ImageInfo(width, height, len(data), 1, fmt)
+    p = Path(path)
+    size_bytes = p.stat().st_size
+    if p.suffix.lower() == ".pdf":
+        data = p.read_bytes()
+        pages = max(1, len(_PDF_PAGE.findall(data)))
+        # Dimensions d'une page A4 rendue à 150 dpi
+        return ImageInfo(1240, 1754, size_bytes, pages, "pdf")
+    with open(p, "rb") as f:
+        # Les marqueurs SOF d'un JPEG peuvent suivre de gros blocs EXIF
+        head = f.read(256 * 1024)
+    dims = image_size_from_bytes(head)
+    width, height = dims if dims else (0, 0)
+    fmt = p.suffix.lower().lstrip(".") or "inconnu"
+    return ImageInfo(width, height, size_bytes, 1, fmt)
+
+
+def downscale_image(path, max_pixels: int = LOW_RES_PIXELS, quality: int = 85) -> Optional[bytes]:
+    """
+    JPEG réduit à `max_pixels` pixels au plus.
+    None si Pillow est absent ou si l'image est déjà assez petite.
+    """
+    if Image is None:
+        return None
+    with Image.open(_open(path)) as im:
+        width, height = im.size
+        if width * height <= max_pixels:
+            return None
+        scale = math.sqrt(max_pixels / (width * height))
+        small = im.convert("RGB").resize((max(1, int(width * scale)), max(1, int(height * scale))),
+                                         Image.LANCZOS)
+    buf = io.BytesIO()
+    small.save(buf, "JPEG", quality=quality)
+    return buf.getvalue()
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+📓 JOURNAL DE REPRISE DES TRAITEMENTS PAR LOTS
+
+Journal JSONL en ajout seul : une ligne par changement d'état d'un CV.
+Chaque écriture est suivie d'un fsync, un lot interrompu (LM Studio planté,
+portable en veille) peut donc reprendre là où il s'était arrêté.
+
+États successifs d'un CV :
+- queued        : CV pris en compte par le lot
+- ocr_done      : texte OCR obtenu (stocké dans le journal)
+- analysis_done : analyse RH terminée (JSON stocké dans le journal)
+- failed        : échec, avec la raison
+- timeout       : échéance dépassée (cv_deadline.py), avec l'étape atteinte ;
+                  le texte OCR déjà obtenu reste disponible pour la reprise
+
+Les entrées portent les empreintes SHA-256 de l'image et de l'offre :
+un CV modifié ou une autre offre n'est jamais considéré comme déjà traité.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+QUEUED = "queued"
+OCR_DONE = "ocr_done"
+ANALYSIS_DONE = "analysis_done"
+FAILED = "failed"
+TIMEOUT = "timeout"
+
+
+def file_sha256(path, chunk_size: int = 1 << 20) -> str:
+    """Empreinte SHA-256 d'un fichier, lu par blocs"""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(chunk_size), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def text_sha256(text: str) -> str:
+    """Empreinte SHA-256 d'un texte (offre d'emploi)"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def entry_key(image_sha256: str, offer_sha256: str) -> str:
+    """Clé d'un CV dans le journal : contenu de l'image + offre"""
+    return f"{image_sha256[:20]}:{offer_sha256[:20]}"
+
+
+class CheckpointJournal:
+    def __init__(self, path: str):
+        """
+        Journal de reprise
+        path : fichier JSONL (créé si absent, complété sinon)
+        """
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._states: Dict[str, dict] = {}
+        self._ocr_by_image: Dict[str, str] = {}
+        self._load()
+        self._repair_tail()
+        self._file = open(self.path, 'a', encoding='utf-8')
+
+    def _load(self):
+        """Relire le journal existant et fusionner les états par clé"""
+        if not self.path.exists():
+            return
+        skipped = 0
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # Dernière ligne tronquée par un arrêt brutal
+                    skipped += 1
+                    continue
+                self._merge(entry)
+        if skipped:
+            print(f"⚠️ Journal: {skipped} ligne(s) illisible(s) ignorée(s)")
+
+    def _repair_tail(self):
+        """
+        Terminer proprement le journal avant d'y ajouter des lignes :
+        une dernière ligne sans retour à la ligne (arrêt brutal pendant
+        l'écriture) collerait sinon la prochaine entrée à ce débris.
+        Un débris illisible est tronqué, une ligne valide est complétée par "\n".
+        """
+        if not self.path.exists():
+            return
+        with open(self.path, 'r+b') as f:
+            data = f.read()
+            if not data or data.endswith(b"\n"):
+                return
+            start = data.rfind(b"\n") + 1
+            try:
+                json.loads(data[start:].decode('utf-8'))
+            except (UnicodeDecodeError, json.JSONDecodeError):
+                f.truncate(start)
+            else:
+                f.write(b"\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _merge(self, entry: dict):
+        state = self._states.setdefault(entry["key"], {})
+        state.update(entry)
+        if entry["state"] not in (FAILED, TIMEOUT):
+            state.pop("reason", None)
+        if entry.get("ocr_text") and entry.get("image_sha256"):
+            self._ocr_by_image[entry["image_sha256"]] = entry["ocr_text"]
+
+    def record(self, key: str, state: str, **fields) -> dict:
+        """Ajouter une entrée et la rendre durable (flush + fsync)"""
+        entry = {"ts": time.strftime("%Y-%m-%dT%H:%M:%S"), "key": key, "state": state}
+        entry.update(fields)
+        line = json.dumps(entry, ensure_ascii=False)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._merge(entry)
+        return entry
+
+    def get(self, key: str) -> Optional[dict]:
+        """Dernier état connu d'un CV (champs fusionnés), None si inconnu"""
+        with self._lock:
+            state = self._states.get(key)
+            return dict(state) if state else None
+
+    def find_ocr_text(self, image_sha256: str) -> Optional[str]:
+        """Texte OCR déjà obtenu pour cette image, quelle que soit l'offre"""
+        with self._lock:
+            return self._ocr_by_image.get(image_sha256)
+
+    def entries(self, state: Optional[str] = None) -> List[dict]:
+        """États courants de tous les CV (champs fusionnés), filtrés par état si demandé"""
+        with self._lock:
+            return [dict(s) for s in self._states.values() if state is None or s["state"] == state]
+
+    def summary(self) -> Dict[str, int]:
+        """Nombre de CV par état courant"""
+        counts: Dict[str, int] = {}
+        with self._lock:
+            for state in self._states.values():
+                counts[state["state"]] = counts.get(state["state"], 0) + 1
+        return counts
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+🎚️ CONCURRENCE ADAPTATIVE VERS LE SERVEUR MODÈLE (AIMD)
+
+Un serveur LM Studio / Ollama ne sert efficacement que quelques
+générations en parallèle : trop peu d'appels en cours laissent le GPU
+inactif, trop font exploser la latence jusqu'aux délais des requêtes.
+Plutôt que de choisir le nombre de workers à la main pour chaque GPU,
+AdaptiveLimit ajuste la limite d'appels simultanés d'après ce qu'il observe :
+
+- hausse additive   : +1/limite par appel réussi pendant que la limite est
+                      atteinte (environ +1 par « tour » complet d'appels)
+- baisse multiplicative : x0.7 sur erreur (délai dépassé, connexion perdue)
+                      ou si la latence dépasse `tolerance` fois la latence
+                      de référence, au plus une baisse par tour d'appels
+
+La latence de référence est la plus basse des derniers appels, par type
+d'appel (OCR, analyse... leurs durées n'ont rien à voir) : les baisses de
+limite y ramènent régulièrement des appels peu chargés, et un changement
+de modèle finit par sortir de la fenêtre.
+
+La limite s'applique via PriorityScheduler (cv_scheduler.py, `limiter=`),
+qui garde l'ordre des priorités ; elle est exportée par snapshot() et par
+le proxy (GET /cv-scheduler/metrics, format Prometheus).
+
+Simulation (sans modèle) :
+python cv_limiter.py --simulate --gpu-parallel 3 --max 8
+"""
+import argparse
+import random
+import threading
+import time
+from collections import deque
+from typing import Dict
+
+# Latence au-delà de laquelle le serveur est considéré saturé (x référence)
+DEFAULT_TOLERANCE = 2.0
+# Facteur de baisse multiplicative
+DEFAULT_BACKOFF = 0.7
+# Appels retenus, par type, pour la latence de référence
+BASELINE_WINDOW = 100
+
+
+class AdaptiveLimit:
+    def __init__(self, initial: int = 1, min_limit: int = 1, max_limit: int = 8,
+                 tolerance: float = DEFAULT_TOLERANCE, backoff: float = DEFAULT_BACKOFF):
+        """
+        Limite AIMD d'appels simultanés vers un serveur
+        initial   : limite de départ
+        min_limit / max_limit : bornes de la limite
+        tolerance : latence / référence au-delà de laquelle on réduit
+        backoff   : facteur de réduction (0 < backoff < 1)
+        """
+        if not 1 <= min_limit <= max_limit:
+            raise ValueError("il faut 1 <= min_limit <= max_limit")
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.tolerance = tolerance
+        self.backoff = backoff
+        self.limit = float(min(max(initial, min_limit), max_limit))
+        self._latencies: Dict[str, deque] = {}
+        self.stats = {"calls": 0, "errors": 0, "slow": 0, "increases": 0, "decreases": 0}
+        # Limites successives (instant, limite) pour tracer la convergence
+        self.history = deque([(time.monotonic(), self.current())], maxlen=500)
+        self._since_decrease = max_limit
+        self._lock = threading.Lock()
+
+    def current(self) -> int:
+        """Limite entière appliquée"""
+        return max(self.min_limit, int(self.limit))
+
+    def observe(self, kind: str, latency: float, ok: bool, in_flight: int) -> int:
+        """
+        Résultat d'un appel
+        kind      : type d'appel (une latence de référence par type)
+        in_flight : appels en cours au moment où celui-ci a démarré (lui compris)
+        Renvoie la nouvelle limite.
+        """
+        with self._lock:
+            before = self.current()
+            self.stats["calls"] += 1
+            self._since_decrease += 1
+            if not ok:
+                self.stats["errors"] += 1
+                self._decrease()
+            else:
+                recent = self._latencies.setdefault(kind, deque(maxlen=BASELINE_WINDOW))
+                recent.append(latency)
+                if latency > min(recent) * self.tolerance:
+                    self.stats["slow"] += 1
+                    self._decrease()
+                elif in_flight >= before and self.limit < self.max_limit:
+                    # On n'augmente que si la limite a réellement servi
+                    self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+                    if self.current() > before:
+                        self.stats["increases"] += 1
+            if self.current() != before:
+                self.history.append((time.monotonic(), self.current()))
+            return self.current()
+
+    def _decrease(self):
+        # Les appels partis avant une baisse reviennent lents aussi : une seule baisse par tour
+        if self._since_decrease < self.current():
+            return
+        self.limit = max(float(self.min_limit), self.limit * self.backoff)
+        self._since_decrease = 0
+        self.stats["decreases"] += 1
+
+    def metrics(self) -> dict:
+        with self._lock:
+            return dict(self.stats, limit=self.current(), min_limit=self.min_limit,
+                        max_limit=self.max_limit,
+                        baselines={k: round(min(v), 3) for k, v in self._latencies.items()})
+
+    def summary(self) -> str:
+        m = self.metrics()
+        return (f"limite {m['limit']} (bornes {m['min_limit']}-{m['max_limit']}) | {m['calls']} appels, "
+                f"{m['errors']} erreurs, {m['slow']} lents | {m['increases']} hausses / {m['decreases']} baisses")
+
+
+# ---------------------- Simulation ----------------------
+def simulate(gpu_parallel: int = 3, max_limit: int = 8, workers: int = 12, calls: int = 300,
+             service: float = 0.05):
+    """
+    Serveur simulé : jusqu'à `gpu_parallel` générations en parallèle sans
+    ralentir, au-delà la latence croît avec le nombre d'appels en cours
+    """
+    from cv_scheduler import BULK, PriorityScheduler
+
+    limiter = AdaptiveLimit(initial=1, max_limit=max_limit)
+    scheduler = PriorityScheduler(max_concurrent=max_limit, limiter=limiter)
+    active = [0]
+    lock = threading.Lock()
+    remaining = [calls]
+
+    def worker():
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    return
+                remaining[0] -= 1
+            with scheduler.slot(BULK, kind="simulé"):
+                with lock:
+                    active[0] += 1
+                    load = active[0]
+                time.sleep(service * max(1.0, load / gpu_parallel) * random.uniform(0.9, 1.1))
+                with lock:
+                    active[0] -= 1
+
+    start = time.monotonic()
+    threads = [threading.Thread(target=worker) for _ in range(workers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.monotonic() - start
+
+    limits = [limit for _, limit in limiter.history]
+    print(f"🧪 Simulation: GPU {gpu_parallel} en parallèle, {workers} workers, limite max {max_limit}")
+    print(f"🎚️ {limiter.summary()}")
+    print(f"📈 Limites successives: {' '.join(map(str, limits[-20:]))}")
+    print(f"⚡ Débit: {calls / wall:.1f} appels/s (idéal {gpu_parallel / service:.1f})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrence adaptative (AIMD) vers le serveur modèle")
+    parser.add_argument("--simulate", action="store_true", help="simulation sans modèle")
+    parser.add_argument("--gpu-parallel", type=int, default=3, help="parallélisme réel du serveur simulé")
+    parser.add_argument("--max", type=int, default=8, help="limite maximale")
+    parser.add_argument("--workers", type=int, default=12)
+    parser.add_argument("--calls", type=int, default=300)
+    args = parser.parse_args()
+    if not args.simulate:
+        parser.error("seul --simulate est disponible (sinon : cv_batch.py --adaptive, cv_scheduler.py --adaptive)")
+    simulate(args.gpu_parallel, args.max, args.workers, args.calls)
+
+
+if __name__ == "__main__":
+    main()
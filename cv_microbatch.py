@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+📚 MICRO-LOTS D'OCR (PLUSIEURS CV PAR REQUÊTE)
+
+Pour les petits CV d'une page, le coût fixe d'une requête (connexion,
+gabarit de chat, pré-remplissage du prompt d'instructions) pèse autant
+que la lecture de l'image. Un micro-lot envoie plusieurs images dans
+une seule requête, avec une consigne de sortie délimitée :
+
+    === CV 1 ===
+    texte du premier CV
+    === CV 2 ===
+    ...
+
+La réponse est redécoupée et vérifiée CV par CV. Au moindre écart
+(délimiteur manquant, en double, dans le désordre, section vide), le
+micro-lot est abandonné et chaque CV est relu seul.
+"""
+import re
+from typing import Dict, List, Optional, Sequence
+
+from cv_image import image_info
+from cv_tokens import OCR_TOKENS_PER_PAGE, estimate_image_tokens
+
+# Taille par défaut d'un micro-lot
+DEFAULT_PACK_SIZE = 4
+# Seuls les « petits » CV sont regroupés (une page, image modeste)
+SMALL_CV_MEGAPIXELS = 2.5
+# Texte minimal attendu pour une section de CV
+MIN_SECTION_CHARS = 40
+
+BATCH_OCR_PROMPT = """Tu reçois {count} images. Chaque image est un CV différent.
+Pour chaque image, dans l'ordre, écris d'abord la ligne "=== CV n ===" (n = numéro de l'image, de 1 à {count}),
+puis tout le texte de cette image en respectant la mise en forme originale.
+Pas d'introduction ni conclusion, extraction de texte seulement. Ne rate aucun mot. Ne mélange pas les CV."""
+
+DELIMITER_RE = re.compile(r"^[ \t]*=+[ \t]*CV[ \t]*(\d+)[ \t]*=+[ \t]*$", re.MULTILINE | re.IGNORECASE)
+
+
+def split_batched_output(text: Optional[str], count: int) -> Optional[List[str]]:
+    """
+    Textes par CV d'une réponse délimitée, dans l'ordre des images.
+    None si la réponse ne correspond pas exactement aux `count` CV envoyés.
+    """
+    if not text:
+        return None
+    matches = list(DELIMITER_RE.finditer(text))
+    if [int(m.group(1)) for m in matches] != list(range(1, count + 1)):
+        return None
+    sections = []
+    for i, match in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+        section = text[match.end():end].strip()
+        if len(section) < MIN_SECTION_CHARS:
+            return None
+        sections.append(section)
+    return sections
+
+
+def is_small_cv(path) -> bool:
+    """CV regroupable : une seule page et une image de taille modeste"""
+    try:
+        info = image_info(path)
+    except OSError:
+        return False
+    return info.pages == 1 and 0 < info.megapixels <= SMALL_CV_MEGAPIXELS
+
+
+def plan_packs(paths: Sequence[str], pack_size: int = DEFAULT_PACK_SIZE,
+               context_length: Optional[int] = None) -> List[List[str]]:
+    """
+    Regrouper les petits CV par `pack_size` (ordre conservé), les autres restent seuls.
+    Avec context_length, un micro-lot est aussi limité à ce qui tient dans le contexte
+    (images + texte attendu pour chaque CV).
+    """
+    packs: List[List[str]] = []
+    current: List[str] = []
+    current_tokens = 0
+    for path in paths:
+        if pack_size < 2 or not is_small_cv(path):
+            packs.append([path])
+            continue
+        info = image_info(path)
+        tokens = estimate_image_tokens(info.width, info.height) + OCR_TOKENS_PER_PAGE
+        too_big = context_length is not None and current and current_tokens + tokens > context_length * 0.9
+        if len(current) >= pack_size or too_big:
+            packs.append(current)
+            current, current_tokens = [], 0
+        current.append(path)
+        current_tokens += tokens
+    if current:
+        packs.append(current)
+    return packs
+
+
+def pack_stats(packs: Sequence[Sequence[str]]) -> Dict[str, int]:
+    return {"cv": sum(len(p) for p in packs), "requests": len(packs),
+            "batched": sum(len(p) for p in packs if len(p) > 1)}
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+📝 NOTATION D'ABORD, DÉTAIL RÉDIGÉ À LA DEMANDE
+
+Points forts, points faibles, compétences, expérience pertinente et
+commentaires représentent l'essentiel des tokens générés par CV (~800
+tokens, soit ~25 s à 30 tokens/s), alors que les RH ne les lisent que
+pour la liste restreinte. En mode notation (--scores-only) :
+
+- l'analyse ne génère que nom_prenom, les scores et la recommandation
+  (~60 tokens de sortie) : même prompt, champs rédigés retirés
+- le détail n'est rédigé que pour les K premiers du classement en fin de
+  lot, ou quand un candidat est ouvert (python cv_narrative.py show ...)
+- le détail est mis en cache par CV et par offre (cv_narratives.json) :
+  un candidat rouvert ne coûte plus d'appel
+
+Le détail part des scores déjà obtenus : il les explique, il ne les refait
+pas. Avec le texte OCR (two-step, journal) c'est un appel texte ; sans
+texte (one-shot), l'analyse complète est relancée sur l'image et seuls
+ses champs rédigés sont gardés.
+
+Usage:
+python cv_batch.py cvs/ "Développeur Python Junior" --scores-only --detail-top 10
+python cv_narrative.py show cvs/dupont.jpg "Développeur Python Junior"
+"""
+import argparse
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from cv_cascade import SCORE_LIMITS
+from cv_journal import entry_key, file_sha256, text_sha256
+from cv_offer import assembler_for, completion_for
+from cv_salvage import recover_analysis, repair_json
+from cv_tokens import ANALYSIS_FIELD_BUDGETS, schema_output_tokens
+
+DEFAULT_CACHE = "cv_narratives.json"
+NARRATIVE_FIELDS = ("points_forts", "points_faibles", "competences_matchees", "competences_manquantes",
+                    "experience_pertinente", "commentaires")
+SCORES_OUTPUT_TOKENS = schema_output_tokens(
+    {name: budget for name, budget in ANALYSIS_FIELD_BUDGETS.items() if name not in NARRATIVE_FIELDS})
+NARRATIVE_OUTPUT_TOKENS = schema_output_tokens({name: ANALYSIS_FIELD_BUDGETS[name] for name in NARRATIVE_FIELDS})
+
+NARRATIVE_PROMPT = """Vous êtes un expert RH très exigeant.
+Le candidat ci-dessous a déjà été évalué pour le poste :
+{scores}
+
+Rédigez le détail de cette évaluation, cohérent avec les scores donnés.
+Répondez UNIQUEMENT par un objet JSON contenant exactement ces champs :
+{{
+  "points_forts": ["liste des points forts du candidat"],
+  "points_faibles": ["liste des points faibles ou manques"],
+  "competences_matchees": ["compétences qui correspondent à l'offre"],
+  "competences_manquantes": ["compétences requises mais absentes"],
+  "experience_pertinente": "description détaillée de l'expérience pertinente",
+  "commentaires": "analyse détaillée du profil"
+}}
+
+POSTE: {job_offer}
+CV: {cv_text}
+"""
+
+
+def scores_prompt(template: str) -> str:
+    """Prompt d'analyse sans les champs rédigés (ni la règle qui les décrit)"""
+    lines = [line for line in template.split("\n")
+             if not any(f'"{name}"' in line.replace('\\"', '"') for name in NARRATIVE_FIELDS)]
+    # Virgule de fin avant la fermeture du gabarit JSON ("}}" en syntaxe str.format)
+    for i, line in enumerate(lines):
+        if line.strip() == "}}" and i > 0 and lines[i - 1].rstrip().endswith(","):
+            lines[i - 1] = lines[i - 1].rstrip()[:-1]
+    return "\n".join(lines)
+
+
+def has_narrative(analysis: Optional[dict]) -> bool:
+    return bool(analysis) and all(name in analysis for name in NARRATIVE_FIELDS)
+
+
+class NarrativeCache:
+    def __init__(self, path: Optional[str] = DEFAULT_CACHE):
+        """
+        Détails rédigés par CV et par offre (clé du journal)
+        path : fichier JSON (None = cache en mémoire seulement)
+        """
+        self.path = Path(path) if path else None
+        self._lock = threading.Lock()
+        self._entries: Dict[str, dict] = self._load()
+
+    def _load(self) -> Dict[str, dict]:
+        if not self.path or not self.path.exists():
+            return {}
+        try:
+            return json.loads(self.path.read_text(encoding='utf-8'))
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"⚠️ Cache des détails illisible, ignoré ({e})")
+            return {}
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            return dict(entry) if entry else None
+
+    def put(self, key: str, narrative: dict):
+        with self._lock:
+            self._entries[key] = narrative
+            if not self.path:
+                return
+            # Détails ajoutés entre-temps par un autre processus sur le même fichier
+            self._entries = dict(self._load(), **self._entries)
+            tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+            tmp.write_text(json.dumps(self._entries, indent=2, ensure_ascii=False), encoding='utf-8')
+            os.replace(tmp, self.path)
+
+
+class NarrativeWriter:
+    def __init__(self, analyzers: Dict[str, object], job_offer: str, cache: NarrativeCache):
+        """
+        Rédaction du détail d'une analyse notée
+        analyzers : analyseurs par mode (cf. cv_batch.build_analyzer)
+        job_offer : offre telle qu'envoyée au modèle (profil compilé ou offre brute)
+        """
+        self.analyzers = analyzers
+        self.job_offer = job_offer
+        self.cache = cache
+        self._completions = {mode: completion_for(analyzer, label="Détail", max_tokens=NARRATIVE_OUTPUT_TOKENS)
+                             for mode, analyzer in analyzers.items()}
+        self.stats = {"cached": 0, "written": 0, "failed": 0}
+        self._lock = threading.Lock()
+
+    def _count(self, name: str):
+        with self._lock:
+            self.stats[name] += 1
+
+    def _from_text(self, mode: str, analysis: dict, cv_text: str) -> Optional[dict]:
+        scores = {name: analysis[name] for name in ("nom_prenom", *SCORE_LIMITS, "recommandation")
+                  if name in analysis}
+        assembled = assembler_for(self.analyzers[mode]).fit(
+            NARRATIVE_PROMPT,
+            {"scores": json.dumps(scores, ensure_ascii=False), "job_offer": self.job_offer, "cv_text": cv_text},
+            expected_output=NARRATIVE_OUTPUT_TOKENS
+        )
+        repaired = repair_json(self._completions[mode](assembled.prompt))
+        return repaired[0] if repaired else None
+
+    def _from_image(self, mode: str, source) -> Optional[dict]:
+        analyzer = self.analyzers[mode]
+        if mode == "ollama":
+            raw = analyzer.analyze_oneshot(source, self.job_offer, scores_only=False)
+        else:
+            raw = analyzer.analyze_cv_oneshot(source, self.job_offer, scores_only=False)
+        return recover_analysis(raw)
+
+    def detail(self, key: str, entry: dict, source=None) -> Optional[dict]:
+        """
+        Analyse complétée du détail rédigé (cache, sinon un appel), None si impossible
+        entry  : état du CV dans le journal (analyse, texte OCR, mode)
+        source : image du CV (chemin ou octets), nécessaire sans texte OCR
+        """
+        analysis = entry.get("analysis")
+        if not analysis:
+            return None
+        if has_narrative(analysis):
+            return analysis
+        cached = self.cache.get(key)
+        if cached:
+            self._count("cached")
+            return dict(analysis, **cached)
+
+        mode = entry.get("mode")
+        cv_text = entry.get("ocr_text")
+        # Sans texte OCR : analyse complète sur l'image, par un analyseur one-shot
+        vision = mode if mode in ("oneshot", "ollama") else next(
+            (m for m in self.analyzers if m != "two-step"), None)
+        if cv_text and self.analyzers:
+            reply = self._from_text(mode if mode in self.analyzers else next(iter(self.analyzers)),
+                                    analysis, cv_text)
+        elif source is not None and vision in self.analyzers:
+            reply = self._from_image(vision, source)
+        else:
+            print(f"⚠️ Détail impossible sans texte OCR ni image: {entry.get('path', key)}")
+            reply = None
+        narrative = {name: reply[name] for name in NARRATIVE_FIELDS if name in reply} if reply else {}
+        if not narrative:
+            self._count("failed")
+            return None
+        self.cache.put(key, narrative)
+        self._count("written")
+        return dict(analysis, **narrative)
+
+    def summary(self) -> str:
+        s = self.stats
+        return f"{s['written']} rédigés, {s['cached']} repris du cache, {s['failed']} échecs"
+
+
+def detail_top(writer: NarrativeWriter, journal, rows: List[dict], offer_sha256: str,
+               workers: int = 1) -> List[Tuple[dict, dict]]:
+    """Détail des candidats du classement (lignes de Leaderboard.top), en parallèle : [(ligne, analyse)]"""
+    def one(row: dict) -> Optional[dict]:
+        path = row["fichier"]
+        try:
+            key = entry_key(file_sha256(path), offer_sha256)
+        except OSError:
+            print(f"⚠️ Détail à la demande seulement (image non relisible): {path}")
+            return None
+        entry = journal.get(key)
+        if not entry:
+            return None
+        return writer.detail(key, entry, source=path)
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        return [(row, analysis) for row, analysis in zip(rows, pool.map(one, rows)) if analysis]
+
+
+def display(path: str, analysis: dict):
+    print("\n" + "=" * 60)
+    print(f"👤 {analysis.get('nom_prenom', 'N/A')} ({Path(path).name}) : {analysis.get('score_global', 0)}/100, "
+          f"{analysis.get('recommandation', 'N/A')}")
+    print(f"  🔧 {analysis.get('score_technique', 0)}/40  💼 {analysis.get('score_experience', 0)}/30  "
+          f"🎓 {analysis.get('score_formation', 0)}/15  🤝 {analysis.get('score_soft_skills', 0)}/15")
+    for title, name in (("✅ POINTS FORTS", "points_forts"), ("⚠️ POINTS FAIBLES", "points_faibles"),
+                        ("🎯 COMPÉTENCES MATCHÉES", "competences_matchees"),
+                        ("❌ COMPÉTENCES MANQUANTES", "competences_manquantes")):
+        print(f"\n{title}:")
+        for item in analysis.get(name) or []:
+            print(f"  • {item}")
+    print(f"\n💼 EXPÉRIENCE PERTINENTE:\n  {analysis.get('experience_pertinente', 'N/A')}")
+    print(f"\n💭 COMMENTAIRES:\n  {analysis.get('commentaires', 'N/A')}")
+    print("=" * 60)
+
+
+def main():
+    from cv_batch import build_analyzer
+    from cv_journal import CheckpointJournal
+    from cv_offer import DEFAULT_CACHE as OFFER_CACHE, OfferCompiler
+
+    parser = argparse.ArgumentParser(description="Détail rédigé d'un candidat noté (à la demande, mis en cache)")
+    sub = parser.add_subparsers(dest="command", required=True)
+    show = sub.add_parser("show", help="afficher le détail d'un candidat")
+    show.add_argument("cv", help="image du CV analysée par le lot")
+    show.add_argument("offer", help="offre d'emploi du lot")
+    show.add_argument("--journal", default="cv_batch_journal.jsonl")
+    show.add_argument("--cache", default=DEFAULT_CACHE)
+    show.add_argument("--base-url", default=os.environ.get("CV_BASE_URL"))
+    show.add_argument("--raw-offer", action="store_true", help="offre brute (si le lot l'a utilisée)")
+    show.add_argument("--offer-cache", default=OFFER_CACHE)
+    args = parser.parse_args()
+
+    with CheckpointJournal(args.journal) as journal:
+        key = entry_key(file_sha256(args.cv), text_sha256(args.offer))
+        entry = journal.get(key)
+        if not entry or not entry.get("analysis"):
+            print(f"❌ {args.cv} n'a pas été analysé pour cette offre (journal {args.journal})")
+            return
+        cache = NarrativeCache(args.cache)
+        analysis = entry["analysis"]
+        if not has_narrative(analysis) and not cache.get(key):
+            mode = entry.get("mode", "two-step")
+            if mode == "auto":
+                # Mode hybride : analyseur de la stratégie retenue pour ce CV
+                mode = "two-step" if entry.get("ocr_text") else (
+                    "ollama" if entry.get("route_backend") == "ollama" else "oneshot")
+            analyzer = build_analyzer(mode, base_url=args.base_url)
+            if not analyzer.check_connection():
+                return
+            prompt_offer = args.offer if args.raw_offer else OfferCompiler(
+                completion_for(analyzer), args.offer_cache).prompt_text(args.offer)
+            entry = dict(entry, mode=mode)
+            analysis = NarrativeWriter({mode: analyzer}, prompt_offer, cache).detail(key, entry, source=args.cv)
+        else:
+            analysis = NarrativeWriter({}, args.offer, cache).detail(key, entry)
+        if analysis:
+            display(args.cv, analysis)
+
+
+if __name__ == "__main__":
+    main()
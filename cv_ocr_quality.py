@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+🎯 SCORE DE QUALITÉ D'UN TEXTE OCR DE CV
+
+Indicateurs génériques (valables pour n'importe quel candidat) :
+- email et téléphone reconnaissables
+- dates (années, mois, périodes)
+- titres de sections usuels (Expérience, Formation, Compétences...)
+- longueur suffisante
+- proportion de caractères parasites
+
+Le score (0 à 1) sert à décider si une page lue en basse résolution
+doit être relue en pleine résolution.
+"""
+import re
+from typing import Dict, NamedTuple
+
+EMAIL_RE = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+", re.UNICODE)
+PHONE_RE = re.compile(r"(?:\+\d{1,3}[\s.-]?)?(?:\(?\d{1,4}\)?[\s.-]?){2,5}\d{2,4}")
+DATE_RE = re.compile(
+    r"\b(?:19|20)\d{2}\b"
+    r"|\b\d{1,2}[/.-](?:19|20)?\d{2}\b"
+    r"|\b(?:janv|févr|fevr|mars|avr|mai|juin|juil|août|aout|sept|oct|nov|déc|dec"
+    r"|jan|feb|mar|apr|may|jun|jul|aug|sep)[a-zéû]*\.?\s+(?:19|20)\d{2}\b",
+    re.IGNORECASE,
+)
+SECTION_RE = re.compile(
+    r"^\W*(?:exp[ée]riences?(?:\s+professionnelles?)?|formations?|[ée]ducation|dipl[ôo]mes?"
+    r"|comp[ée]tences?|skills|langues?|languages|projets?|projects|certifications?"
+    r"|profil|profile|r[ée]sum[ée]|summary|centres? d'int[ée]r[êe]ts?|loisirs|interests"
+    r"|contact|coordonn[ée]es|r[ée]f[ée]rences?|stages?|b[ée]n[ée]volat)\b",
+    re.IGNORECASE | re.MULTILINE,
+)
+# Caractères attendus dans un CV ; le reste compte comme bruit d'OCR
+_EXPECTED_CHARS_RE = re.compile(r"[\w\s.,;:!?'\"’()\[\]/@+&%€$#*•·–—-]", re.UNICODE)
+_REPEAT_RE = re.compile(r"(.)\1{5,}")
+
+WEIGHTS = {
+    "email": 0.15,
+    "telephone": 0.10,
+    "dates": 0.20,
+    "sections": 0.25,
+    "longueur": 0.15,
+    "propre": 0.15,
+}
+MIN_LENGTH = 400
+MAX_GARBAGE_RATIO = 0.05
+DEFAULT_THRESHOLD = 0.6
+
+
+class OcrQuality(NamedTuple):
+    score: float
+    checks: Dict[str, bool]
+    garbage_ratio: float
+
+    def summary(self) -> str:
+        marks = ", ".join(f"{name} {'✓' if ok else '✗'}" for name, ok in self.checks.items())
+        return f"{self.score:.2f} ({marks})"
+
+
+def garbage_ratio(text: str) -> float:
+    """Part de caractères inattendus ou de répétitions anormales"""
+    stripped = text.strip()
+    if not stripped:
+        return 1.0
+    unexpected = len(stripped) - len(_EXPECTED_CHARS_RE.findall(stripped))
+    repeated = sum(len(m.group(0)) for m in _REPEAT_RE.finditer(stripped))
+    return min(1.0, (unexpected + repeated) / len(stripped))
+
+
+def score_ocr_text(text: str) -> OcrQuality:
+    """Évaluer un texte OCR de CV"""
+    text = text or ""
+    ratio = garbage_ratio(text)
+    checks = {
+        "email": EMAIL_RE.search(text) is not None,
+        "telephone": any(sum(c.isdigit() for c in m.group(0)) >= 8 for m in PHONE_RE.finditer(text)),
+        "dates": len(DATE_RE.findall(text)) >= 2,
+        "sections": len({m.group(0).strip(" \t:•-").lower() for m in SECTION_RE.finditer(text)}) >= 2,
+        "longueur": len(text.strip()) >= MIN_LENGTH,
+        "propre": ratio <= MAX_GARBAGE_RATIO,
+    }
+    score = sum(WEIGHTS[name] for name, ok in checks.items() if ok)
+    return OcrQuality(round(score, 3), checks, round(ratio, 4))
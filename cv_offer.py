@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+"""
+📋 PROFIL D'EXIGENCES D'UNE OFFRE (COMPILÉ UNE FOIS, RÉUTILISÉ PAR CV)
+
+Une offre d'emploi en texte libre est recopiée telle quelle dans le
+prompt de chaque CV du lot. Elle est ici compilée une seule fois en un
+profil compact :
+
+    POSTE: Développeur Python Junior
+    Requis: Python, Django, SQL
+    Apprécié: Docker
+    Niveau: junior, 1 an d'expérience min.
+    Formation: Bac+3 informatique
+    Langues: anglais
+    Qualités: autonomie, travail en équipe
+
+- compilation par le modèle (consigne JSON), complétée par une
+  extraction locale à base de vocabulaire : une compétence repérée
+  localement et oubliée par le modèle est rajoutée (aucune exigence perdue)
+- sans réponse exploitable du modèle, le profil local sert au
+  rapprochement local mais le prompt garde l'offre brute
+- le profil n'est utilisé dans le prompt que s'il est plus court que l'offre
+- cache JSON par empreinte SHA-256 de l'offre (cv_offer_profiles.json) :
+  une offre n'est compilée qu'une fois, même d'un lot à l'autre
+
+local_match() rapproche un texte de CV du profil sans appel modèle
+(compétences requises trouvées / manquantes).
+
+Usage:
+python cv_offer.py "Développeur Python Junior, Django et SQL requis, Docker apprécié"
+python cv_offer.py offre.txt --cv cv_extracted.txt      # profil + rapprochement local
+python cv_offer.py offre.txt --base-url http://localhost:1234/v1
+"""
+import argparse
+import json
+import os
+import re
+import threading
+import unicodedata
+from pathlib import Path
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+import requests
+
+from cv_cascade import parse_analysis
+from cv_deadline import request_timeout
+from cv_journal import text_sha256
+from cv_tokens import PromptAssembler, estimate_tokens
+
+DEFAULT_CACHE = "cv_offer_profiles.json"
+MODEL = "modèle"
+RULES = "règles"
+
+# Vocabulaire de compétences reconnu localement (forme affichée)
+SKILLS = (
+    "Python", "Java", "JavaScript", "TypeScript", "PHP", "C++", "C#", ".NET", "Golang", "Rust", "Kotlin",
+    "Swift", "Scala", "Ruby", "SQL", "NoSQL", "PostgreSQL", "MySQL", "Oracle", "MongoDB", "Redis",
+    "Elasticsearch", "Django", "Flask", "FastAPI", "Spring", "Symfony", "Laravel", "Node.js", "React",
+    "Angular", "Vue.js", "HTML", "CSS", "REST", "GraphQL", "Docker", "Kubernetes", "Terraform", "Ansible",
+    "AWS", "Azure", "GCP", "Linux", "Git", "CI/CD", "Jenkins", "Kafka", "Spark", "Hadoop", "Airflow",
+    "Pandas", "NumPy", "scikit-learn", "TensorFlow", "PyTorch", "Machine Learning", "Deep Learning",
+    "NLP", "LLM", "Power BI", "Tableau", "Excel", "SAP", "Salesforce", "Jira", "Scrum", "Agile",
+    "DevOps", "Figma", "Android", "iOS", "Selenium", "Cybersécurité",
+)
+LANGUAGES = ("français", "anglais", "espagnol", "allemand", "italien", "portugais", "arabe",
+             "chinois", "japonais", "néerlandais", "russe")
+# Savoir-être reconnus localement (radical sans accents -> forme affichée)
+SOFT_SKILLS = (
+    ("autonom", "autonomie"), ("curieu", "curiosité"), ("rigour", "rigueur"), ("rigueur", "rigueur"),
+    ("equipe", "travail en équipe"), ("communica", "communication"), ("organis", "organisation"),
+    ("force de proposition", "force de proposition"), ("adaptab", "adaptabilité"),
+    ("leadership", "leadership"), ("pedagog", "pédagogie"), ("dynamique", "dynamisme"),
+)
+# Indices d'une exigence facultative dans la phrase
+NICE_CUES = ("souhait", "apprecie", "un plus", "idealement", "atout", "bonus", "nice to have",
+             "serait un", "optionnel", "facultatif", "de preference")
+SENIORITY_WORDS = (
+    ("stage", ("stage", "stagiaire", "internship")),
+    ("alternance", ("alternance", "alternant", "apprentissage")),
+    ("junior", ("junior", "debutant", "jeune diplome")),
+    ("confirmé", ("confirme", "intermediaire", "experimente")),
+    ("senior", ("senior", "expert", "lead")),
+)
+EDUCATION_RE = re.compile(r"\b(bac\s*\+\s*\d|master|licence|ingenieur|doctorat|phd|bts|dut)\b")
+YEARS_RE = re.compile(r"(\d{1,2})\s*(?:\+|ou plus)?\s*(?:ans?|annees?|years?)\b")
+
+OFFER_PROMPT = """Extrais les exigences de l'offre d'emploi ci-dessous.
+Réponds uniquement avec ce JSON, sans texte autour :
+{{
+  "titre": "intitulé court du poste",
+  "competences_requises": ["compétences obligatoires"],
+  "competences_souhaitees": ["compétences appréciées, facultatives"],
+  "seniorite": "stage / alternance / junior / confirmé / senior",
+  "experience_min_ans": [nombre, 0 si non précisé],
+  "formation": "diplôme ou niveau demandé, vide si non précisé",
+  "langues": ["langues demandées"],
+  "qualites": ["savoir-être demandés"],
+  "autres_exigences": ["autres exigences : lieu, contrat, permis, disponibilité..."]
+}}
+N'oublie aucune exigence de l'offre. Pas de phrases, des termes courts.
+
+OFFRE:
+{job_offer}
+"""
+
+
+class OfferProfile(NamedTuple):
+    title: str
+    must_have: List[str]
+    nice_to_have: List[str]
+    seniority: str
+    min_years: int
+    education: str
+    languages: List[str]
+    soft_skills: List[str] = []
+    other: List[str] = []
+    source: str = RULES
+
+    def to_dict(self) -> dict:
+        return self._asdict()
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "OfferProfile":
+        return cls(**{field: data[field] for field in cls._fields if field in data})
+
+
+def _fold(text: str) -> str:
+    """Minuscules sans accents, pour comparer des termes"""
+    return "".join(c for c in unicodedata.normalize("NFD", text.lower()) if unicodedata.category(c) != "Mn")
+
+
+def _term_re(term: str):
+    # Bornes adaptées aux termes comme C++, C#, .NET ou CI/CD
+    return re.compile(r"(?<![\w+#.])" + re.escape(_fold(term)) + r"(?![\w+#])")
+
+
+_SKILL_RES = [(skill, _term_re(skill)) for skill in SKILLS]
+
+
+def _sentences(text: str) -> List[str]:
+    return [s for s in re.split(r"[\n.;!?•]+(?=\s|$)|\n", text) if s.strip()]
+
+
+def _unique(items) -> List[str]:
+    seen, result = set(), []
+    for item in items:
+        key = _fold(item).strip()
+        if key and key not in seen:
+            seen.add(key)
+            result.append(item.strip())
+    return result
+
+
+def compile_offer_rules(job_offer: str) -> OfferProfile:
+    """Profil par extraction locale (vocabulaire de compétences, mots-clés de niveau)"""
+    must, nice = [], []
+    for sentence in _sentences(job_offer):
+        folded = _fold(sentence)
+        found = [skill for skill, pattern in _SKILL_RES if pattern.search(folded)]
+        (nice if any(cue in folded for cue in NICE_CUES) else must).extend(found)
+    must = _unique(must)
+    nice = [s for s in _unique(nice) if _fold(s) not in {_fold(m) for m in must}]
+
+    folded = _fold(job_offer)
+    seniority = next((label for label, words in SENIORITY_WORDS
+                      if any(re.search(r"\b" + w + r"\b", folded) for w in words)), "")
+    years = [int(m.group(1)) for m in YEARS_RE.finditer(folded)]
+    education = EDUCATION_RE.search(folded)
+    languages = [lang for lang in LANGUAGES if _fold(lang) in folded]
+    soft_skills = _unique(label for stem, label in SOFT_SKILLS if stem in folded)
+    first_line = job_offer.strip().splitlines()[0] if job_offer.strip() else ""
+    return OfferProfile(
+        title=first_line.split(",")[0][:80].strip(),
+        must_have=must, nice_to_have=nice, seniority=seniority,
+        min_years=min(years) if years else 0,
+        education=education.group(1).replace(" ", "").capitalize() if education else "",
+        languages=languages, soft_skills=soft_skills, source=RULES,
+    )
+
+
+def _as_list(value) -> List[str]:
+    if isinstance(value, str):
+        value = [v for v in re.split(r"[,;/]", value)]
+    if not isinstance(value, list):
+        return []
+    return _unique(str(v) for v in value if isinstance(v, (str, int, float)))
+
+
+def compile_offer_model(job_offer: str, complete: Callable[[str], Optional[str]]) -> Optional[OfferProfile]:
+    """
+    Profil extrait par le modèle puis complété par l'extraction locale,
+    None si la réponse est inexploitable
+    """
+    data = parse_analysis(complete(OFFER_PROMPT.format(job_offer=job_offer)))
+    if not isinstance(data, dict) or not (data.get("competences_requises") or data.get("titre")):
+        return None
+    rules = compile_offer_rules(job_offer)
+    must = _as_list(data.get("competences_requises"))
+    nice = _as_list(data.get("competences_souhaitees"))
+    # Exigences repérées localement mais absentes de la réponse du modèle
+    known = {_fold(s) for s in must + nice}
+    must += [s for s in rules.must_have if _fold(s) not in known]
+    nice += [s for s in rules.nice_to_have if _fold(s) not in known]
+    languages = _as_list(data.get("langues"))
+    languages += [lang for lang in rules.languages if _fold(lang) not in {_fold(x) for x in languages}]
+    soft_skills = _as_list(data.get("qualites"))
+    if not soft_skills:
+        soft_skills = rules.soft_skills
+    try:
+        years = int(float(data.get("experience_min_ans") or 0))
+    except (TypeError, ValueError):
+        years = rules.min_years
+    return OfferProfile(
+        title=str(data.get("titre") or rules.title).strip(),
+        must_have=must, nice_to_have=nice,
+        seniority=str(data.get("seniorite") or rules.seniority).strip(),
+        min_years=years or rules.min_years,
+        education=str(data.get("formation") or rules.education).strip(),
+        languages=languages, soft_skills=soft_skills, other=_as_list(data.get("autres_exigences")),
+        source=MODEL,
+    )
+
+
+def render_profile(profile: OfferProfile) -> str:
+    """Profil compact pour le prompt (lignes vides omises)"""
+    level = profile.seniority
+    if profile.min_years:
+        years = f"{profile.min_years} an{'s' if profile.min_years > 1 else ''} d'expérience min."
+        level = f"{level}, {years}" if level else years
+    lines = [
+        ("POSTE", profile.title),
+        ("Requis", ", ".join(profile.must_have)),
+        ("Apprécié", ", ".join(profile.nice_to_have)),
+        ("Niveau", level),
+        ("Formation", profile.education),
+        ("Langues", ", ".join(profile.languages)),
+        ("Qualités", ", ".join(profile.soft_skills)),
+        ("Autres", ", ".join(profile.other)),
+    ]
+    return "\n".join(f"{label}: {value}" for label, value in lines if value)
+
+
+def local_match(profile: OfferProfile, cv_text: str) -> dict:
+    """Rapprochement sans modèle : compétences du profil trouvées dans le texte du CV"""
+    folded = _fold(cv_text or "")
+
+    def present(term):
+        return bool(_term_re(term).search(folded))
+
+    matched = [s for s in profile.must_have if present(s)]
+    return {
+        "requises_trouvees": matched,
+        "requises_manquantes": [s for s in profile.must_have if s not in matched],
+        "souhaitees_trouvees": [s for s in profile.nice_to_have if present(s)],
+        "langues_trouvees": [lang for lang in profile.languages if present(lang)],
+        "couverture": round(len(matched) / len(profile.must_have), 2) if profile.must_have else 1.0,
+    }
+
+
+def chat_complete(base_url: str, model: Callable[[], str], headers: Optional[dict] = None,
+                  max_tokens: int = 500, label: str = "Compilation de l'offre") -> Callable[[str], Optional[str]]:
+    """
+    Appel texte sur une API compatible OpenAI (LM Studio /v1, Ollama /v1), None en cas d'échec
+    label : nom de l'appel dans les messages d'erreur
+    """
+    def complete(prompt: str) -> Optional[str]:
+        payload = {"model": model(), "messages": [{"role": "user", "content": prompt}],
+                   "max_tokens": max_tokens, "temperature": 0.0}
+        try:
+            r = requests.post(f"{base_url.rstrip('/')}/chat/completions", json=payload,
+                              headers=headers or {"Content-Type": "application/json"},
+                              timeout=request_timeout(120))
+            if r.status_code != 200:
+                print(f"⚠️ {label}: HTTP {r.status_code}")
+                return None
+            return r.json()['choices'][0]['message']['content']
+        except Exception as e:
+            print(f"⚠️ {label}: {e}")
+            return None
+    return complete
+
+
+def completion_for(analyzer, label: str = "Compilation de l'offre",
+                   max_tokens: int = 500) -> Callable[[str], Optional[str]]:
+    """Appel texte sur le serveur d'un analyseur existant (modèle texte de l'analyse RH si configuré)"""
+    registry, configured, base_url = _text_target(analyzer)
+
+    def model() -> str:
+        if configured:
+            return configured
+        picked = registry.pick(vision=False)
+        return picked.id if picked else "auto"
+
+    return chat_complete(base_url, model, headers=analyzer.headers, max_tokens=max_tokens, label=label)
+
+
+def _text_target(analyzer):
+    """(registre, modèle configuré ou None, URL OpenAI) du modèle texte d'un analyseur"""
+    if hasattr(analyzer, "analysis_registry"):
+        # CVAnalyzer : serveur de l'analyse RH, petit modèle de la cascade de préférence
+        return analyzer.analysis_registry, analyzer.cascade_model or analyzer.analysis_model, analyzer.analysis_url
+    if hasattr(analyzer, "keep_alive"):
+        # OllamaCVOneShot : API compatible OpenAI d'Ollama
+        return analyzer.registry, analyzer.model, f"{analyzer.base_url}/v1"
+    return analyzer.registry, None, analyzer.base_url
+
+
+def assembler_for(analyzer) -> PromptAssembler:
+    """Budget de prompt du modèle appelé par completion_for (sa fenêtre réelle, pas les 4096 par défaut)"""
+    registry, configured, _ = _text_target(analyzer)
+    caps = registry.get(configured) if configured else registry.pick(vision=False)
+    if hasattr(analyzer, "keep_alive"):
+        # Ollama : fenêtre demandée au serveur (num_ctx), pas la fenêtre maximale du modèle
+        return PromptAssembler(caps, context_length=analyzer._num_ctx())
+    return PromptAssembler(caps)
+
+
+class OfferCompiler:
+    def __init__(self, complete: Optional[Callable[[str], Optional[str]]] = None,
+                 cache_path: Optional[str] = DEFAULT_CACHE):
+        """
+        Compilation des offres avec cache par empreinte
+        complete   : appel texte au modèle (cf. completion_for), None = extraction locale seule
+        cache_path : fichier JSON des profils (None = cache en mémoire seulement)
+        """
+        self.complete = complete
+        self.cache_path = Path(cache_path) if cache_path else None
+        self._lock = threading.Lock()
+        self._profiles: Dict[str, dict] = self._load()
+
+    def _load(self) -> Dict[str, dict]:
+        if not self.cache_path or not self.cache_path.exists():
+            return {}
+        try:
+            return json.loads(self.cache_path.read_text(encoding='utf-8'))
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"⚠️ Cache des offres illisible, ignoré ({e})")
+            return {}
+
+    def profile(self, job_offer: str) -> OfferProfile:
+        """Profil de l'offre (compilé une seule fois par empreinte)"""
+        key = text_sha256(job_offer)
+        with self._lock:
+            cached = self._profiles.get(key)
+            if cached and (cached.get("source") == MODEL or self.complete is None):
+                return OfferProfile.from_dict(cached)
+            profile = compile_offer_model(job_offer, self.complete) if self.complete else None
+            if profile is None:
+                if self.complete:
+                    print("⚠️ Profil de l'offre non compilé par le modèle, extraction locale")
+                profile = compile_offer_rules(job_offer)
+            self._profiles[key] = profile.to_dict()
+            self._save()
+            return profile
+
+    def prompt_text(self, job_offer: str) -> str:
+        """
+        Texte de l'offre pour les prompts : profil compact s'il vient du modèle
+        et qu'il est plus court que l'offre, sinon l'offre brute
+        """
+        profile = self.profile(job_offer)
+        if profile.source != MODEL:
+            return job_offer
+        rendered = render_profile(profile)
+        return rendered if estimate_tokens(rendered) < estimate_tokens(job_offer) else job_offer
+
+    def _save(self):
+        if not self.cache_path:
+            return
+        # Profils ajoutés entre-temps par un autre compilateur sur le même fichier
+        self._profiles = dict(self._load(), **self._profiles)
+        tmp = self.cache_path.with_suffix(self.cache_path.suffix + ".tmp")
+        tmp.write_text(json.dumps(self._profiles, indent=2, ensure_ascii=False), encoding='utf-8')
+        os.replace(tmp, self.cache_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profil d'exigences d'une offre d'emploi")
+    parser.add_argument("offer", help="texte de l'offre, ou fichier texte")
+    parser.add_argument("--cv", help="texte de CV (fichier) à rapprocher du profil")
+    parser.add_argument("--base-url", help="serveur modèle compatible OpenAI (sinon extraction locale)")
+    parser.add_argument("--model", default="auto", help="modèle texte pour la compilation")
+    parser.add_argument("--cache", default=DEFAULT_CACHE)
+    args = parser.parse_args()
+
+    offer = Path(args.offer).read_text(encoding='utf-8') if Path(args.offer).is_file() else args.offer
+    complete = chat_complete(args.base_url, lambda: args.model) if args.base_url else None
+    compiler = OfferCompiler(complete, args.cache)
+    profile = compiler.profile(offer)
+    prompt = compiler.prompt_text(offer)
+    print(f"📋 Profil ({profile.source}):")
+    print(render_profile(profile))
+    print(f"✂️ Offre dans le prompt: {estimate_tokens(prompt)} tokens (offre brute {estimate_tokens(offer)})")
+    if args.cv:
+        match = local_match(profile, Path(args.cv).read_text(encoding='utf-8'))
+        print(f"🔎 Rapprochement local: {json.dumps(match, ensure_ascii=False)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,62 +7,25 @@ OCR + Analyse RH en UN SEUL APPEL
 Optimisé pour LM Studio + modèle Qwen2-VL-7B-Instruct
 """
 
-import requests
 import json
-import base64
+import os
 import sys
 import time
+from contextlib import nullcontext
 from pathlib import Path
 
-class CVAnalyzerOneShot:
-    def __init__(self, base_url="http://localhost:1234/v1"):
-        """
-        Analyseur CV ultra-rapide avec un seul prompt
-        """
-        self.base_url = base_url
-        self.headers = {"Content-Type": "application/json"}
-        
-    def check_connection(self):
-        """Vérifier LM Studio et modèle Qwen2-VL"""
-        print("🔍 Vérification de la connexion LM Studio...")
-        try:
-            response = requests.get(f"{self.base_url}/models", timeout=5)
-            if response.status_code == 200:
-                models = response.json()
-                model_names = [model['id'] for model in models.get('data', [])]
-                
-                print("✅ LM Studio connecté")
-                
-                # Vérifier Qwen2-VL
-                qwen_models = [m for m in model_names if 'qwen2' in m.lower() and 'vl' in m.lower()]
-                if qwen_models:
-                    print(f"🎯 Qwen2-VL détecté: {qwen_models[0]}")
-                    return True
-                else:
-                    print("⚠️ Qwen2-VL non chargé")
-                    return False
-            return False
-        except Exception as e:
-            print(f"❌ Erreur connexion: {e}")
-            return False
-    
-    def analyze_cv_oneshot(self, image_path, job_offer):
-        """
-        Analyse CV complète en une seule requête
-        OCR + Analyse RH simultanée
-        """
-        print("🚀 Analyse ONE-SHOT en cours...")
-        
-        # Encoder l'image
-        try:
-            with open(image_path, "rb") as image_file:
-                base64_image = base64.b64encode(image_file.read()).decode('utf-8')
-        except Exception as e:
-            print(f"❌ Erreur lecture image: {e}")
-            return None
-        
-        # PROMPT COMBINÉ : OCR + Analyse RH
-        combined_prompt = f"""Vous êtes un expert RH très exigeant. 
+from cv_capabilities import LMSTUDIO, CapabilityRegistry
+from cv_deadline import request_timeout
+from cv_hedge import hedged_call
+from cv_narrative import SCORES_OUTPUT_TOKENS, scores_prompt
+from cv_payload import IMAGE_PLACEHOLDER, StreamingChatBody
+from cv_salvage import continuation_for, recover_analysis
+from cv_scheduler import NORMAL, PRIORITY_HEADER, normalize_priority
+from cv_tokens import ANALYSIS_OUTPUT_TOKENS, PromptAssembler, image_tokens_for
+from cv_tuning import GenerationProfile
+
+# PROMPT COMBINÉ : OCR + Analyse RH (str.format : {job_offer})
+ONESHOT_PROMPT = """Vous êtes un expert RH très exigeant. 
 Votre mission : analyser le CV en fonction de l'offre d'emploi fournie.
 
 ⚠️ Règles strictes :
@@ -100,34 +63,114 @@ Voici l'offre d'emploi à analyser :
 
 """
 
+# Notation seule : champs rédigés retirés (détail à la demande, cf. cv_narrative.py)
+SCORES_ONESHOT_PROMPT = scores_prompt(ONESHOT_PROMPT)
+
+
+class CVAnalyzerOneShot:
+    def __init__(self, base_url="http://localhost:1234/v1", scheduler=None, priority=NORMAL, registry=None,
+                 hedger=None, profile=None, scores_only=False):
+        """
+        Analyseur CV ultra-rapide avec un seul prompt
+        hedger  : appels lents doublés sur un serveur de secours (cv_hedge.py)
+        profile : réglages de génération (cv_tuning.py, défaut : valeurs historiques)
+        scores_only : nom, scores et recommandation seulement (cf. cv_narrative.py)
+        """
+        self.base_url = base_url
+        self.scheduler = scheduler
+        self.priority = normalize_priority(priority)
+        self.headers = {"Content-Type": "application/json", PRIORITY_HEADER: self.priority}
+        self.registry = registry or CapabilityRegistry(base_url, backend=LMSTUDIO)
+        self.hedger = hedger
+        self.profile = profile or GenerationProfile()
+        self.scores_only = scores_only
+        
+    def _model_slot(self, kind="oneshot"):
+        """
+        Créneau d'appel modèle (ordonnanceur de priorité si configuré, kind : type d'appel)
+        Produit le ticket du créneau (None sans ordonnanceur) : l'appelant y signale un échec HTTP
+        """
+        if self.scheduler is None:
+            return nullcontext()
+        return self.scheduler.slot(self.priority, kind)
+
+    def _vision_model(self):
+        """Modèle vision à utiliser (Qwen2-VL de préférence), None si aucun"""
+        return self.registry.pick(vision=True, prefer=("qwen2", "vl"))
+
+    def check_connection(self):
+        """Vérifier LM Studio et modèle Qwen2-VL (capacités en cache, cf. cv_capabilities.py)"""
+        print("🔍 Vérification de la connexion LM Studio...")
+        model = self._vision_model()
+        if model:
+            print("✅ LM Studio connecté")
+            print(f"🎯 Modèle vision: {model.id} (contexte {model.context_length} tokens)")
+            return True
+        if self.registry.models():
+            print("✅ LM Studio connecté")
+            print("⚠️ Qwen2-VL non chargé")
+        return False
+    
+    def analyze_cv_oneshot(self, image_path, job_offer, scores_only=None):
+        """
+        Analyse CV complète en une seule requête
+        OCR + Analyse RH simultanée
+        scores_only : notation seule pour cet appel (défaut : réglage de l'analyseur)
+        """
+        scores_only = self.scores_only if scores_only is None else scores_only
+        print("🚀 Analyse ONE-SHOT en cours...")
+        
+        # Offre ajustée au contexte restant après l'image (réduite si le profil le demande)
+        model = self._vision_model()
+        image = self.profile.image(image_path)
+        assembled = PromptAssembler(model).fit(
+            SCORES_ONESHOT_PROMPT if scores_only else ONESHOT_PROMPT,
+            {"job_offer": self.profile.clip_offer(job_offer)},
+            expected_output=self.profile.output_tokens(SCORES_OUTPUT_TOKENS if scores_only else ANALYSIS_OUTPUT_TOKENS),
+            image_tokens=image_tokens_for(image)
+        )
+        if assembled.truncated:
+            print(f"✂️ Raccourci pour tenir dans le contexte: {assembled.truncated} tokens")
+
         payload = {
-            "model": "auto",
+            "model": model.id if model else "auto",
             "messages": [
                 {
                     "role": "user",
                     "content": [
-                        {"type": "text", "text": combined_prompt},
+                        {"type": "text", "text": assembled.prompt},
                         {
                             "type": "image_url", 
-                            "image_url": {"url": f"data:image/jpeg;base64,{base64_image}"}
+                            "image_url": {"url": f"data:image/jpeg;base64,{IMAGE_PLACEHOLDER}"}
                         }
                     ]
                 }
             ],
-            "max_tokens": 1000,
-            "temperature": 0.1,
-            "top_p": 0.9
+            "max_tokens": assembled.max_tokens,
+            "temperature": self.profile.temperature,
+            "top_p": self.profile.top_p
         }
         
+        # Corps JSON produit en flux depuis le fichier (pas de copie base64 complète en mémoire)
+        try:
+            body = StreamingChatBody(payload, image)
+        except Exception as e:
+            print(f"❌ Erreur lecture image: {e}")
+            return None
+        
         start_time = time.time()
         
         try:
-            response = requests.post(
-                f"{self.base_url}/chat/completions",
-                headers=self.headers,
-                json=payload,
-                timeout=180  # Plus de temps pour le traitement complexe
-            )
+            with self._model_slot() as ticket:
+                response = hedged_call(self.hedger, "oneshot", self.base_url, lambda url, session: session.post(
+                    f"{url}/chat/completions",
+                    headers=self.headers,
+                    data=body,
+                    timeout=request_timeout(180)  # Plus de temps pour le traitement complexe
+                ))
+                if ticket is not None:
+                    # Erreur serveur : signe de saturation pour la limite adaptative
+                    ticket.ok = response.status_code < 500
             
             duration = time.time() - start_time
             
@@ -138,10 +181,12 @@ Voici l'offre d'emploi à analyser :
                 return analysis_result
             else:
                 print(f"❌ Erreur HTTP: {response.status_code}")
+                self.registry.invalidate()
                 return None
                 
         except Exception as e:
             print(f"❌ Erreur analyse ONE-SHOT: {e}")
+            self.registry.invalidate()
             return None
     
     def save_results(self, analysis_json, image_name):
@@ -228,38 +273,26 @@ Voici l'offre d'emploi à analyser :
             return False
         
         # Traitement des résultats
-        try:
-            # Parser le JSON de l'analyse
-            json_start = analysis_raw.find('{')
-            json_end = analysis_raw.rfind('}') + 1
-            
-            if json_start != -1 and json_end != -1:
-                json_str = analysis_raw[json_start:json_end]
-                analysis_json = json.loads(json_str)
-                
-                total_time = time.time() - total_start
-                
-                # Affichage des résultats
-                self.display_results(analysis_json)
-                
-                # Sauvegarde
-                json_file = self.save_results(analysis_json, image_path)
-                
-                print(f"\n🚀 ANALYSE ONE-SHOT TERMINÉE EN {total_time:.1f}s")
-                print("🎉 Ultra-rapide avec un seul appel Qwen2-VL !")
-                
-                return True
-            else:
-                print("❌ Format JSON invalide dans la réponse")
-                print("Réponse brute:")
-                print(analysis_raw[:500])
-                return False
-                
-        except json.JSONDecodeError as e:
-            print(f"❌ Erreur parsing JSON: {e}")
+        # JSON tronqué réparé, champs obligatoires manquants complétés par un appel texte
+        analysis_json = recover_analysis(analysis_raw, continuation_for(self))
+        if analysis_json is None:
+            print("❌ Format JSON invalide dans la réponse")
             print("Réponse brute:")
             print(analysis_raw[:500])
             return False
+        
+        total_time = time.time() - total_start
+        
+        # Affichage des résultats
+        self.display_results(analysis_json)
+        
+        # Sauvegarde
+        json_file = self.save_results(analysis_json, image_path)
+        
+        print(f"\n🚀 ANALYSE ONE-SHOT TERMINÉE EN {total_time:.1f}s")
+        print("🎉 Ultra-rapide avec un seul appel Qwen2-VL !")
+        
+        return True
 
 def main():
     """Interface principale"""
@@ -279,13 +312,19 @@ def main():
         print("• Plus rapide que la version 2-étapes")
         print("• Prompt RH exact selon vos spécifications")
         print("• Utilisation optimale du GPU AMD")
+        print("\n🚦 OPTIONS (variables d'environnement):")
+        print("• CV_BASE_URL : URL du serveur (ex: proxy cv_scheduler.py)")
+        print("• CV_PRIORITY : interactive / normal / bulk")
         return
     
     image_path = sys.argv[1]
     job_offer = sys.argv[2]
     
     # Lancement de l'analyse ONE-SHOT
-    analyzer = CVAnalyzerOneShot()
+    analyzer = CVAnalyzerOneShot(
+        base_url=os.environ.get("CV_BASE_URL", "http://localhost:1234/v1"),
+        priority=os.environ.get("CV_PRIORITY", NORMAL)
+    )
     success = analyzer.analyze_complete(image_path, job_offer)
     
     if success:
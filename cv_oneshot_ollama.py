@@ -9,6 +9,9 @@ Différences vs version LM Studio:
 - Listing modèles: GET /api/tags
 - Champ image: {"type": "image", "image": <base64>}
 - Peut streamer la sortie (option stream=True)
+- Cycle de vie du modèle : préchargement (warm_up), maintien en mémoire
+  (keep_alive) et libération (release), temps de chargement à froid
+  mesuré séparément du temps d'inférence
 
 Prérequis:
 1. Installer Ollama: https://ollama.com/download
@@ -24,39 +27,26 @@ python cv_oneshot_ollama.py test.jpg "Développeur Python Junior"
 """
 import requests
 import json
-import base64
+import os
 import sys
+import threading
 import time
+from contextlib import contextmanager, nullcontext
 from pathlib import Path
 from typing import Optional
 
-class OllamaCVOneShot:
-    def __init__(self, base_url: str = "http://localhost:11434", model: str = "qwen2.5-vl:7b", stream: bool = False):
-        self.base_url = base_url.rstrip('/')
-        self.model = model
-        self.stream = stream
-
-    # ---------------------- Infrastructure ----------------------
-    def check_connection(self) -> bool:
-        print("🔍 Vérification Ollama...")
-        try:
-            r = requests.get(f"{self.base_url}/api/tags", timeout=5)
-            if r.status_code == 200:
-                data = r.json()
-                names = [m.get("name", "") for m in data.get("models", [])]
-                if any(self.model.split(':')[0] in n for n in names):
-                    print(f"✅ Modèle trouvé: {self.model} (ou variante)")
-                else:
-                    print(f"⚠️ Modèle {self.model} absent. Téléchargez-le: ollama pull {self.model}")
-                return True
-            print(f"❌ Statut HTTP inattendu: {r.status_code}")
-        except Exception as e:
-            print(f"❌ Impossible de contacter Ollama: {e}")
-        return False
+from cv_capabilities import OLLAMA, CapabilityRegistry, ModelCapabilities
+from cv_deadline import DeadlineExceeded, check_deadline, request_timeout
+from cv_hedge import Hedger, hedged_call
+from cv_narrative import SCORES_OUTPUT_TOKENS, scores_prompt
+from cv_payload import IMAGE_PLACEHOLDER, StreamingChatBody
+from cv_salvage import continuation_for, recover_analysis
+from cv_scheduler import NORMAL, PRIORITY_HEADER, PriorityScheduler, normalize_priority
+from cv_tokens import ANALYSIS_OUTPUT_TOKENS, PromptAssembler, image_tokens_for
+from cv_tuning import GenerationProfile
 
-    # ---------------------- Prompt Builder ----------------------
-    def build_prompt(self, job_offer: str) -> str:
-        return f"""Vous êtes un expert RH très exigeant. 
+# Gabarit du prompt (str.format : {job_offer})
+OLLAMA_PROMPT = """Vous êtes un expert RH très exigeant. 
 Votre mission : analyser le CV en fonction de l’offre d’emploi fournie.
 
 ⚠️ Règles strictes :
@@ -99,80 +89,257 @@ INSTRUCTIONS:
 4. Fournis UNIQUEMENT le JSON, sans texte avant/après.
 """
 
-    # ---------------------- Core One-Shot ----------------------
-    def analyze_oneshot(self, image_path: str, job_offer: str) -> Optional[str]:
-        print("🚀 Lancement analyse ONE-SHOT (Ollama)...")
+# Notation seule : champs rédigés retirés (détail à la demande, cf. cv_narrative.py)
+SCORES_OLLAMA_PROMPT = scores_prompt(OLLAMA_PROMPT)
+
+# Au-delà, le load_duration renvoyé par Ollama correspond à un chargement à froid
+COLD_LOAD_THRESHOLD = 0.5
+
+# num_ctx fixe par modèle : le changer d'une requête à l'autre force Ollama à recharger
+DEFAULT_NUM_CTX = 8192
+
+
+class OllamaCVOneShot:
+    def __init__(self, base_url: str = "http://localhost:11434", model: str = "qwen2.5-vl:7b", stream: bool = False,
+                 scheduler: Optional[PriorityScheduler] = None, priority: str = NORMAL,
+                 keep_alive: str = "10m", registry: Optional[CapabilityRegistry] = None,
+                 num_ctx: Optional[int] = None, hedger: Optional[Hedger] = None,
+                 profile: Optional[GenerationProfile] = None, scores_only: bool = False):
+        self.base_url = base_url.rstrip('/')
+        self.model = model
+        self.stream = stream
+        self.scheduler = scheduler
+        self.priority = normalize_priority(priority)
+        self.headers = {"Content-Type": "application/json", PRIORITY_HEADER: self.priority}
+        # Durée de maintien du modèle en mémoire après chaque requête (format Ollama: "10m", 300, -1)
+        self.keep_alive = keep_alive
+        self._local = threading.local()
+        self.registry = registry or CapabilityRegistry(self.base_url, backend=OLLAMA)
+        self.num_ctx = num_ctx
+        # Appels lents doublés sur un autre serveur Ollama (cv_hedge.py)
+        self.hedger = hedger
+        # Réglages de génération (cv_tuning.py, défaut : valeurs historiques)
+        self.profile = profile or GenerationProfile()
+        # Nom, scores et recommandation seulement (détail à la demande, cv_narrative.py)
+        self.scores_only = scores_only
+        self._stats_lock = threading.Lock()
+        self.timing_stats = {"requests": 0, "cold_loads": 0, "load_s": 0.0, "inference_s": 0.0}
+
+    # ---------------------- Infrastructure ----------------------
+    def _model_slot(self, kind="oneshot"):
+        """Créneau d'appel modèle (ordonnanceur de priorité si configuré, kind : type d'appel)"""
+        if self.scheduler is None:
+            return nullcontext()
+        return self.scheduler.slot(self.priority, kind)
+
+    def _resolve_model(self) -> Optional[ModelCapabilities]:
+        """Capacités du modèle configuré (ou de sa variante installée)"""
+        return self.registry.get(self.model)
+
+    def _model_id(self) -> str:
+        caps = self._resolve_model()
+        return caps.id if caps else self.model
+
+    def _num_ctx(self) -> int:
+        """Fenêtre de contexte demandée à Ollama (constante pour un modèle donné)"""
+        if self.num_ctx:
+            return self.num_ctx
+        caps = self._resolve_model()
+        return min(caps.context_length, DEFAULT_NUM_CTX) if caps else DEFAULT_NUM_CTX
+
+    def check_connection(self) -> bool:
+        print("🔍 Vérification Ollama...")
+        if not self.registry.models():
+            print("❌ Impossible de contacter Ollama (ou aucun modèle installé)")
+            return False
+        caps = self._resolve_model()
+        if caps:
+            vision = "vision" if caps.vision else "⚠️ sans vision"
+            print(f"✅ Modèle trouvé: {caps.id} ({vision}, contexte {caps.context_length} tokens)")
+        else:
+            print(f"⚠️ Modèle {self.model} absent. Téléchargez-le: ollama pull {self.model}")
+        return True
+
+    # ---------------------- Cycle de vie du modèle ----------------------
+    def _generate_control(self, keep_alive) -> Optional[dict]:
+        """Requête /api/generate sans prompt : charge ou décharge le modèle"""
+        payload = {"model": self._model_id(), "keep_alive": keep_alive,
+                   "options": {"num_ctx": self._num_ctx()}}
+        r = requests.post(f"{self.base_url}/api/generate", json=payload, headers=self.headers, timeout=600)
+        if r.status_code != 200:
+            print(f"❌ HTTP {r.status_code}: {r.text[:200]}")
+            return None
+        return r.json()
+
+    def warm_up(self, keep_alive=None) -> Optional[float]:
+        """Précharger le modèle, renvoie le temps de chargement (s)"""
+        print(f"🔥 Préchargement du modèle {self.model}...")
+        start = time.time()
         try:
-            with open(image_path, 'rb') as f:
-                b64 = base64.b64encode(f.read()).decode('utf-8')
+            data = self._generate_control(keep_alive or self.keep_alive)
         except Exception as e:
-            print(f"❌ Lecture image échouée: {e}")
+            print(f"❌ Préchargement impossible: {e}")
             return None
-        prompt = self.build_prompt(job_offer)
+        if data is None:
+            return None
+        load_s = data.get("load_duration", 0) / 1e9 or time.time() - start
+        print(f"✅ Modèle en mémoire (chargement: {load_s:.1f}s, maintien: {keep_alive or self.keep_alive})")
+        return load_s
+
+    def release(self):
+        """Décharger le modèle de la mémoire d'Ollama"""
+        try:
+            if self._generate_control(0) is not None:
+                print(f"🧹 Modèle {self.model} libéré")
+        except Exception as e:
+            print(f"⚠️ Libération du modèle impossible: {e}")
+
+    @contextmanager
+    def resident(self, keep_alive=-1):
+        """
+        Modèle gardé en mémoire pendant tout le bloc (ex: durée d'un lot),
+        puis libéré. keep_alive=-1 : pas d'expiration tant que le bloc dure.
+        """
+        previous = self.keep_alive
+        self.keep_alive = keep_alive
+        self.warm_up()
+        try:
+            yield self
+        finally:
+            self.keep_alive = previous
+            self.release()
+
+    def _record_timings(self, data: dict, wall_s: float):
+        """Séparer chargement du modèle et inférence (durées Ollama en ns)"""
+        load_s = data.get("load_duration", 0) / 1e9
+        inference_s = (data.get("prompt_eval_duration", 0) + data.get("eval_duration", 0)) / 1e9
+        timings = {"wall_s": round(wall_s, 2), "load_s": round(load_s, 2),
+                   "inference_s": round(inference_s, 2), "cold_load": load_s >= COLD_LOAD_THRESHOLD}
+        self._local.timings = timings
+        with self._stats_lock:
+            self.timing_stats["requests"] += 1
+            self.timing_stats["cold_loads"] += int(timings["cold_load"])
+            self.timing_stats["load_s"] += load_s
+            self.timing_stats["inference_s"] += inference_s
+        return timings
+
+    def last_timings(self) -> Optional[dict]:
+        """Durées du dernier appel fait par ce thread"""
+        return getattr(self._local, "timings", None)
+
+    @staticmethod
+    def _format_timings(timings: dict) -> str:
+        label = "chargement à froid" if timings["cold_load"] else "chargement"
+        return f"{label}: {timings['load_s']:.1f}s, inférence: {timings['inference_s']:.1f}s"
+
+    # ---------------------- Prompt Builder ----------------------
+    def build_prompt(self, job_offer: str) -> str:
+        return OLLAMA_PROMPT.format(job_offer=job_offer)
+
+    # ---------------------- Core One-Shot ----------------------
+    def analyze_oneshot(self, image_path: str, job_offer: str, scores_only: Optional[bool] = None) -> Optional[str]:
+        print("🚀 Lancement analyse ONE-SHOT (Ollama)...")
+        self._local.timings = None
+        scores_only = self.scores_only if scores_only is None else scores_only
+        # Offre ajustée au contexte restant après l'image, sortie dimensionnée sur le JSON attendu
+        image = self.profile.image(image_path)
+        assembled = PromptAssembler(self._resolve_model(), context_length=self._num_ctx()).fit(
+            SCORES_OLLAMA_PROMPT if scores_only else OLLAMA_PROMPT, {"job_offer": self.profile.clip_offer(job_offer)},
+            expected_output=self.profile.output_tokens(SCORES_OUTPUT_TOKENS if scores_only else ANALYSIS_OUTPUT_TOKENS),
+            image_tokens=image_tokens_for(image)
+        )
+        if assembled.truncated:
+            print(f"✂️ Raccourci pour tenir dans le contexte: {assembled.truncated} tokens")
+        prompt = assembled.prompt
         payload = {
-            "model": self.model,
+            "model": self._model_id(),
             "messages": [
                 {
                     "role": "user",
                     "content": [
                         {"type": "text", "text": prompt},
-                        {"type": "image", "image": b64}
+                        {"type": "image", "image": IMAGE_PLACEHOLDER}
                     ]
                 }
             ],
             "stream": self.stream,
+            "keep_alive": self.keep_alive,
             "options": {
-                "temperature": 0.1
+                "temperature": self.profile.temperature,
+                "top_p": self.profile.top_p,
+                "num_predict": assembled.max_tokens,
+                "num_ctx": self._num_ctx()
             }
         }
-        url = f"{self.base_url}/api/chat"
+        try:
+            # Corps JSON produit en flux depuis le fichier
+            body = StreamingChatBody(payload, image)
+        except Exception as e:
+            print(f"❌ Lecture image échouée: {e}")
+            return None
         start = time.time()
         try:
-            if self.stream:
-                result_full = ""
-                with requests.post(url, json=payload, stream=True, timeout=600) as r:
-                    r.raise_for_status()
-                    for line in r.iter_lines():
-                        if not line:
-                            continue
-                        data = json.loads(line.decode('utf-8'))
-                        msg = data.get("message", {}).get("content", "")
-                        result_full += msg
-                        if data.get("done"):
-                            break
-                print(f"⚡ Terminé (stream): {time.time()-start:.1f}s")
-                return result_full
-            else:
-                r = requests.post(url, json=payload, timeout=600)
-                if r.status_code != 200:
-                    print(f"❌ HTTP {r.status_code}: {r.text[:200]}")
-                    return None
-                data = r.json()
-                content = data.get("message", {}).get("content", "")
-                print(f"⚡ Terminé: {time.time()-start:.1f}s")
-                return content
+            with self._model_slot():
+                content, data = hedged_call(self.hedger, "oneshot", self.base_url,
+                                            lambda url, session: self._chat(url, session, body))
+            timings = self._record_timings(data, time.time() - start)
+            print(f"⚡ Terminé{' (stream)' if self.stream else ''}: {time.time()-start:.1f}s "
+                  f"({self._format_timings(timings)})")
+            return content
         except Exception as e:
             print(f"❌ Erreur requête Ollama: {e}")
+            self.registry.invalidate()
             return None
 
+    def _chat(self, base_url: str, session, body: StreamingChatBody):
+        """Un appel /api/chat (en flux ou non), renvoie (texte, dernier message) ; lève une exception si échec"""
+        url = f"{base_url}/api/chat"
+        if not self.stream:
+            r = session.post(url, data=body, headers=self.headers, timeout=request_timeout(600))
+            if r.status_code != 200:
+                raise requests.HTTPError(f"HTTP {r.status_code}: {r.text[:200]}")
+            data = r.json()
+            return data.get("message", {}).get("content", ""), data
+        result_full = ""
+        data = {}
+        with session.post(url, data=body, headers=self.headers, stream=True,
+                          timeout=request_timeout(600)) as r:
+            r.raise_for_status()
+            try:
+                for line in r.iter_lines():
+                    # Échéance dépassée : sortir du with ferme le flux (Ollama arrête la génération)
+                    check_deadline("génération en flux")
+                    if not line:
+                        continue
+                    data = json.loads(line.decode('utf-8'))
+                    msg = data.get("message", {}).get("content", "")
+                    result_full += msg
+                    if data.get("done"):
+                        break
+            except requests.RequestException as e:
+                if not result_full:
+                    raise
+                # Flux coupé : le début de la réponse est gardé (JSON réparé ensuite)
+                print(f"⚠️ Flux interrompu ({e}), réponse partielle: {len(result_full)} caractères")
+            except DeadlineExceeded:
+                if not result_full:
+                    raise
+                # Échéance : flux fermé en sortie du with, la réponse partielle est gardée
+                # (le lot l'inscrit hors délai avec les champs récupérables, cf. cv_salvage.py)
+                print(f"⏱️ Échéance atteinte, réponse partielle: {len(result_full)} caractères")
+        return result_full, data
+
     # ---------------------- Parsing & Display ----------------------
     def parse_json(self, raw: str) -> Optional[dict]:
+        """JSON de la réponse, réparé si tronqué (champs obligatoires manquants complétés, cf. cv_salvage.py)"""
         if not raw:
             return None
-        start = raw.find('{')
-        end = raw.rfind('}') + 1
-        if start == -1 or end == -1:
+        data = recover_analysis(raw, continuation_for(self))
+        if data is None:
             print("❌ JSON introuvable dans la réponse")
             print("Réponse brute:")
             print(raw[:500])
-            return None
-        snippet = raw[start:end]
-        try:
-            return json.loads(snippet)
-        except json.JSONDecodeError as e:
-            print(f"❌ Erreur parsing JSON: {e}")
-            print(snippet)
-            return None
+        return data
 
     def display(self, data: dict):
         print("\n" + "="*60)
@@ -218,6 +385,8 @@ INSTRUCTIONS:
         if not Path(image_path).exists():
             print(f"❌ Image introuvable: {image_path}")
             return False
+        # Chargement à froid payé ici, hors du temps d'analyse
+        self.warm_up()
         raw = self.analyze_oneshot(image_path, job_offer)
         if not raw:
             return False
@@ -238,7 +407,10 @@ def main():
         return
     image = sys.argv[1]
     job = sys.argv[2]
-    analyzer = OllamaCVOneShot()
+    analyzer = OllamaCVOneShot(
+        base_url=os.environ.get("CV_BASE_URL", "http://localhost:11434"),
+        priority=os.environ.get("CV_PRIORITY", NORMAL)
+    )
     analyzer.run(image, job)
 
 if __name__ == "__main__":
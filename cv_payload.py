@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+📨 CORPS DE REQUÊTE EN FLUX POUR LES IMAGES
+
+Construire une requête vision « à plat » garde en mémoire en même temps
+les octets de l'image, la chaîne base64, sa copie UTF-8, le dict du
+payload et le JSON sérialisé : 4 à 5 fois la taille de l'image par
+requête en cours. Avec 32 requêtes simultanées sur des CV scannés,
+c'est ce qui fait exploser la mémoire.
+
+StreamingChatBody sérialise le payload une seule fois avec un marqueur
+à la place de l'image, puis produit le corps JSON par morceaux :
+préfixe, base64 encodé bloc par bloc depuis le fichier, suffixe.
+La longueur totale est connue à l'avance (Content-Length), aucun
+intermédiaire de la taille de l'image n'est créé.
+
+Usage:
+    payload = {... "url": f"data:image/jpeg;base64,{IMAGE_PLACEHOLDER}" ...}
+    body = StreamingChatBody(payload, image_path)
+    requests.post(url, data=body, headers={"Content-Type": "application/json"})
+
+Plusieurs images (micro-lots) : une liste d'images et les marqueurs
+image_placeholder(0), image_placeholder(1)... dans le même ordre.
+"""
+import base64
+import io
+import json
+import os
+from pathlib import Path
+from typing import Iterator, List, Sequence, Union
+
+# Marqueur remplacé par le base64 de l'image dans le JSON sérialisé
+IMAGE_PLACEHOLDER = "__CV_IMAGE_BASE64__"
+
+# Multiple de 3 : chaque bloc s'encode sans remplissage '=' intermédiaire
+DEFAULT_CHUNK_SIZE = 3 * 16 * 1024
+
+ImageSource = Union[str, Path, bytes]
+
+
+def image_placeholder(index: int) -> str:
+    """Marqueur de la n-ième image d'un payload à plusieurs images"""
+    return f"__CV_IMAGE_BASE64_{index}__"
+
+
+def base64_length(n_bytes: int) -> int:
+    """Longueur du base64 (avec remplissage) de n octets"""
+    return 4 * ((n_bytes + 2) // 3)
+
+
+def source_size(source: ImageSource) -> int:
+    """Taille en octets d'une image (chemin ou octets déjà en mémoire)"""
+    if isinstance(source, (bytes, bytearray)):
+        return len(source)
+    return os.stat(source).st_size
+
+
+def open_source(source: ImageSource):
+    """Ouvrir une image en lecture binaire (chemin ou octets)"""
+    if isinstance(source, (bytes, bytearray)):
+        return io.BytesIO(source)
+    return open(source, 'rb')
+
+
+def iter_base64(source: ImageSource, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[bytes]:
+    """Base64 de l'image, produit bloc par bloc"""
+    if chunk_size % 3:
+        raise ValueError("chunk_size doit être un multiple de 3")
+    with open_source(source) as f:
+        while True:
+            block = f.read(chunk_size)
+            if not block:
+                break
+            yield base64.b64encode(block)
+
+
+class StreamingChatBody:
+    def __init__(self, payload: dict, image: Union[ImageSource, Sequence[ImageSource]],
+                 chunk_size: int = DEFAULT_CHUNK_SIZE):
+        """
+        payload : payload JSON complet, IMAGE_PLACEHOLDER à l'endroit de l'image
+                  (ou image_placeholder(i) pour chaque image d'une liste)
+        image   : chemin de l'image (ou octets déjà en mémoire), ou liste d'images
+        """
+        serialized = json.dumps(payload, ensure_ascii=False)
+        if isinstance(image, (list, tuple)):
+            self.images: List[ImageSource] = list(image)
+            markers = [image_placeholder(i) for i in range(len(self.images))]
+        else:
+            self.images = [image]
+            markers = [IMAGE_PLACEHOLDER]
+        # Texte JSON avant chaque image, puis après la dernière
+        self.segments: List[bytes] = []
+        rest = serialized
+        for marker in markers:
+            if rest.count(marker) != 1:
+                raise ValueError(f"Le payload doit contenir exactement un {marker}, dans l'ordre des images")
+            head, rest = rest.split(marker)
+            self.segments.append(head.encode('utf-8'))
+        self.suffix = rest.encode('utf-8')
+        self.prefix = self.segments[0]
+        self.image = self.images[0]
+        self.chunk_size = chunk_size
+        # Lève OSError tout de suite si une image est illisible
+        self.image_sizes = [source_size(img) for img in self.images]
+        self.image_size = sum(self.image_sizes)
+
+    def __len__(self) -> int:
+        return (sum(len(seg) for seg in self.segments) + len(self.suffix)
+                + sum(base64_length(size) for size in self.image_sizes))
+
+    def __iter__(self) -> Iterator[bytes]:
+        # Itérable plusieurs fois : requests peut renvoyer le corps (redirection)
+        for segment, image in zip(self.segments, self.images):
+            yield segment
+            yield from iter_base64(image, self.chunk_size)
+        yield self.suffix
+
+    def to_bytes(self) -> bytes:
+        """Corps complet en mémoire (tests, enregistrement)"""
+        return b"".join(self)
@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+🏭 EXÉCUTION EN CHAÎNE (PIPELINE) DU MODE TWO-STEP
+
+Au lieu de traiter chaque CV de bout en bout (OCR, puis analyse, puis
+sauvegarde), les étapes sont séparées en files bornées, chacune avec
+ses propres workers :
+
+    préparation -> OCR -> analyse RH -> persistance
+
+L'OCR du CV n+1 se fait pendant l'analyse du CV n : quand l'OCR et
+l'analyse tournent sur des modèles ou serveurs différents (cf.
+analysis_url / cascade_model de CVAnalyzer), aucun des deux n'attend
+l'autre. Les files bornées freinent l'étape amont si l'aval sature.
+
+En fin de lot, chaque étape affiche sa profondeur de file et son taux
+d'occupation, pour dimensionner le nombre de workers par étape.
+
+Chaque CV porte son échéance (cv_deadline.py) d'une étape à l'autre :
+un CV hors délai ne prend plus de créneau OCR ou d'analyse.
+
+Les CV d'archives zip / tar (cv_archive.py) entrent dans la chaîne au
+fil de la lecture : la file de préparation, bornée, limite le nombre de
+membres en mémoire.
+"""
+import itertools
+import queue
+import tarfile
+import threading
+import time
+import zipfile
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Sequence
+
+from cv_archive import ArchiveReader, output_name
+from cv_deadline import Deadline, deadline_scope
+from cv_journal import (ANALYSIS_DONE, FAILED, OCR_DONE, QUEUED, TIMEOUT, CheckpointJournal,
+                        entry_key, file_sha256, text_sha256)
+from cv_salvage import continuation_for, recover_analysis
+
+PREPARE = "préparation"
+OCR = "ocr"
+ANALYSIS = "analyse"
+PERSIST = "persistance"
+STAGES = (PREPARE, OCR, ANALYSIS, PERSIST)
+
+DEFAULT_WORKERS = {PREPARE: 1, OCR: 1, ANALYSIS: 1, PERSIST: 1}
+
+_STOP = object()
+
+
+class Job:
+    """Un CV qui traverse la chaîne"""
+    __slots__ = ("path", "key", "fields", "cv_text", "analysis", "status", "reason", "enqueued_at",
+                 "deadline", "data", "image_sha256")
+
+    def __init__(self, path: str, data: Optional[bytes] = None, image_sha256: Optional[str] = None):
+        self.path = path
+        # Octets d'un membre d'archive (path n'est alors qu'une référence), libérés à la persistance
+        self.data = data
+        self.image_sha256 = image_sha256
+        self.key = None
+        self.fields = {}
+        self.cv_text = None
+        self.analysis = None
+        self.status = None
+        self.reason = None
+        self.enqueued_at = 0.0
+        self.deadline = Deadline()
+
+
+class StageMetrics:
+    def __init__(self, workers: int):
+        self.workers = workers
+        self.items = 0
+        self.busy = 0.0
+        self.wait = 0.0
+        self.depth_sum = 0
+        self.depth_samples = 0
+        self.depth_max = 0
+        self._lock = threading.Lock()
+
+    def sample_depth(self, depth: int):
+        with self._lock:
+            self.depth_sum += depth
+            self.depth_samples += 1
+            self.depth_max = max(self.depth_max, depth)
+
+    def done(self, busy: float, wait: float):
+        with self._lock:
+            self.items += 1
+            self.busy += busy
+            self.wait += wait
+
+    def utilization(self, wall: float) -> float:
+        return self.busy / (self.workers * wall) if wall > 0 else 0.0
+
+
+class StagePipeline:
+    def __init__(self, handlers: Dict[str, Callable[[Job], Optional[str]]], workers: Dict[str, int],
+                 queue_size: int = 4):
+        """
+        Chaîne d'étapes générique
+        handlers   : étape -> fonction(job) renvoyant l'étape suivante (None = fin)
+        workers    : étape -> nombre de threads
+        queue_size : capacité de chaque file (contre-pression)
+        Les étapes sont parcourues dans l'ordre de `handlers` ; un job peut en sauter.
+        """
+        self.order = list(handlers)
+        self.handlers = handlers
+        self.queues = {name: queue.Queue(maxsize=max(1, queue_size)) for name in self.order}
+        self.metrics = {name: StageMetrics(max(1, workers.get(name, 1))) for name in self.order}
+        self._threads: Dict[str, List[threading.Thread]] = {}
+        self.wall = 0.0
+
+    def _put(self, stage: str, job: Job):
+        job.enqueued_at = time.perf_counter()
+        self.queues[stage].put(job)
+        self.metrics[stage].sample_depth(self.queues[stage].qsize())
+
+    def _worker(self, stage: str):
+        q = self.queues[stage]
+        handler = self.handlers[stage]
+        while True:
+            job = q.get()
+            if job is _STOP:
+                return
+            start = time.perf_counter()
+            wait = start - job.enqueued_at
+            try:
+                next_stage = handler(job)
+            except Exception as e:
+                job.status, job.reason = "failed", f"exception ({stage}): {e}"
+                next_stage = self.order[-1] if stage != self.order[-1] else None
+            self.metrics[stage].done(time.perf_counter() - start, wait)
+            if next_stage:
+                self._put(next_stage, job)
+
+    def run(self, jobs: Iterable[Job]):
+        start = time.perf_counter()
+        for name in self.order:
+            self._threads[name] = [threading.Thread(target=self._worker, args=(name,), daemon=True,
+                                                    name=f"{name}-{i}")
+                                   for i in range(self.metrics[name].workers)]
+            for t in self._threads[name]:
+                t.start()
+        for job in jobs:
+            self._put(self.order[0], job)
+        # Les jobs n'avancent que vers l'aval : on ferme les étapes une à une
+        for name in self.order:
+            for _ in self._threads[name]:
+                self.queues[name].put(_STOP)
+            for t in self._threads[name]:
+                t.join()
+        self.wall = time.perf_counter() - start
+
+    def report(self) -> str:
+        lines = [f"{'étape':<13}{'workers':>8}{'CV':>6}{'occupation':>12}{'file moy':>10}"
+                 f"{'file max':>10}{'attente moy':>13}"]
+        for name in self.order:
+            m = self.metrics[name]
+            mean_depth = m.depth_sum / m.depth_samples if m.depth_samples else 0.0
+            mean_wait = m.wait / m.items if m.items else 0.0
+            lines.append(f"{name:<13}{m.workers:>8}{m.items:>6}{m.utilization(self.wall):>12.0%}"
+                         f"{mean_depth:>10.1f}{m.depth_max:>10}{mean_wait:>12.1f}s")
+        busiest = max(self.order, key=lambda n: self.metrics[n].utilization(self.wall))
+        lines.append(f"🔎 Étape la plus chargée: {busiest} (ajouter des workers ici si le serveur suit)")
+        return "\n".join(lines)
+
+
+class PipelinedRunner:
+    def __init__(self, analyzer, job_offer: str, journal: CheckpointJournal,
+                 workers: Optional[Dict[str, int]] = None, queue_size: int = 4,
+                 save: bool = True, reporter=None, cv_timeout: Optional[float] = None,
+                 batch_timeout: Optional[float] = None, prompt_offer: Optional[str] = None):
+        """
+        Lot two-step en chaîne (même journal et mêmes statuts que BatchRunner)
+        analyzer : CVAnalyzer
+        workers  : threads par étape (préparation, ocr, analyse, persistance)
+        reporter : rapport CSV/JSONL et classement (cv_report.py)
+        cv_timeout, batch_timeout : échéances par CV et du lot, cf. BatchRunner
+        prompt_offer : offre envoyée au modèle (profil compilé), défaut : job_offer
+        """
+        self.analyzer = analyzer
+        self.job_offer = job_offer
+        self.offer_sha256 = text_sha256(job_offer)
+        self.prompt_offer = prompt_offer or job_offer
+        self.journal = journal
+        self.workers = dict(DEFAULT_WORKERS, **(workers or {}))
+        self.queue_size = queue_size
+        self.save = save
+        self.reporter = reporter
+        self.cv_timeout = cv_timeout
+        self.batch_timeout = batch_timeout
+        self.batch_deadline = Deadline()
+        self.resume = False
+        self.pipeline: Optional[StagePipeline] = None
+        self.continuation = continuation_for(analyzer)
+
+    # ---------------------- Étapes ----------------------
+    def _timeout(self, job: Job, stage: str) -> str:
+        job.status, job.reason = "timeout", stage
+        return PERSIST
+
+    def _prepare(self, job: Job) -> Optional[str]:
+        image_sha256 = job.image_sha256 or file_sha256(job.path)
+        job.key = entry_key(image_sha256, self.offer_sha256)
+        job.fields = {"path": job.path, "image_sha256": image_sha256,
+                      "offer_sha256": self.offer_sha256, "mode": "two-step"}
+        previous = self.journal.get(job.key) if self.resume else None
+        if previous and previous["state"] == ANALYSIS_DONE:
+            job.status, job.analysis = "skipped", previous.get("analysis")
+            return PERSIST
+        if not previous:
+            self.journal.record(job.key, QUEUED, **job.fields)
+        # L'échéance du CV court à partir de sa prise en charge
+        job.deadline = Deadline(self.cv_timeout, parent=self.batch_deadline)
+        job.cv_text = previous.get("ocr_text") if previous else None
+        if job.cv_text:
+            print(f"♻️ OCR repris du journal: {job.path}")
+            return ANALYSIS
+        return OCR
+
+    def _ocr(self, job: Job) -> Optional[str]:
+        if job.deadline.expired():
+            return self._timeout(job, OCR)
+        with deadline_scope(job.deadline):
+            job.cv_text = self.analyzer.extract_cv_text(job.data if job.data is not None else job.path)
+        if not job.cv_text:
+            if job.deadline.expired():
+                return self._timeout(job, OCR)
+            job.status, job.reason = "failed", "ocr: aucune réponse"
+            return PERSIST
+        self.journal.record(job.key, OCR_DONE, ocr_text=job.cv_text, **job.fields)
+        return ANALYSIS
+
+    def _analysis(self, job: Job) -> Optional[str]:
+        if job.deadline.expired():
+            return self._timeout(job, ANALYSIS)
+        with deadline_scope(job.deadline):
+            job.analysis = recover_analysis(self.analyzer.analyze_cv_rh(job.cv_text, self.prompt_offer),
+                                            self.continuation, context=job.cv_text)
+        if job.analysis is None:
+            if job.deadline.expired():
+                return self._timeout(job, ANALYSIS)
+            job.status, job.reason = "failed", "analyse: JSON invalide ou absent"
+        else:
+            job.status = "done"
+        return PERSIST
+
+    def _persist(self, job: Job) -> Optional[str]:
+        job.data = None
+        if job.status == "failed":
+            if job.key:
+                self.journal.record(job.key, FAILED, reason=job.reason, **job.fields)
+        elif job.status == "timeout":
+            self.journal.record(job.key, TIMEOUT, reason=f"échéance dépassée ({job.reason})",
+                                stage=job.reason, **job.fields)
+        elif job.status == "done":
+            self.journal.record(job.key, ANALYSIS_DONE, analysis=job.analysis, **job.fields)
+            if self.save:
+                self.analyzer.save_results(job.cv_text, job.analysis, output_name(job.path))
+        if self.reporter and job.analysis and job.status not in ("failed", "timeout"):
+            self.reporter.add(job.path, job.analysis, mode="two-step")
+        icon = {"done": "✅", "skipped": "⏭️", "failed": "❌", "timeout": "⏱️"}[job.status]
+        print(f"{icon} {job.path}")
+        return None
+
+    # ---------------------- Orchestration ----------------------
+    def _jobs(self, paths: List[str], archives: Sequence[str], jobs: List[Job]) -> Iterator[Job]:
+        """Jobs créés au fil de l'eau : la file de préparation borne les membres d'archive en mémoire"""
+        for item in itertools.chain((Job(p) for p in paths), self._archive_jobs(archives)):
+            jobs.append(item)
+            yield item
+
+    def _archive_jobs(self, archives: Sequence[str]) -> Iterator[Job]:
+        for archive in archives:
+            reader = ArchiveReader(archive)
+            try:
+                for member in reader:
+                    yield Job(member.ref, member.data, member.sha256)
+            except (OSError, EOFError, zipfile.BadZipFile, tarfile.TarError) as e:
+                print(f"❌ Archive illisible {archive}: {e}")
+            print(f"🗜️ {archive}: {reader.summary()}")
+
+    def run(self, paths: List[str], resume: bool = False, archives: Sequence[str] = ()) -> dict:
+        """Traiter tous les CV (images, puis CV des archives), renvoie le nombre de CV par statut"""
+        self.resume = resume
+        self.batch_deadline = Deadline(self.batch_timeout)
+        jobs: List[Job] = []
+        self.pipeline = StagePipeline(
+            {PREPARE: self._prepare, OCR: self._ocr, ANALYSIS: self._analysis, PERSIST: self._persist},
+            self.workers, self.queue_size
+        )
+        print(f"🏭 Lot en chaîne: {len(paths)} CV{f' + {len(archives)} archive(s)' if archives else ''} | workers "
+              + ", ".join(f"{name} {count}" for name, count in self.workers.items())
+              + f"{' | reprise' if resume else ''}")
+        self.pipeline.run(self._jobs(paths, archives, jobs))
+
+        counts = {"done": 0, "skipped": 0, "failed": 0, "timeout": 0}
+        for job in jobs:
+            counts[job.status or "failed"] += 1
+        print(f"\n🚀 Lot terminé en {self.pipeline.wall:.1f}s: "
+              f"{counts['done']} analysés, {counts['skipped']} déjà faits, {counts['failed']} échecs"
+              + (f", {counts['timeout']} hors délai (reprise avec --resume)" if counts["timeout"] else ""))
+        print(self.pipeline.report())
+        if self.reporter:
+            print("\n" + self.reporter.leaderboard.render())
+            print(f"📄 Rapport: {', '.join(self.reporter.paths)}")
+        return counts
+
+
+def parse_stage_workers(spec: str) -> Dict[str, int]:
+    """"ocr=2,analyse=1" -> {"ocr": 2, "analyse": 1}"""
+    aliases = {"prep": PREPARE, "preparation": PREPARE, "analysis": ANALYSIS, "persist": PERSIST}
+    workers = {}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        name, _, count = part.partition("=")
+        name = aliases.get(name.strip().lower(), name.strip().lower())
+        if name not in STAGES or not count.strip().isdigit():
+            raise ValueError(f"Étape ou nombre invalide: {part} (étapes: {', '.join(STAGES)})")
+        workers[name] = max(1, int(count))
+    return workers
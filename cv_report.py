@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+🏆 CLASSEMENT ET RAPPORT DE LOT
+
+Au lieu d'un rapport complet par CV, le lot produit :
+- un CSV (une ligne par candidat, pour un tableur)
+- un JSONL (analyse complète par candidat)
+écrits au fil de l'eau, et un classement des K meilleurs candidats
+affiché en direct.
+
+Le classement est un tas borné à K entrées : la mémoire reste constante
+quel que soit le nombre de CV. Tri par score_global, puis technique,
+expérience, formation et soft skills en cas d'égalité.
+
+Usage:
+python cv_report.py cv_batch_report.jsonl --top 20     # reclasser un rapport existant
+python cv_report.py cv_batch_journal.jsonl             # ou directement depuis le journal
+"""
+import argparse
+import csv
+import heapq
+import itertools
+import json
+import threading
+import time
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple
+
+from cv_journal import ANALYSIS_DONE
+
+# Ordre de départage des candidats
+SCORE_KEYS = ("score_global", "score_technique", "score_experience", "score_formation", "score_soft_skills")
+CSV_FIELDS = ("fichier", "nom_prenom") + SCORE_KEYS + ("recommandation", "mode")
+
+
+def _as_number(value) -> float:
+    """Score numérique, même si le modèle a répondu "72/100" ou "72" """
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        head = value.strip().split('/')[0].replace(',', '.')
+        try:
+            return float(head)
+        except ValueError:
+            return 0.0
+    return 0.0
+
+
+def summarize(path: str, analysis: dict, **extra) -> dict:
+    """Ligne compacte d'un candidat (colonnes du CSV)"""
+    row = {"fichier": path, "nom_prenom": analysis.get("nom_prenom", "N/A")}
+    for key in SCORE_KEYS:
+        row[key] = _as_number(analysis.get(key))
+    row["recommandation"] = analysis.get("recommandation", "N/A")
+    row["mode"] = extra.get("mode", "")
+    return row
+
+
+class Leaderboard:
+    def __init__(self, k: int = 10):
+        """Les K meilleurs candidats (tas minimum borné)"""
+        self.k = max(1, k)
+        self._heap: List[tuple] = []
+        self._seq = itertools.count()
+        self.seen = 0
+
+    def add(self, row: dict) -> bool:
+        """Proposer un candidat, True s'il entre dans le classement"""
+        self.seen += 1
+        # Compteur négatif : à égalité parfaite, le premier arrivé reste devant
+        entry = (tuple(row[key] for key in SCORE_KEYS), -next(self._seq), row)
+        if len(self._heap) < self.k:
+            heapq.heappush(self._heap, entry)
+            return True
+        if entry[:2] > self._heap[0][:2]:
+            heapq.heapreplace(self._heap, entry)
+            return True
+        return False
+
+    def top(self, limit: Optional[int] = None) -> List[dict]:
+        rows = [entry[2] for entry in sorted(self._heap, key=lambda e: e[:2], reverse=True)]
+        return rows[:limit] if limit else rows
+
+    def render(self, limit: Optional[int] = None) -> str:
+        rows = self.top(limit)
+        lines = [f"🏆 Top {len(rows)} sur {self.seen} CV"]
+        for rank, row in enumerate(rows, 1):
+            lines.append(f"{rank:>3}. {row['score_global']:>5.0f}/100  {str(row['nom_prenom'])[:28]:<28} "
+                         f"T{row['score_technique']:.0f} E{row['score_experience']:.0f} "
+                         f"F{row['score_formation']:.0f} S{row['score_soft_skills']:.0f}  "
+                         f"{row['recommandation']}  ({Path(row['fichier']).name})")
+        return "\n".join(lines)
+
+
+class ReportWriter:
+    def __init__(self, csv_path: Optional[str] = "cv_batch_report.csv",
+                 jsonl_path: Optional[str] = "cv_batch_report.jsonl",
+                 top_k: int = 10, live: int = 5, refresh: float = 2.0):
+        """
+        Rapport de lot écrit au fil de l'eau
+        csv_path / jsonl_path : fichiers de sortie (None = pas de fichier)
+        top_k                 : taille du classement final
+        live                  : lignes du classement affiché en direct (0 = aucun)
+        refresh               : intervalle minimal entre deux affichages (s)
+        """
+        self.leaderboard = Leaderboard(top_k)
+        self.live = live
+        self.refresh = refresh
+        self._lock = threading.Lock()
+        self._last_render = 0.0
+        self._dirty = False
+        self._csv_file = open(csv_path, "w", newline="", encoding="utf-8-sig") if csv_path else None
+        self._csv = csv.DictWriter(self._csv_file, fieldnames=CSV_FIELDS) if self._csv_file else None
+        if self._csv:
+            self._csv.writeheader()
+        self._jsonl = open(jsonl_path, "w", encoding="utf-8") if jsonl_path else None
+        self.paths = [p for p in (csv_path, jsonl_path) if p]
+
+    def add(self, path: str, analysis: dict, **extra):
+        """Enregistrer un résultat dès qu'il est prêt (appelable depuis plusieurs workers)"""
+        row = summarize(path, analysis, **extra)
+        with self._lock:
+            if self._csv:
+                self._csv.writerow(row)
+                self._csv_file.flush()
+            if self._jsonl:
+                self._jsonl.write(json.dumps({"fichier": path, **extra, "analyse": analysis},
+                                             ensure_ascii=False) + "\n")
+                self._jsonl.flush()
+            self._dirty |= self.leaderboard.add(row)
+            now = time.monotonic()
+            if self.live and self._dirty and now - self._last_render >= self.refresh:
+                print(self.leaderboard.render(self.live))
+                self._last_render = now
+                self._dirty = False
+
+    def close(self):
+        for f in (self._csv_file, self._jsonl):
+            if f:
+                f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def iter_analyses(path: str) -> Iterator[Tuple[str, dict]]:
+    """(fichier, analyse) d'un rapport JSONL ou d'un journal de lot, ligne par ligne"""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if "analyse" in record:
+                yield record.get("fichier", "?"), record["analyse"]
+            elif record.get("state") == ANALYSIS_DONE and "analysis" in record:
+                yield record.get("path", "?"), record["analysis"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Classement des candidats d'un lot")
+    parser.add_argument("report", help="rapport JSONL (cv_batch_report.jsonl) ou journal de lot")
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    board = Leaderboard(args.top)
+    # Un CV analysé à nouveau (journal) ne compte qu'une fois : seuls les chemins sont gardés
+    seen = set()
+    for path, analysis in iter_analyses(args.report):
+        if path not in seen:
+            seen.add(path)
+            board.add(summarize(path, analysis))
+    print(board.render())
+
+
+if __name__ == "__main__":
+    main()
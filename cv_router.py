@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+🧭 ROUTAGE ADAPTATIF ENTRE PIPELINES DEUX ÉTAPES ET ONE-SHOT
+
+Aucun pipeline n'est toujours le plus rapide : cela dépend de la taille
+de l'image, du nombre de pages, d'un texte OCR déjà disponible et de la
+charge des serveurs. Le routeur apprend la latence de chaque stratégie
+sur chaque serveur à partir des derniers CV traités et choisit, CV par CV,
+la moins coûteuse.
+
+Stratégies :
+- text     : analyse RH seule à partir d'un texte OCR existant (toujours choisie si possible)
+- two-step : CVAnalyzer, OCR puis analyse RH
+- oneshot  : CVAnalyzerOneShot (LM Studio) ou OllamaCVOneShot (Ollama)
+
+Chaque décision garde la stratégie, le serveur et la raison du choix.
+"""
+import json
+import threading
+from collections import deque
+from pathlib import Path
+from typing import Callable, Dict, NamedTuple, Optional
+
+from cv_image import ImageInfo
+
+TEXT = "text"
+TWO_STEP = "two-step"
+ONESHOT = "oneshot"
+
+# A priori avant toute mesure : (secondes fixes, secondes par mégapixel)
+DEFAULT_PRIORS = {
+    TEXT: (15.0, 0.0),
+    TWO_STEP: (25.0, 12.0),
+    ONESHOT: (20.0, 12.0),
+}
+
+
+class LatencyModel:
+    def __init__(self, prior, window: int = 30):
+        """
+        Latence = a + b × mégapixels, ajustée sur les `window` dernières mesures
+        prior : (a, b) utilisé tant qu'il n'y a pas assez de mesures
+        """
+        self.prior = tuple(prior)
+        self.samples = deque(maxlen=window)
+
+    @property
+    def n(self) -> int:
+        return len(self.samples)
+
+    def add(self, megapixels: float, seconds: float):
+        self.samples.append((megapixels, seconds))
+
+    def _prior_at(self, megapixels: float) -> float:
+        a, b = self.prior
+        return a + b * megapixels
+
+    def predict(self, megapixels: float) -> float:
+        """Latence estimée pour une image de cette taille"""
+        if not self.samples:
+            return self._prior_at(megapixels)
+        n = len(self.samples)
+        mean_x = sum(x for x, _ in self.samples) / n
+        mean_y = sum(y for _, y in self.samples) / n
+        var_x = sum((x - mean_x) ** 2 for x, _ in self.samples) / n
+        if n < 3 or var_x < 0.25:
+            # Tailles trop proches pour une pente fiable : on garde la
+            # forme de l'a priori, recalée sur la moyenne mesurée
+            return mean_y * self._prior_at(megapixels) / max(self._prior_at(mean_x), 1e-6)
+        b = max(0.0, sum((x - mean_x) * (y - mean_y) for x, y in self.samples) / (var_x * n))
+        a = max(0.0, mean_y - b * mean_x)
+        return a + b * megapixels
+
+
+class RouteDecision(NamedTuple):
+    strategy: str
+    backend: str
+    reason: str
+    estimates: Dict[str, float]
+
+
+class HybridRouter:
+    def __init__(self, backends: Optional[Dict[str, str]] = None, stats_path: Optional[str] = None,
+                 window: int = 30, min_samples: int = 3, explore_every: int = 20,
+                 load_fn: Optional[Callable[[str], float]] = None):
+        """
+        backends    : serveur utilisé par stratégie, ex {"two-step": "lmstudio", "oneshot": "ollama"}
+        stats_path  : fichier JSON où conserver les mesures entre deux lots
+        min_samples : mesures minimales par stratégie avant de faire confiance au modèle
+        explore_every : re-mesure la stratégie délaissée après ce nombre de choix consécutifs
+        load_fn     : charge courante d'un serveur (ex: PriorityScheduler.load), 0 = libre
+        """
+        self.backends = {TWO_STEP: "lmstudio", ONESHOT: "lmstudio"}
+        if backends:
+            self.backends.update(backends)
+        self.backends[TEXT] = self.backends[TWO_STEP]
+        self.window = window
+        self.min_samples = min_samples
+        self.explore_every = explore_every
+        self._since_chosen = {TWO_STEP: 0, ONESHOT: 0}
+        self.load_fn = load_fn
+        self.stats_path = Path(stats_path) if stats_path else None
+        self._lock = threading.Lock()
+        self._models: Dict[str, LatencyModel] = {}
+        self.decisions = []
+        self._load_stats()
+
+    # ---------------------- Modèles de latence ----------------------
+    def _key(self, strategy: str) -> str:
+        return f"{self.backends[strategy]}/{strategy}"
+
+    def _model(self, strategy: str) -> LatencyModel:
+        key = self._key(strategy)
+        if key not in self._models:
+            self._models[key] = LatencyModel(DEFAULT_PRIORS[strategy], self.window)
+        return self._models[key]
+
+    def _load_stats(self):
+        if not self.stats_path or not self.stats_path.exists():
+            return
+        try:
+            data = json.loads(self.stats_path.read_text(encoding='utf-8'))
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"⚠️ Statistiques de routage illisibles: {e}")
+            return
+        for key, samples in data.items():
+            strategy = key.split("/", 1)[1]
+            if strategy in DEFAULT_PRIORS:
+                model = LatencyModel(DEFAULT_PRIORS[strategy], self.window)
+                for x, y in samples:
+                    model.add(x, y)
+                self._models[key] = model
+
+    def save_stats(self):
+        """Conserver les mesures récentes pour les prochains lots"""
+        if not self.stats_path:
+            return
+        with self._lock:
+            data = {k: list(m.samples) for k, m in self._models.items()}
+        self.stats_path.write_text(json.dumps(data, indent=2), encoding='utf-8')
+
+    # ---------------------- Décision ----------------------
+    def choose(self, info: Optional[ImageInfo], has_ocr_text: bool = False) -> RouteDecision:
+        """Choisir la stratégie la moins coûteuse pour ce CV"""
+        with self._lock:
+            if has_ocr_text:
+                decision = RouteDecision(TEXT, self.backends[TEXT], "texte OCR déjà disponible", {})
+                self.decisions.append(decision)
+                return decision
+
+            megapixels = info.megapixels if info else 0.0
+            candidates = (TWO_STEP, ONESHOT)
+            estimates = {}
+            for strategy in candidates:
+                load = self.load_fn(self.backends[strategy]) if self.load_fn else 0.0
+                estimates[strategy] = self._model(strategy).predict(megapixels) * (1.0 + load)
+
+            # Exploration : chaque stratégie doit être mesurée avant d'être jugée
+            under_sampled = [s for s in candidates if self._model(s).n < self.min_samples]
+            if under_sampled:
+                strategy = min(under_sampled, key=lambda s: self._model(s).n)
+                reason = f"exploration ({self._model(strategy).n}/{self.min_samples} mesures)"
+            else:
+                strategy = min(candidates, key=lambda s: estimates[s])
+                other = ONESHOT if strategy == TWO_STEP else TWO_STEP
+                reason = (f"estimé {estimates[strategy]:.1f}s contre {estimates[other]:.1f}s "
+                          f"({megapixels:.1f} Mpx)")
+                if self._since_chosen[other] >= self.explore_every:
+                    # Les mesures de l'autre stratégie vieillissent : on la re-mesure
+                    strategy = other
+                    reason = f"re-mesure après {self.explore_every} CV"
+            for s in candidates:
+                self._since_chosen[s] = 0 if s == strategy else self._since_chosen[s] + 1
+            decision = RouteDecision(strategy, self.backends[strategy], reason,
+                                     {s: round(v, 2) for s, v in estimates.items()})
+            self.decisions.append(decision)
+            return decision
+
+    def observe(self, decision: RouteDecision, info: Optional[ImageInfo], seconds: float, ok: bool = True):
+        """Enregistrer la latence mesurée (un échec compte double)"""
+        megapixels = 0.0 if decision.strategy == TEXT or not info else info.megapixels
+        with self._lock:
+            self._model(decision.strategy).add(megapixels, seconds if ok else seconds * 2)
+
+    def summary(self) -> Dict[str, int]:
+        """Nombre de CV par stratégie choisie"""
+        counts: Dict[str, int] = {}
+        with self._lock:
+            for d in self.decisions:
+                counts[d.strategy] = counts.get(d.strategy, 0) + 1
+        return counts
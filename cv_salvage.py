@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+🩹 RÉCUPÉRATION DES RÉPONSES JSON TRONQUÉES
+
+Une réponse coupée par max_tokens (ou un flux interrompu) n'est plus
+jetée entière parce que json.loads échoue sur la dernière ligne :
+
+- JSON réparé : chaîne ouverte refermée, tableaux et objets fermés,
+  virgules en trop retirées ; si la fin reste illisible (clé sans valeur,
+  nombre coupé), on revient à la dernière valeur complète
+- scores donnés en texte ("32", "32/40", "28,5 points") convertis en nombres
+- score_global manquant recalculé à partir des quatre sous-scores
+- champ obligatoire encore manquant : un petit appel texte de
+  continuation ne demande que ce champ, au lieu de relancer l'appel vision
+
+Les champs récupérés sont listés dans "champs_partiels" de l'analyse
+(champ -> tronqué / converti / calculé / complété), repris tels quels par
+le journal et le rapport JSONL.
+
+Usage:
+python cv_salvage.py reponse_brute.txt      # JSON récupéré et champs partiels
+"""
+import argparse
+import json
+import re
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple
+
+from cv_cascade import REQUIRED_FIELDS, SCORE_LIMITS, parse_analysis
+from cv_offer import completion_for
+
+PARTIAL_KEY = "champs_partiels"
+TRUNCATED = "tronqué"
+COERCED = "converti"
+COMPUTED = "calculé"
+CONTINUED = "complété"
+# Texte du CV repris dans la continuation (assez pour relire le nom ou l'expérience)
+CONTEXT_CHARS = 4000
+
+_NUMBER = re.compile(r"-?\d+(?:[.,]\d+)?")
+_CLOSERS = {"{": "}", "[": "]"}
+
+CONTINUATION_PROMPT = """L'analyse RH ci-dessous (JSON) a été coupée avant la fin :
+{partial}
+{context}
+Donnez UNIQUEMENT les champs suivants : {fields}
+Barème : score_technique sur 40, score_experience sur 30, score_formation sur 15,
+score_soft_skills sur 15, score_global sur 100.
+recommandation : "Recommandé", "À considérer" ou "Non recommandé".
+Répondez par un objet JSON contenant seulement ces champs.
+"""
+
+
+def _close(text: str, stack: List[str]) -> str:
+    text = text.rstrip()
+    if text.endswith(","):
+        text = text[:-1].rstrip()
+    return text + "".join(_CLOSERS[c] for c in reversed(stack))
+
+
+def _loads(text: str) -> Optional[dict]:
+    try:
+        data = json.loads(text, strict=False)
+    except json.JSONDecodeError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def repair_json(raw: Optional[str]) -> Optional[Tuple[dict, List[str]]]:
+    """
+    Objet JSON d'une réponse, éventuellement tronquée ou mal formée
+    Renvoie (objet, clés de premier niveau tronquées), None si rien n'est récupérable.
+    """
+    if not raw or raw.find("{") == -1:
+        return None
+    text = raw[raw.find("{"):]
+    try:
+        data, _ = json.JSONDecoder(strict=False).raw_decode(text)
+        if isinstance(data, dict):
+            return data, []
+    except json.JSONDecodeError:
+        pass
+
+    out: List[str] = []
+    stack: List[str] = []
+    # Points de coupe : virgules hors chaîne (position, pile, clé de premier niveau en cours)
+    cuts: List[Tuple[int, List[str], Optional[str]]] = []
+    in_string = escape = False
+    expect_key = complete = False
+    string_start = 0
+    key = pending = None
+    for ch in text:
+        if in_string:
+            out.append(ch)
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+                if len(stack) == 1:
+                    if expect_key:
+                        try:
+                            pending = json.loads("".join(out[string_start:]), strict=False)
+                        except json.JSONDecodeError:
+                            pending = None
+                    else:
+                        complete = True
+            continue
+        if ch == '"':
+            in_string, string_start = True, len(out)
+            complete = False
+        elif ch in "{[":
+            stack.append(ch)
+            expect_key = expect_key if len(stack) > 1 else True
+            complete = False
+        elif ch in "}]":
+            # Virgule en trop avant la fermeture ; fermeture adaptée à la pile
+            while out and out[-1].isspace():
+                out.pop()
+            if out and out[-1] == ",":
+                out.pop()
+            ch = _CLOSERS[stack.pop()] if stack else ch
+            out.append(ch)
+            if not stack:
+                break
+            complete = len(stack) == 1
+            continue
+        elif ch == ",":
+            cuts.append((len(out), list(stack), key))
+            if len(stack) == 1:
+                expect_key = True
+            complete = False
+        elif ch == ":":
+            if len(stack) == 1:
+                key, expect_key = pending, False
+        elif not ch.isspace() and len(stack) == 1:
+            complete = False
+        out.append(ch)
+
+    attempts = []
+    if not stack:
+        attempts.append(("".join(out), []))
+    else:
+        text = "".join(out)
+        if in_string:
+            text = (text[:-1] if escape else text) + '"'
+        truncated = [] if expect_key or (complete and len(stack) == 1) else [key]
+        attempts.append((_close(text, stack), truncated))
+    for position, cut_stack, cut_key in reversed(cuts):
+        attempts.append((_close("".join(out[:position]), cut_stack), [cut_key] if len(cut_stack) > 1 else []))
+    for candidate, truncated in attempts:
+        data = _loads(candidate)
+        if data is not None:
+            return data, [name for name in truncated if name in data]
+    return None
+
+
+def coerce_scores(analysis: dict) -> List[str]:
+    """Scores donnés en texte convertis en nombres, renvoie les champs convertis"""
+    coerced = []
+    for name, value in list(analysis.items()):
+        if not name.startswith("score_") or not isinstance(value, str):
+            continue
+        match = _NUMBER.search(value)
+        if match:
+            number = float(match.group().replace(",", "."))
+            analysis[name] = int(number) if number.is_integer() else number
+            coerced.append(name)
+    return coerced
+
+
+def missing_fields(analysis: dict) -> List[str]:
+    """Champs obligatoires absents ou tronqués"""
+    partial = analysis.get(PARTIAL_KEY, {})
+    return [name for name in REQUIRED_FIELDS
+            if name not in analysis or partial.get(name) == TRUNCATED]
+
+
+def _mark(analysis: dict, fields: List[str], how: str):
+    if fields:
+        analysis.setdefault(PARTIAL_KEY, {}).update({name: how for name in fields})
+
+
+def complete_fields(analysis: dict, fields: List[str], complete: Callable[[str], Optional[str]],
+                    context: Optional[str] = None) -> List[str]:
+    """Un appel texte pour les seuls champs `fields`, renvoie les champs obtenus"""
+    partial = {k: v for k, v in analysis.items() if k != PARTIAL_KEY and k not in fields}
+    prompt = CONTINUATION_PROMPT.format(
+        partial=json.dumps(partial, ensure_ascii=False),
+        context=f"CV (texte extrait) :\n{context[:CONTEXT_CHARS]}\n" if context else "",
+        fields=", ".join(fields)
+    )
+    repaired = repair_json(complete(prompt))
+    if repaired is None:
+        return []
+    reply, _ = repaired
+    coerce_scores(reply)
+    obtained = [name for name in fields if name in reply]
+    for name in obtained:
+        analysis[name] = reply[name]
+    return obtained
+
+
+def continuation_for(analyzer) -> Callable[[str], Optional[str]]:
+    """Appel texte de continuation sur le serveur d'un analyseur (cf. cv_offer.completion_for)"""
+    return completion_for(analyzer, label="Continuation")
+
+
+def recover_analysis(raw: Optional[str], complete: Optional[Callable[[str], Optional[str]]] = None,
+                     context: Optional[str] = None) -> Optional[dict]:
+    """
+    Analyse RH à partir de la réponse brute du modèle, même tronquée
+    complete : appel texte pour compléter les champs obligatoires manquants (cf. continuation_for)
+    context  : texte du CV, donné à la continuation (two-step)
+    None si aucun JSON n'est récupérable.
+    """
+    analysis = parse_analysis(raw)
+    if analysis is None:
+        repaired = repair_json(raw)
+        if repaired is None:
+            return None
+        analysis, truncated = repaired
+        _mark(analysis, truncated, TRUNCATED)
+        print(f"🩹 JSON réparé ({len(analysis)} champs"
+              + (f", tronqué: {', '.join(truncated)}" if truncated else "") + ")")
+    _mark(analysis, coerce_scores(analysis), COERCED)
+
+    parts = [analysis.get(name) for name in SCORE_LIMITS if name != "score_global"]
+    if "score_global" in missing_fields(analysis) and all(isinstance(v, (int, float)) for v in parts):
+        analysis["score_global"] = sum(parts)
+        _mark(analysis, ["score_global"], COMPUTED)
+
+    fields = missing_fields(analysis)
+    if fields and complete is not None:
+        print(f"🧩 Continuation pour: {', '.join(fields)}")
+        _mark(analysis, complete_fields(analysis, fields, complete, context), CONTINUED)
+    return analysis
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Récupération d'une réponse JSON tronquée")
+    parser.add_argument("raw", help="fichier contenant la réponse brute du modèle")
+    args = parser.parse_args()
+    analysis = recover_analysis(Path(args.raw).read_text(encoding='utf-8'))
+    if analysis is None:
+        print("❌ Aucun JSON récupérable")
+        return
+    print(json.dumps(analysis, indent=2, ensure_ascii=False))
+    missing = missing_fields(analysis)
+    if missing:
+        print(f"⚠️ Champs obligatoires manquants: {', '.join(missing)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,440 @@
+#!/usr/bin/env python3
+"""
+🚦 ORDONNANCEUR DE PRIORITÉ POUR LES APPELS MODÈLE
+
+Place une file d'attente devant LM Studio / Ollama pour qu'une demande
+interactive (un recruteur qui veut un score tout de suite) passe devant
+un lot de 500 CV lancé pour la nuit.
+
+Trois classes de priorité :
+- interactive : demande humaine, doit rester proche de la latence d'une requête seule
+- normal      : usage courant des scripts
+- bulk        : traitements par lots
+
+Répartition pondérée (weighted round-robin lissé) entre les classes,
+protection anti-famine (une requête qui attend plus de `max_wait`
+secondes passe en tête) et créneaux réservés à l'interactif.
+Avec `limiter=` (AdaptiveLimit, cv_limiter.py), le nombre de créneaux
+suit la limite adaptative, bornée par max_concurrent.
+
+Deux usages :
+1. Dans un même processus : PriorityScheduler passé aux analyseurs
+   (CVAnalyzer, CVAnalyzerOneShot, OllamaCVOneShot) via `scheduler=`.
+2. Entre processus : proxy HTTP local devant le serveur modèle, la
+   priorité est lue dans l'en-tête X-CV-Priority envoyé par les analyseurs.
+
+Usage proxy:
+python cv_scheduler.py --port 1240 --upstream http://localhost:1234/v1 --slots 2 --reserve 1
+python cv_scheduler.py --port 1240 --upstream http://localhost:1234/v1 --slots 8 --adaptive
+puis: CV_BASE_URL=http://localhost:1240/v1 CV_PRIORITY=interactive python cv_analyzer.py cv.jpg "..."
+
+Simulation (sans modèle):
+python cv_scheduler.py --simulate
+"""
+import argparse
+import itertools
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+from cv_deadline import DeadlineExceeded, current_deadline
+
+INTERACTIVE = "interactive"
+NORMAL = "normal"
+BULK = "bulk"
+PRIORITIES = (INTERACTIVE, NORMAL, BULK)
+
+# Part relative des créneaux quand les trois classes attendent
+DEFAULT_WEIGHTS = {INTERACTIVE: 8, NORMAL: 3, BULK: 1}
+
+PRIORITY_HEADER = "X-CV-Priority"
+# Chemin des métriques du proxy (hors API du serveur modèle)
+METRICS_PATH = "/cv-scheduler/metrics"
+# Au-delà, le corps d'une requête contient une image (OCR, one-shot)
+IMAGE_BODY_BYTES = 64_000
+# En-têtes propres à une connexion (RFC 9110), jamais relayés par le proxy ;
+# Host et Content-Length sont recalculés par requests
+HOP_BY_HOP_HEADERS = {"connection", "keep-alive", "proxy-authenticate", "proxy-authorization", "te",
+                      "trailer", "trailers", "transfer-encoding", "upgrade", "host", "content-length"}
+
+
+def normalize_priority(priority: Optional[str]) -> str:
+    """Ramène une priorité inconnue ou absente à 'normal'"""
+    if priority and priority.lower() in PRIORITIES:
+        return priority.lower()
+    return NORMAL
+
+
+class _Ticket:
+    __slots__ = ("priority", "enqueued_at", "granted", "seq", "granted_at", "in_flight", "ok")
+
+    def __init__(self, priority: str, seq: int):
+        self.priority = priority
+        self.enqueued_at = time.monotonic()
+        self.granted = False
+        self.seq = seq
+        self.granted_at = 0.0
+        self.in_flight = 0
+        # Mis à False par l'appelant pour un appel en échec sans exception
+        self.ok = True
+
+
+class PriorityScheduler:
+    def __init__(self, max_concurrent: int = 1, weights: Optional[Dict[str, int]] = None,
+                 max_wait: float = 30.0, reserved_interactive: int = 0, limiter=None):
+        """
+        max_concurrent       : nombre d'appels modèle simultanés autorisés (plafond avec limiter)
+        weights              : poids de répartition par classe
+        max_wait             : au-delà (secondes), une requête en attente passe en tête
+        reserved_interactive : créneaux que seules les requêtes interactives peuvent prendre
+        limiter              : limite adaptative (AdaptiveLimit), nourrie par la latence des appels
+        """
+        if max_concurrent < 1:
+            raise ValueError("max_concurrent doit être >= 1")
+        if not 0 <= reserved_interactive < max_concurrent:
+            raise ValueError("reserved_interactive doit être < max_concurrent")
+        self.max_concurrent = max_concurrent
+        self.weights = dict(DEFAULT_WEIGHTS)
+        if weights:
+            self.weights.update(weights)
+        self.max_wait = max_wait
+        self.reserved_interactive = reserved_interactive
+        self.limiter = limiter
+
+        self._cond = threading.Condition()
+        self._queues = {p: deque() for p in PRIORITIES}
+        self._credits = {p: 0 for p in PRIORITIES}
+        self._in_flight = 0
+        self._seq = itertools.count()
+        self._stats = {p: {"granted": 0, "wait_total": 0.0, "wait_max": 0.0, "starved": 0}
+                       for p in PRIORITIES}
+
+    # ---------------------- API ----------------------
+    @contextmanager
+    def slot(self, priority: str = NORMAL, kind: str = "appel"):
+        """
+        Bloque jusqu'à obtention d'un créneau, le libère en sortie
+        kind : type d'appel, pour la latence de référence de la limite adaptative
+        """
+        ticket = self._acquire(normalize_priority(priority))
+        sampled = True
+        try:
+            yield ticket
+        except DeadlineExceeded:
+            # Échéance du CV, pas un signe de saturation du serveur
+            sampled = False
+            raise
+        except Exception:
+            ticket.ok = False
+            raise
+        finally:
+            if self.limiter is not None and sampled:
+                self.limiter.observe(kind, time.monotonic() - ticket.granted_at, ticket.ok, ticket.in_flight)
+            self._release()
+
+    def capacity(self) -> int:
+        """Créneaux utilisables : max_concurrent, ou la limite adaptative si plus basse"""
+        if self.limiter is None:
+            return self.max_concurrent
+        return min(self.max_concurrent, self.limiter.current())
+
+    def snapshot(self) -> dict:
+        """État courant : profondeur des files, appels en cours, statistiques d'attente"""
+        with self._cond:
+            stats = {}
+            for p, s in self._stats.items():
+                stats[p] = dict(s)
+                stats[p]["wait_avg"] = s["wait_total"] / s["granted"] if s["granted"] else 0.0
+            return {
+                "in_flight": self._in_flight,
+                "max_concurrent": self.max_concurrent,
+                "limit": self.capacity(),
+                "queued": {p: len(q) for p, q in self._queues.items()},
+                "stats": stats,
+            }
+
+    def load(self) -> float:
+        """Charge relative : (en cours + en attente) / créneaux"""
+        with self._cond:
+            waiting = sum(len(q) for q in self._queues.values())
+            return (self._in_flight + waiting) / self.capacity()
+
+    # ---------------------- Interne ----------------------
+    def _acquire(self, priority: str) -> _Ticket:
+        with self._cond:
+            ticket = _Ticket(priority, next(self._seq))
+            self._queues[priority].append(ticket)
+            self._dispatch()
+            deadline = current_deadline()
+            while not ticket.granted:
+                remaining = deadline.remaining() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    # Échéance du CV atteinte en file : la place est rendue sans attendre un créneau
+                    self._queues[priority].remove(ticket)
+                    self._dispatch()
+                    raise DeadlineExceeded(f"échéance atteinte en attente d'un créneau ({priority})")
+                # Réveil périodique pour faire jouer la protection anti-famine
+                wait = min(self.max_wait, 1.0)
+                self._cond.wait(timeout=wait if remaining is None else min(wait, remaining))
+                self._dispatch()
+            return ticket
+
+    def _release(self):
+        with self._cond:
+            self._in_flight -= 1
+            self._dispatch()
+
+    def _free_slots(self) -> int:
+        return self.capacity() - self._in_flight
+
+    def _dispatch(self):
+        """Attribue les créneaux libres (appelé sous verrou)"""
+        granted_any = False
+        while self._free_slots() > 0:
+            ticket = self._pick()
+            if ticket is None:
+                break
+            self._queues[ticket.priority].popleft()
+            ticket.granted = True
+            self._in_flight += 1
+            ticket.granted_at = time.monotonic()
+            ticket.in_flight = self._in_flight
+            wait = time.monotonic() - ticket.enqueued_at
+            stats = self._stats[ticket.priority]
+            stats["granted"] += 1
+            stats["wait_total"] += wait
+            stats["wait_max"] = max(stats["wait_max"], wait)
+            granted_any = True
+        if granted_any:
+            self._cond.notify_all()
+
+    def _pick(self) -> Optional[_Ticket]:
+        heads = {p: q[0] for p, q in self._queues.items() if q}
+        if not heads:
+            return None
+        # Les créneaux réservés ne servent qu'à l'interactif (au moins un créneau reste ouvert aux autres)
+        reserved = min(self.reserved_interactive, self.capacity() - 1)
+        only_interactive = self._free_slots() <= reserved
+        if only_interactive:
+            return heads.get(INTERACTIVE)
+
+        # Anti-famine : la plus ancienne requête ayant dépassé max_wait passe
+        now = time.monotonic()
+        starved = [t for t in heads.values() if now - t.enqueued_at >= self.max_wait]
+        if starved:
+            ticket = min(starved, key=lambda t: t.seq)
+            if ticket.priority != INTERACTIVE:
+                self._stats[ticket.priority]["starved"] += 1
+            return ticket
+
+        # Weighted round-robin lissé entre les classes non vides
+        total = 0
+        for p in heads:
+            self._credits[p] += self.weights[p]
+            total += self.weights[p]
+        chosen = max(heads, key=lambda p: (self._credits[p], -PRIORITIES.index(p)))
+        self._credits[chosen] -= total
+        return heads[chosen]
+
+
+# ---------------------- Proxy HTTP ----------------------
+class ChunkedResponse:
+    def __init__(self, handler, status: int, content_type: str):
+        """
+        Réponse HTTP/1.1 relayée morceau par morceau (Transfer-Encoding: chunked)
+        Sans finish(), le morceau final manque : le client voit une réponse tronquée
+        (ChunkedEncodingError côté requests) au lieu d'un 200 apparemment complet.
+        """
+        handler.send_response(status)
+        handler.send_header("Content-Type", content_type)
+        handler.send_header("Transfer-Encoding", "chunked")
+        handler.end_headers()
+        self.wfile = handler.wfile
+
+    def write(self, data: bytes):
+        if data:
+            self.wfile.write(b"%X\r\n%s\r\n" % (len(data), data))
+            self.wfile.flush()
+
+    def finish(self):
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+
+def serve_proxy(upstream: str, port: int, scheduler: PriorityScheduler, host: str = "127.0.0.1"):
+    """Proxy local : applique l'ordonnancement devant le serveur modèle"""
+    import requests
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    upstream = upstream.rstrip('/')
+    prefix = _path_prefix(upstream)
+    root = upstream[:-len(prefix)] if prefix else upstream
+    session = requests.Session()
+
+    class Handler(BaseHTTPRequestHandler):
+        # HTTP/1.1 : réponses en morceaux, une coupure de l'amont reste visible du client
+        protocol_version = "HTTP/1.1"
+
+        def _forward(self, method):
+            length = int(self.headers.get("Content-Length") or 0)
+            body = self.rfile.read(length) if length else None
+            priority = normalize_priority(self.headers.get(PRIORITY_HEADER))
+            if self.path == METRICS_PATH:
+                self._metrics()
+                return
+            if prefix and self.path.startswith(prefix):
+                # Le chemin du proxy reprend celui de l'amont (ex: /v1/chat/completions)
+                path = self.path[len(prefix):]
+                target = upstream + path
+            else:
+                # Hors préfixe (ex: /api/v0/models de LM Studio) : racine du serveur amont
+                path = self.path
+                target = root + path
+            headers = _upstream_headers(self.headers)
+            with scheduler.slot(priority, kind=_request_kind(path, body)) as ticket:
+                response = None
+                try:
+                    with session.request(method, target, data=body, headers=headers,
+                                         stream=True, timeout=600) as r:
+                        ticket.ok = r.status_code < 500
+                        response = ChunkedResponse(self, r.status_code,
+                                                   r.headers.get("Content-Type", "application/json"))
+                        for chunk in r.iter_content(chunk_size=None):
+                            response.write(chunk)
+                    response.finish()
+                except Exception as e:
+                    ticket.ok = False
+                    if response is not None:
+                        # Réponse déjà commencée : pas de morceau final, connexion coupée
+                        self.close_connection = True
+                    else:
+                        self.send_error(502, f"Upstream: {e}")
+
+        def _metrics(self):
+            data = render_metrics(scheduler.snapshot(), upstream).encode('utf-8')
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            self._forward("GET")
+
+        def do_POST(self):
+            self._forward("POST")
+
+        def log_message(self, fmt, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    print(f"🚦 Proxy prioritaire: http://{host}:{port} -> {upstream}")
+    print(f"   Créneaux: {scheduler.max_concurrent} (réservés interactif: {scheduler.reserved_interactive})"
+          + (" | limite adaptative" if scheduler.limiter else ""))
+    print(f"   Métriques: http://{host}:{port}{METRICS_PATH}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n📊 Statistiques:", scheduler.snapshot()["stats"])
+        if scheduler.limiter:
+            print(f"🎚️ {scheduler.limiter.summary()}")
+    finally:
+        server.server_close()
+
+
+def _request_kind(path: str, body: Optional[bytes]) -> str:
+    """Type d'appel pour la latence de référence : chemin, avec ou sans image"""
+    return f"{path}:{'image' if body and len(body) > IMAGE_BODY_BYTES else 'texte'}"
+
+
+def render_metrics(snapshot: dict, endpoint: str) -> str:
+    """Métriques de l'ordonnanceur au format texte Prometheus"""
+    label = f'endpoint="{endpoint}"'
+    lines = [
+        "# TYPE cv_scheduler_limit gauge",
+        f"cv_scheduler_limit{{{label}}} {snapshot['limit']}",
+        "# TYPE cv_scheduler_max_concurrent gauge",
+        f"cv_scheduler_max_concurrent{{{label}}} {snapshot['max_concurrent']}",
+        "# TYPE cv_scheduler_in_flight gauge",
+        f"cv_scheduler_in_flight{{{label}}} {snapshot['in_flight']}",
+        "# TYPE cv_scheduler_queued gauge",
+    ]
+    lines += [f'cv_scheduler_queued{{{label},priority="{p}"}} {n}' for p, n in snapshot["queued"].items()]
+    lines.append("# TYPE cv_scheduler_granted_total counter")
+    lines += [f'cv_scheduler_granted_total{{{label},priority="{p}"}} {s["granted"]}'
+              for p, s in snapshot["stats"].items()]
+    return "\n".join(lines) + "\n"
+
+
+def _upstream_headers(headers) -> Dict[str, str]:
+    """En-têtes de la requête cliente à relayer vers l'amont (Authorization compris)"""
+    dropped = set(HOP_BY_HOP_HEADERS)
+    # En-têtes nommés dans Connection : propres à cette connexion aussi
+    dropped.update(h.strip().lower() for h in (headers.get("Connection") or "").split(",") if h.strip())
+    return {name: value for name, value in headers.items() if name.lower() not in dropped}
+
+
+def _path_prefix(url: str) -> str:
+    """Partie chemin d'une URL (ex: '/v1' pour http://localhost:1234/v1)"""
+    rest = url.split("://", 1)[-1]
+    return "/" + rest.split("/", 1)[1] if "/" in rest else ""
+
+
+# ---------------------- Simulation ----------------------
+def simulate(slots: int = 2, reserve: int = 1, bulk_jobs: int = 60, service: float = 0.2):
+    """Lot bulk saturant + requêtes interactives ponctuelles, sans modèle"""
+    scheduler = PriorityScheduler(max_concurrent=slots, reserved_interactive=reserve, max_wait=5.0)
+    latencies = []
+
+    def job(priority, record=None):
+        start = time.monotonic()
+        with scheduler.slot(priority):
+            time.sleep(service * random.uniform(0.8, 1.2))
+        if record is not None:
+            record.append(time.monotonic() - start)
+
+    threads = [threading.Thread(target=job, args=(BULK,)) for _ in range(bulk_jobs)]
+    for t in threads:
+        t.start()
+    for _ in range(5):
+        time.sleep(service * 2)
+        t = threading.Thread(target=job, args=(INTERACTIVE, latencies))
+        t.start()
+        threads.append(t)
+    for t in threads:
+        t.join()
+
+    print(f"🧪 Simulation: {bulk_jobs} bulk, {slots} créneaux, {reserve} réservé(s), service ~{service:.2f}s")
+    print(f"⚡ Latence interactive: moy {sum(latencies)/len(latencies):.2f}s | max {max(latencies):.2f}s")
+    print(f"📊 {scheduler.snapshot()['stats']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ordonnanceur de priorité pour LM Studio / Ollama")
+    parser.add_argument("--upstream", default="http://localhost:1234/v1")
+    parser.add_argument("--port", type=int, default=1240)
+    parser.add_argument("--slots", type=int, default=1, help="appels simultanés vers le modèle")
+    parser.add_argument("--reserve", type=int, default=0, help="créneaux réservés à l'interactif")
+    parser.add_argument("--max-wait", type=float, default=30.0, help="seuil anti-famine (s)")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="limite adaptative (AIMD) des appels simultanés, --slots = plafond")
+    parser.add_argument("--simulate", action="store_true", help="simulation sans modèle")
+    args = parser.parse_args()
+
+    if args.simulate:
+        simulate(slots=max(args.slots, 2), reserve=max(args.reserve, 1))
+        return
+    limiter = None
+    if args.adaptive:
+        from cv_limiter import AdaptiveLimit
+        limiter = AdaptiveLimit(initial=1, max_limit=args.slots)
+    scheduler = PriorityScheduler(max_concurrent=args.slots, max_wait=args.max_wait,
+                                  reserved_interactive=args.reserve, limiter=limiter)
+    serve_proxy(args.upstream, args.port, scheduler)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+🧩 DÉCOUPAGE D'UN CV EN ZONES DE LECTURE
+
+Pour les CV denses sur plusieurs colonnes : détection des gouttières
+(bandes verticales vides) et des blancs entre blocs, puis découpage de
+l'image en zones rendues dans l'ordre de lecture :
+- sections pleine largeur (en-tête...) de haut en bas
+- dans une section multi-colonnes, colonne de gauche entière puis la suivante
+- une colonne trop haute est recoupée entre deux blocs de texte
+
+Chaque zone est lue séparément (OCR en parallèle, cf. cv_analyzer.py),
+ce qui réduit le temps de pré-remplissage et évite de tronquer la sortie
+d'une page dense. Nécessite Pillow (optionnel) ; sans lui, aucun découpage.
+
+Usage:
+python cv_tiles.py cv.jpg            # affiche les zones détectées
+python cv_tiles.py cv.jpg --save     # écrit cv_zone_1.jpg, cv_zone_2.jpg...
+"""
+import argparse
+import io
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow optionnel : pas de découpage
+    Image = None
+
+Box = Tuple[int, int, int, int]  # (gauche, haut, droite, bas) en pixels
+
+# Largeur de l'image de travail pour l'analyse de mise en page
+ANALYSIS_WIDTH = 1000
+# Pixel considéré comme de l'encre sous ce niveau de gris
+INK_LEVEL = 140
+# Ligne ou colonne vide : moins de 0,4 % de pixels d'encre (valeur moyenne sur 255)
+BLANK_LEVEL = 1.0
+# Gouttière minimale entre colonnes (part de la largeur du contenu)
+MIN_GUTTER = 0.02
+# Colonne minimale (part de la largeur du contenu) : en dessous, un filet de séparation
+# ou une marge décorative, rattaché à la colonne voisine plutôt que lu seul
+MIN_COLUMN = 0.05
+# Blanc minimal séparant deux sections pleine largeur (part de la hauteur)
+MIN_SECTION_GAP = 0.012
+# Blanc minimal pour recouper une colonne (part de la hauteur)
+MIN_BLOCK_GAP = 0.004
+# Surface maximale d'une zone (pixels pleine résolution)
+MAX_TILE_PIXELS = 1_500_000
+MAX_TILES = 8
+# Marge ajoutée autour de chaque zone (pixels de travail)
+PADDING = 4
+
+
+def _profile(bw, box: Box, axis: str) -> List[float]:
+    """Encre moyenne par colonne (axis="x") ou par ligne (axis="y") dans `box`"""
+    region = bw.crop(box)
+    width, height = region.size
+    size = (width, 1) if axis == "x" else (1, height)
+    return list(region.resize(size, Image.BOX).tobytes())
+
+
+def _blank_runs(profile: Sequence[float], min_length: int) -> List[Tuple[int, int]]:
+    """Intervalles [début, fin) de valeurs vides d'au moins `min_length`"""
+    runs, start = [], None
+    for i, value in enumerate(list(profile) + [BLANK_LEVEL + 1]):
+        if value <= BLANK_LEVEL:
+            if start is None:
+                start = i
+        elif start is not None:
+            if i - start >= min_length:
+                runs.append((start, i))
+            start = None
+    return runs
+
+
+def _content_extent(profile: Sequence[float]) -> Optional[Tuple[int, int]]:
+    inked = [i for i, v in enumerate(profile) if v > BLANK_LEVEL]
+    return (inked[0], inked[-1] + 1) if inked else None
+
+
+def _gutters(bw, box: Box) -> List[int]:
+    """Abscisses des gouttières verticales traversant toute la bande `box`"""
+    left, top, right, bottom = box
+    profile = _profile(bw, box, "x")
+    extent = _content_extent(profile)
+    if extent is None:
+        return []
+    start, end = extent
+    width = end - start
+    min_length = max(3, int(width * MIN_GUTTER))
+    cuts = []
+    for a, b in _blank_runs(profile[start:end], min_length):
+        # Une gouttière est entre deux colonnes, pas dans une marge
+        if 0.15 * width <= (a + b) / 2 <= 0.85 * width:
+            cuts.append(left + start + (a + b) // 2)
+    return cuts[:2]
+
+
+def _sections(bw) -> List[Tuple[Box, List[int]]]:
+    """Bandes horizontales de la page, avec leurs gouttières (vide = pleine largeur)"""
+    width, height = bw.size
+    profile = _profile(bw, (0, 0, width, height), "y")
+    extent = _content_extent(profile)
+    if extent is None:
+        return []
+    top, bottom = extent
+    runs = _blank_runs(profile[top:bottom], max(3, int(height * MIN_SECTION_GAP)))
+    bounds = [top] + [top + (a + b) // 2 for a, b in runs] + [bottom]
+
+    sections = []
+    for y0, y1 in zip(bounds, bounds[1:]):
+        box = (0, y0, width, y1)
+        gutters = _gutters(bw, box)
+        previous = sections[-1] if sections else None
+        tolerance = width * MIN_GUTTER * 2
+        if (previous and gutters and len(previous[1]) == len(gutters)
+                and all(abs(g - p) <= tolerance for g, p in zip(gutters, previous[1]))):
+            # Même disposition que la bande précédente : une seule section multi-colonnes
+            merged = _gutters(bw, (0, previous[0][1], width, y1)) or previous[1]
+            sections[-1] = ((0, previous[0][1], width, y1), merged)
+        else:
+            sections.append((box, gutters))
+    return sections
+
+
+def _split_column(bw, box: Box, max_height: int) -> List[Box]:
+    """Recouper une colonne trop haute en blocs de hauteurs voisines, entre deux paragraphes"""
+    left, top, right, bottom = box
+    height = bottom - top
+    if height <= max_height:
+        return [box]
+    profile = _profile(bw, box, "y")
+    cuts = [top + (a + b) // 2 for a, b in _blank_runs(profile, max(2, int(bw.size[1] * MIN_BLOCK_GAP)))]
+    if not cuts:
+        return [box]
+    count = -(-height // max_height)
+    chosen = []
+    for k in range(1, count):
+        target = top + height * k // count
+        cut = min(cuts, key=lambda c: abs(c - target))
+        if cut not in chosen and (not chosen or cut > chosen[-1]):
+            chosen.append(cut)
+    bounds = [top] + chosen + [bottom]
+    return [(left, y0, right, y1) for y0, y1 in zip(bounds, bounds[1:]) if y1 > y0]
+
+
+def layout_regions(image, max_tile_pixels: int = MAX_TILE_PIXELS, max_tiles: int = MAX_TILES) -> List[Box]:
+    """
+    Zones de lecture d'un CV (chemin ou image Pillow), dans l'ordre de lecture,
+    en pixels de l'image d'origine. [] si Pillow est absent ou la page est vide.
+    """
+    if Image is None:
+        return []
+    im = image if not isinstance(image, (str, Path)) else Image.open(image)
+    full_width, full_height = im.size
+    scale = min(1.0, ANALYSIS_WIDTH / full_width)
+    gray = im.convert("L")
+    if scale < 1.0:
+        gray = gray.resize((max(1, int(full_width * scale)), max(1, int(full_height * scale))), Image.BOX)
+    bw = gray.point(lambda p: 255 if p < INK_LEVEL else 0)
+    width, height = bw.size
+
+    regions = []
+    for (_, top, _, bottom), gutters in _sections(bw):
+        xs = [0] + gutters + [width]
+        columns = []
+        for x0, x1 in zip(xs, xs[1:]):
+            column_profile = _profile(bw, (x0, top, x1, bottom), "x")
+            extent = _content_extent(column_profile)
+            if extent is not None:
+                columns.append((x0 + extent[0], top, x0 + extent[1], bottom))
+        for box in _absorb_slivers(columns):
+            # Hauteur maximale d'une zone pour rester sous max_tile_pixels en pleine résolution
+            column_width = (box[2] - box[0]) / scale
+            max_height = int(max_tile_pixels / max(column_width, 1) * scale)
+            regions.extend(_split_column(bw, box, max(max_height, 1)))
+
+    if len(regions) > max_tiles:
+        # Trop de petites zones : recoller les voisines d'une même colonne
+        regions = _merge_regions(regions, max_tiles)
+
+    result = []
+    for left, top, right, bottom in regions:
+        result.append((
+            max(0, int((left - PADDING) / scale)),
+            max(0, int((top - PADDING) / scale)),
+            min(full_width, int((right + PADDING) / scale) + 1),
+            min(full_height, int((bottom + PADDING) / scale) + 1),
+        ))
+    return result
+
+
+def _absorb_slivers(columns: List[Box]) -> List[Box]:
+    """Rattacher les colonnes trop étroites (filets verticaux...) à la voisine la plus proche"""
+    if len(columns) < 2:
+        return columns
+    min_width = (columns[-1][2] - columns[0][0]) * MIN_COLUMN
+    columns = list(columns)
+    i = 0
+    while len(columns) > 1 and i < len(columns):
+        left, top, right, bottom = columns[i]
+        if right - left >= min_width:
+            i += 1
+            continue
+        gaps = []
+        if i > 0:
+            gaps.append((left - columns[i - 1][2], i - 1))
+        if i + 1 < len(columns):
+            gaps.append((columns[i + 1][0] - right, i + 1))
+        j = min(gaps)[1]
+        neighbour = columns[j]
+        columns[j] = (min(left, neighbour[0]), top, max(right, neighbour[2]), bottom)
+        del columns[i]
+        i = 0
+    return columns
+
+
+def _merge_regions(regions: List[Box], max_tiles: int) -> List[Box]:
+    regions = list(regions)
+    while len(regions) > max_tiles:
+        best = None
+        for i, (a, b) in enumerate(zip(regions, regions[1:])):
+            if a[0] == b[0] and a[2] == b[2] and a[3] <= b[1]:
+                area = (b[3] - a[1]) * (a[2] - a[0])
+                if best is None or area < best[0]:
+                    best = (area, i)
+        if best is None:
+            break
+        i = best[1]
+        a, b = regions[i], regions[i + 1]
+        regions[i:i + 2] = [(a[0], a[1], a[2], b[3])]
+    return regions
+
+
+def crop_regions(image, boxes: Sequence[Box], quality: int = 90) -> List[bytes]:
+    """Zones découpées, encodées en JPEG"""
+    im = image if not isinstance(image, (str, Path)) else Image.open(image)
+    rgb = im.convert("RGB")
+    crops = []
+    for box in boxes:
+        buf = io.BytesIO()
+        rgb.crop(box).save(buf, "JPEG", quality=quality)
+        crops.append(buf.getvalue())
+    return crops
+
+
+def split_layout(path, max_tile_pixels: int = MAX_TILE_PIXELS, max_tiles: int = MAX_TILES) -> List[bytes]:
+    """Zones JPEG d'un CV (chemin ou octets) dans l'ordre de lecture ([] sans Pillow)"""
+    if Image is None:
+        return []
+    with Image.open(io.BytesIO(path) if isinstance(path, (bytes, bytearray)) else path) as im:
+        boxes = layout_regions(im, max_tile_pixels, max_tiles)
+        return crop_regions(im, boxes) if boxes else []
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Zones de lecture d'un CV")
+    parser.add_argument("image")
+    parser.add_argument("--max-tile-pixels", type=int, default=MAX_TILE_PIXELS)
+    parser.add_argument("--save", action="store_true", help="écrire les zones en JPEG")
+    args = parser.parse_args()
+
+    if Image is None:
+        print("❌ Pillow requis: pip install Pillow")
+        return
+    with Image.open(args.image) as im:
+        boxes = layout_regions(im, args.max_tile_pixels)
+        print(f"🧩 {len(boxes)} zone(s) pour {args.image} ({im.size[0]}x{im.size[1]})")
+        for i, box in enumerate(boxes, 1):
+            print(f"  {i}. {box}")
+        if args.save:
+            stem = Path(args.image).with_suffix("")
+            for i, data in enumerate(crop_regions(im, boxes), 1):
+                Path(f"{stem}_zone_{i}.jpg").write_bytes(data)
+            print("💾 Zones sauvegardées")
+
+
+if __name__ == "__main__":
+    main()
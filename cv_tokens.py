@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+🧮 BUDGET DE TOKENS DES PROMPTS
+
+Estimation locale (sans tokenizer) des tokens d'entrée, y compris ceux
+de l'image d'après sa résolution, et assemblage du prompt dans la
+fenêtre de contexte du modèle :
+- le CV et l'offre sont raccourcis seulement si nécessaire, en partageant
+  équitablement la place disponible (une offre courte reste entière)
+- max_tokens / num_predict est dérivé de la taille du JSON attendu,
+  pour ne pas tronquer la réponse ni laisser le modèle dériver
+
+Les estimations sont volontairement un peu pessimistes (≈ 3,5 caractères
+par token pour du français, tokens image Qwen2-VL = une vignette de 28×28 px).
+"""
+import math
+import re
+from typing import Dict, NamedTuple, Optional
+
+from cv_capabilities import DEFAULT_CONTEXT_LENGTH, ModelCapabilities
+from cv_image import image_info, image_size_from_bytes
+
+_WORD_RE = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+# Qwen2-VL : patchs de 14 px fusionnés 2×2 -> un token par carré de 28 px
+IMAGE_PATCH = 28
+IMAGE_MIN_PIXELS = 4 * 28 * 28
+IMAGE_MAX_PIXELS = 16384 * 28 * 28
+
+# Taille attendue du texte OCR d'une page de CV dense (max_tokens historique de l'OCR)
+OCR_TOKENS_PER_PAGE = 2000
+
+# Budget de tokens par champ du JSON d'analyse RH
+ANALYSIS_FIELD_BUDGETS = {
+    "nom_prenom": 12,
+    "score_technique": 3,
+    "score_experience": 3,
+    "score_formation": 3,
+    "score_soft_skills": 3,
+    "score_global": 3,
+    "points_forts": 90,
+    "points_faibles": 70,
+    "competences_matchees": 60,
+    "competences_manquantes": 50,
+    "experience_pertinente": 90,
+    "recommandation": 8,
+    "commentaires": 130,
+    "methode_analyse": 8,
+}
+
+# Tokens réservés pour les écarts d'estimation et le gabarit de chat
+SAFETY_TOKENS = 64
+
+
+def estimate_tokens(text: str) -> int:
+    """Tokens estimés d'un texte : ~3,5 caractères par token de mot, 1 par ponctuation"""
+    if not text:
+        return 0
+    tokens = 0
+    for piece in _WORD_RE.findall(text):
+        tokens += math.ceil(len(piece) / 3.5) if piece[0].isalnum() or piece[0] == "_" else 1
+    # Les retours à la ligne comptent aussi
+    return tokens + text.count("\n") // 2
+
+
+def estimate_image_tokens(width: int, height: int, pages: int = 1,
+                          max_pixels: int = IMAGE_MAX_PIXELS) -> int:
+    """Tokens vision d'une image (redimensionnement façon Qwen2-VL)"""
+    if width <= 0 or height <= 0:
+        # Dimensions inconnues : page A4 à 150 dpi
+        width, height = 1240, 1754
+    pixels = width * height
+    scale = 1.0
+    if pixels > max_pixels:
+        scale = math.sqrt(max_pixels / pixels)
+    elif pixels < IMAGE_MIN_PIXELS:
+        scale = math.sqrt(IMAGE_MIN_PIXELS / pixels)
+    cols = max(1, round(width * scale / IMAGE_PATCH))
+    rows = max(1, round(height * scale / IMAGE_PATCH))
+    # +2 : marqueurs de début et fin d'image
+    return (cols * rows + 2) * pages
+
+
+def image_tokens_for(source) -> int:
+    """Tokens vision d'une image donnée par son chemin ou ses octets"""
+    try:
+        if isinstance(source, (bytes, bytearray)):
+            width, height = image_size_from_bytes(bytes(source[:256 * 1024])) or (0, 0)
+            return estimate_image_tokens(width, height)
+        info = image_info(source)
+        return estimate_image_tokens(info.width, info.height, info.pages)
+    except OSError:
+        return estimate_image_tokens(0, 0)
+
+
+def schema_output_tokens(field_budgets: Dict[str, int], margin: float = 1.25) -> int:
+    """Tokens de sortie pour un JSON à plat : clés, valeurs et ponctuation, avec marge"""
+    total = 2
+    for key, budget in field_budgets.items():
+        total += estimate_tokens(f'"{key}": ,') + budget
+    return int(total * margin)
+
+
+ANALYSIS_OUTPUT_TOKENS = schema_output_tokens(ANALYSIS_FIELD_BUDGETS)
+
+
+def truncate_to_tokens(text: str, budget: int) -> str:
+    """Raccourcir un texte à `budget` tokens estimés, en coupant sur une fin de ligne ou un mot"""
+    if budget <= 0:
+        return ""
+    tokens = estimate_tokens(text)
+    if tokens <= budget:
+        return text
+    cut = int(len(text) * budget / tokens)
+    while cut > 0 and estimate_tokens(text[:cut]) > budget:
+        cut = int(cut * 0.95)
+    boundary = max(text.rfind("\n", 0, cut), text.rfind(" ", 0, cut))
+    if boundary > cut * 0.8:
+        cut = boundary
+    return text[:cut].rstrip()
+
+
+class AssembledPrompt(NamedTuple):
+    prompt: str
+    max_tokens: int
+    prompt_tokens: int
+    truncated: Dict[str, int]
+
+    @property
+    def context_tokens(self) -> int:
+        """Contexte nécessaire (prompt + sortie), ex: num_ctx d'Ollama"""
+        return self.prompt_tokens + self.max_tokens
+
+
+# Part minimale d'une partie raccourcie (jamais vidée : une offre vide fausse toute l'analyse)
+MIN_PART_RATIO = 0.1
+MIN_PART_TOKENS = 64
+
+
+class PromptAssembler:
+    def __init__(self, caps: Optional[ModelCapabilities] = None, context_length: Optional[int] = None,
+                 min_output_ratio: float = 0.5):
+        """
+        caps             : capacités du modèle (cf. cv_capabilities.py)
+        context_length   : fenêtre imposée (sinon celle du modèle, sinon 4096)
+        min_output_ratio : part minimale de la sortie attendue conservée si le contexte est trop petit
+        Contexte inconnu (ni fenêtre imposée ni contexte déclaré par le serveur) : ni le prompt
+        ni la sortie ne sont réduits pour tenir dans les 4096 tokens supposés.
+        """
+        self.caps = caps
+        self.context_known = bool(context_length) or (caps is not None and caps.context_known)
+        self.context_length = context_length or (caps.context_length if caps else DEFAULT_CONTEXT_LENGTH)
+        self.max_output = caps.max_output_tokens if caps else self.context_length // 2
+        self.min_output_ratio = min_output_ratio
+
+    def output_budget(self, expected_output: int, prompt_tokens: int) -> int:
+        """max_tokens : sortie attendue, bornée par le modèle et la place restante (contexte connu)"""
+        if not self.context_known:
+            return max(1, min(expected_output, self.max_output))
+        room = self.context_length - prompt_tokens - SAFETY_TOKENS
+        return max(1, min(expected_output, self.max_output, room))
+
+    def fit(self, template: str, parts: Dict[str, str], expected_output: int,
+            image_tokens: int = 0) -> AssembledPrompt:
+        """
+        Remplir `template` (syntaxe str.format) avec `parts` en respectant le contexte.
+        Les parties trop longues sont raccourcies par partage équitable de la place,
+        sans descendre sous MIN_PART_RATIO de leur taille (au moins MIN_PART_TOKENS).
+        """
+        fixed = estimate_tokens(template.format(**{k: "" for k in parts})) + image_tokens
+        output = min(expected_output, self.max_output)
+        if not self.context_known:
+            prompt = template.format(**parts)
+            prompt_tokens = estimate_tokens(prompt) + image_tokens
+            return AssembledPrompt(prompt, self.output_budget(output, prompt_tokens), prompt_tokens, {})
+        available = self.context_length - fixed - output - SAFETY_TOKENS
+        min_output = int(output * self.min_output_ratio)
+        if available < 0 and output > min_output:
+            # Contexte trop petit : on sacrifie une partie de la sortie, pas tout le CV
+            output = max(min_output, output + available)
+            available = self.context_length - fixed - output - SAFETY_TOKENS
+        available = max(0, available)
+
+        needs = {k: estimate_tokens(v) for k, v in parts.items()}
+        fitted = dict(parts)
+        truncated = {}
+        if sum(needs.values()) > available:
+            # Partage max-min : les petites parties gardent tout, les grosses se partagent le reste
+            remaining = available
+            pending = sorted(needs, key=needs.get)
+            while pending:
+                key = pending.pop(0)
+                share = remaining // (len(pending) + 1)
+                floor = min(needs[key], max(MIN_PART_TOKENS, int(needs[key] * MIN_PART_RATIO)))
+                budget = min(needs[key], max(share, floor))
+                if budget < needs[key]:
+                    fitted[key] = truncate_to_tokens(parts[key], budget)
+                    truncated[key] = needs[key] - estimate_tokens(fitted[key])
+                remaining -= estimate_tokens(fitted[key])
+
+        prompt = template.format(**fitted)
+        prompt_tokens = estimate_tokens(prompt) + image_tokens
+        return AssembledPrompt(prompt, self.output_budget(output, prompt_tokens), prompt_tokens, truncated)
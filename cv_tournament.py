@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+🥊 TOURNOI DES MEILLEURS CANDIDATS
+
+Les score_global obtenus par des appels indépendants sont bruités et mal
+calibrés d'un CV à l'autre : un 78 et un 74 ne sont pas forcément dans le
+bon ordre. Les RH finissent par comparer les CV deux à deux, ce qui
+coûterait N(N-1)/2 appels au modèle si on le faisait naïvement.
+
+Le tournoi affine l'ordre des K premiers candidats d'une offre par des
+comparaisons deux à deux (« lequel des deux CV est le meilleur pour ce
+poste ? »), sur le texte OCR déjà en journal (aucun appel vision) :
+
+- les candidats partent dans l'ordre de leurs scores
+- les K premiers sont triés par fusion : les fusions d'un même niveau
+  tournent en parallèle (~K log2 K comparaisons)
+- chaque candidat suivant défie le K-ième du classement (défis en
+  parallèle, par vagues) ; un vainqueur est inséré par dichotomie
+  (~log2 K comparaisons), le dernier sort du classement
+
+Soit au plus ~N log2 K appels, et ~N quand les scores sont déjà à peu près
+dans le bon ordre. Une comparaison n'est jamais posée deux fois ; une
+réponse illisible (ou incohérente avec --both-orders) laisse l'ordre des
+scores départager.
+
+Les CV sans texte OCR (analyse one-shot) ne sont pas comparés : relancer le
+lot en two-step pour les inclure.
+
+Usage:
+python cv_tournament.py "Développeur Python Junior" --journal cv_batch_journal.jsonl --top 10
+python cv_tournament.py "Développeur Python Junior" --top 5 --both-orders --output cv_tournament.csv
+"""
+import argparse
+import csv
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from cv_journal import ANALYSIS_DONE, text_sha256
+from cv_report import CSV_FIELDS, SCORE_KEYS, summarize
+from cv_salvage import repair_json
+from cv_tokens import PromptAssembler
+
+COMPARISON_OUTPUT_TOKENS = 60
+
+COMPARISON_PROMPT = """Vous êtes un expert RH très exigeant.
+Comparez les deux candidats ci-dessous pour ce poste et désignez le meilleur.
+Ignorez l'ordre de présentation : seule l'adéquation au poste compte.
+Répondez UNIQUEMENT par un objet JSON :
+{{"meilleur": "A ou B", "raison": "une phrase"}}
+
+POSTE: {job_offer}
+
+CANDIDAT A:
+{cv_a}
+
+CANDIDAT B:
+{cv_b}
+"""
+
+
+class Candidate(NamedTuple):
+    key: str            # clé du journal
+    text: str           # texte OCR du CV
+    row: dict           # ligne du classement (cf. cv_report.summarize)
+    seed: int           # rang d'après les scores (0 = premier)
+
+
+def load_candidates(journal, offer: str) -> Tuple[List[Candidate], List[dict]]:
+    """
+    Candidats analysés pour une offre, dans l'ordre des scores :
+    (candidats comparables, lignes des CV sans texte OCR)
+    """
+    offer_sha256 = text_sha256(offer)
+    rows, seen = [], set()
+    for entry in journal.entries(ANALYSIS_DONE):
+        if entry.get("offer_sha256") != offer_sha256 or not entry.get("analysis"):
+            continue
+        # Même image sous deux noms : un seul candidat
+        if entry.get("image_sha256") in seen:
+            continue
+        seen.add(entry.get("image_sha256"))
+        text = entry.get("ocr_text") or journal.find_ocr_text(entry.get("image_sha256", ""))
+        rows.append((summarize(entry.get("path", "?"), entry["analysis"], mode=entry.get("mode", "")),
+                     entry["key"], text))
+    rows.sort(key=lambda r: tuple(r[0][k] for k in SCORE_KEYS), reverse=True)
+    candidates = [Candidate(key, text, row, seed) for seed, (row, key, text) in
+                  enumerate(r for r in rows if r[2])]
+    return candidates, [row for row, _, text in rows if not text]
+
+
+class Tournament:
+    def __init__(self, complete: Callable[[str], Optional[str]], job_offer: str,
+                 workers: int = 4, both_orders: bool = False, assembler: Optional[PromptAssembler] = None):
+        """
+        Classement par comparaisons deux à deux
+        complete    : appel texte au modèle (cf. cv_offer.completion_for)
+        job_offer   : offre telle qu'envoyée au modèle (profil compilé ou offre brute)
+        workers     : comparaisons simultanées
+        both_orders : poser chaque comparaison dans les deux ordres (biais de position, 2x appels)
+        assembler   : budget de prompt du modèle appelé (cf. cv_offer.assembler_for), défaut : 4096 tokens
+        """
+        self.complete = complete
+        self.job_offer = job_offer
+        self.workers = max(1, workers)
+        self.both_orders = both_orders
+        self.assembler = assembler or PromptAssembler()
+        self._winners: Dict[Tuple[str, str], str] = {}
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "comparisons": 0, "reused": 0, "undecided": 0}
+
+    def _count(self, name: str, n: int = 1):
+        with self._lock:
+            self.stats[name] += n
+
+    def _ask(self, a: Candidate, b: Candidate) -> Optional[str]:
+        """"A", "B" ou None (réponse absente ou illisible)"""
+        assembled = self.assembler.fit(
+            COMPARISON_PROMPT, {"job_offer": self.job_offer, "cv_a": a.text, "cv_b": b.text},
+            expected_output=COMPARISON_OUTPUT_TOKENS
+        )
+        self._count("calls")
+        repaired = repair_json(self.complete(assembled.prompt))
+        choice = str(repaired[0].get("meilleur", "")).strip().upper()[:1] if repaired else ""
+        return choice if choice in ("A", "B") else None
+
+    def beats(self, a: Candidate, b: Candidate) -> bool:
+        """True si `a` est jugé meilleur que `b` pour le poste"""
+        pair = tuple(sorted((a.key, b.key)))
+        with self._lock:
+            winner = self._winners.get(pair)
+        if winner:
+            self._count("reused")
+            return winner == a.key
+
+        first = self._ask(a, b)
+        decided = {"A": a.key, "B": b.key}.get(first)
+        if self.both_orders and decided:
+            second = {"A": b.key, "B": a.key}.get(self._ask(b, a))
+            decided = decided if second == decided else None
+        self._count("comparisons")
+        if not decided:
+            # Pas d'avis exploitable : l'ordre des scores départage
+            self._count("undecided")
+            decided = a.key if a.seed < b.seed else b.key
+        with self._lock:
+            self._winners[pair] = decided
+        return decided == a.key
+
+    def _merge(self, runs: Tuple[List[Candidate], List[Candidate]]) -> List[Candidate]:
+        left, right = runs
+        merged = []
+        while left and right:
+            merged.append(right.pop(0) if self.beats(right[0], left[0]) else left.pop(0))
+        return merged + left + right
+
+    def _sort(self, candidates: List[Candidate], pool: ThreadPoolExecutor) -> List[Candidate]:
+        """Tri par fusion ascendant : les fusions d'un même niveau sont indépendantes"""
+        runs = [[c] for c in candidates]
+        while len(runs) > 1:
+            pairs = [(runs[i], runs[i + 1]) for i in range(0, len(runs) - 1, 2)]
+            odd = [runs[-1]] if len(runs) % 2 else []
+            runs = list(pool.map(self._merge, pairs)) + odd
+        return runs[0] if runs else []
+
+    def _insert(self, ranked: List[Candidate], challenger: Candidate, k: int):
+        """Insertion par dichotomie, le classement reste limité à K"""
+        lo, hi = 0, len(ranked)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.beats(challenger, ranked[mid]):
+                hi = mid
+            else:
+                lo = mid + 1
+        if lo < k:
+            ranked.insert(lo, challenger)
+            del ranked[k:]
+
+    def rank(self, candidates: List[Candidate], k: int) -> List[Candidate]:
+        """Les K meilleurs candidats, du premier au K-ième (candidats dans l'ordre des scores)"""
+        k = max(1, k)
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            ranked = self._sort(candidates[:k], pool)
+            rest = candidates[k:]
+            for start in range(0, len(rest), self.workers):
+                wave = rest[start:start + self.workers]
+                # Le K-ième ne fait que monter : le battre est nécessaire, la dichotomie tranche
+                threshold = ranked[-1]
+                for challenger, won in zip(wave, pool.map(lambda c: self.beats(c, threshold), wave)):
+                    if won:
+                        self._insert(ranked, challenger, k)
+        return ranked
+
+    def summary(self, n: int, k: int) -> str:
+        s = self.stats
+        bound = n * max(1, math.ceil(math.log2(max(2, min(n, k)))))
+        return (f"{s['calls']} appels au modèle pour {n} candidats, top {min(n, k)} "
+                f"({s['comparisons']} comparaisons, {s['reused']} reprises, {s['undecided']} sans avis ; "
+                f"borne ~N log2 K = {bound}, exhaustif N(N-1)/2 = {n * (n - 1) // 2})")
+
+
+def render(ranked: List[Candidate]) -> str:
+    lines = [f"🥊 Classement du tournoi ({len(ranked)} candidats)"]
+    for rank, c in enumerate(ranked, 1):
+        moved = c.seed + 1 - rank
+        arrow = f"↑{moved}" if moved > 0 else f"↓{-moved}" if moved < 0 else "="
+        lines.append(f"{rank:>3}. {arrow:>3}  {c.row['score_global']:>5.0f}/100  {str(c.row['nom_prenom'])[:28]:<28} "
+                     f"{c.row['recommandation']}  ({Path(c.row['fichier']).name})")
+    return "\n".join(lines)
+
+
+def write_csv(path: str, ranked: List[Candidate]):
+    with open(path, "w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.DictWriter(f, fieldnames=("rang", "rang_scores") + CSV_FIELDS)
+        writer.writeheader()
+        for rank, c in enumerate(ranked, 1):
+            writer.writerow({"rang": rank, "rang_scores": c.seed + 1, **c.row})
+
+
+def main():
+    from cv_batch import build_analyzer
+    from cv_journal import CheckpointJournal
+    from cv_offer import DEFAULT_CACHE as OFFER_CACHE, OfferCompiler, assembler_for, completion_for
+
+    parser = argparse.ArgumentParser(description="Classement des meilleurs candidats par comparaisons deux à deux")
+    parser.add_argument("offer", help="offre d'emploi du lot")
+    parser.add_argument("--journal", default="cv_batch_journal.jsonl")
+    parser.add_argument("--top", type=int, default=10, help="taille du classement affiné (K)")
+    parser.add_argument("--workers", type=int, default=4, help="comparaisons simultanées")
+    parser.add_argument("--mode", choices=("two-step", "oneshot", "ollama"), default="two-step",
+                        help="serveur du modèle texte (celui de l'analyse RH en two-step)")
+    parser.add_argument("--base-url", default=os.environ.get("CV_BASE_URL"))
+    parser.add_argument("--both-orders", action="store_true",
+                        help="poser chaque comparaison dans les deux ordres (contre le biais de position)")
+    parser.add_argument("--raw-offer", action="store_true", help="offre brute (si le lot l'a utilisée)")
+    parser.add_argument("--offer-cache", default=OFFER_CACHE)
+    parser.add_argument("--output", help="CSV du classement (rang, rang d'après les scores, colonnes du rapport)")
+    args = parser.parse_args()
+
+    with CheckpointJournal(args.journal) as journal:
+        candidates, without_text = load_candidates(journal, args.offer)
+    if without_text:
+        print(f"⚠️ {len(without_text)} CV sans texte OCR non comparés (analyse one-shot) : relancer en two-step")
+    if len(candidates) < 2:
+        print(f"❌ Moins de deux candidats comparables pour cette offre (journal {args.journal})")
+        return
+
+    analyzer = build_analyzer(args.mode, base_url=args.base_url)
+    if not analyzer.check_connection():
+        return
+    prompt_offer = args.offer if args.raw_offer else OfferCompiler(
+        completion_for(analyzer), args.offer_cache).prompt_text(args.offer)
+    tournament = Tournament(completion_for(analyzer, label="Comparaison", max_tokens=COMPARISON_OUTPUT_TOKENS),
+                            prompt_offer, workers=args.workers, both_orders=args.both_orders,
+                            assembler=assembler_for(analyzer))
+
+    start = time.time()
+    ranked = tournament.rank(candidates, args.top)
+    print(render(ranked))
+    print(f"📞 {tournament.summary(len(candidates), args.top)} en {time.time() - start:.1f}s")
+    if args.output:
+        write_csv(args.output, ranked)
+        print(f"💾 Classement: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,421 @@
+#!/usr/bin/env python3
+"""
+🎛️ RÉGLAGES DE GÉNÉRATION ET AUTO-RÉGLAGE LATENCE / PRÉCISION
+
+Température, top_p, plafond de sortie, coupe du texte et résolution de
+l'image envoyée ont été choisis à la main. Ce module :
+
+- regroupe ces réglages dans un profil (GenerationProfile) chargé par les
+  analyseurs ; sans profil, les valeurs historiques restent en place
+- balaie une grille de réglages sur un petit jeu de CV de référence
+  (serveur local, ou proxy d'enregistrement cv_cassette.py en mode auto
+  pour rejouer les mesures), en mesurant latence, tokens générés et
+  accord avec les scores et champs attendus
+- garde les réglages Pareto-optimaux (aucun autre n'est à la fois plus
+  rapide et plus fidèle) et écrit un fichier de profils, un par mode
+
+Accord avec la référence (0 à 1) : écart de chaque score rapporté à son
+barème, nom et recommandation identiques (casse et accents ignorés).
+Sans fichier de référence, le réglage le plus soigné (pleine résolution,
+température 0) sert de référence et est enregistré : à relire et
+corriger à la main avant les balayages suivants.
+
+Seules les images sont envoyées aux analyseurs : un PDF (test.pdf) doit
+d'abord être converti en image.
+
+Usage:
+python cv_tuning.py test.jpg "Développeur Python Junior" --mode oneshot --reference refs.json
+python cv_tuning.py cvs/ "Développeur Python Junior" --grid "image_pixels=none,1000000,500000;temperature=0,0.1"
+python cv_batch.py cvs/ "Développeur Python Junior" --mode oneshot --profile cv_tuning_profile.json
+"""
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import random
+import statistics
+import time
+import unicodedata
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional
+
+from cv_cascade import SCORE_LIMITS
+from cv_image import Image, downscale_image
+from cv_salvage import PARTIAL_KEY, TRUNCATED, recover_analysis
+from cv_tokens import estimate_tokens
+
+DEFAULT_PROFILE_PATH = "cv_tuning_profile.json"
+# Perte d'accord acceptée pour le profil retenu, par rapport au plus fidèle
+DEFAULT_TOLERANCE = 0.05
+DEFAULT_MAX_CONFIGS = 24
+MATCHED_FIELDS = ("nom_prenom", "recommandation")
+
+
+class GenerationProfile(NamedTuple):
+    """Réglages de génération d'un analyseur (défauts : valeurs historiques)"""
+    # Image réduite à ce nombre de pixels avant envoi (None = pleine résolution en one-shot ;
+    # two-step : première passe OCR, relue en pleine résolution si elle est mauvaise,
+    # None = réglage de l'analyseur)
+    image_pixels: Optional[int] = None
+    # Analyse RH (two-step) et appel one-shot
+    temperature: float = 0.1
+    top_p: float = 0.9
+    # Plafond de la sortie JSON (None = taille du JSON attendu)
+    max_tokens: Optional[int] = None
+    # Coupe du texte OCR et de l'offre avant ajustement au contexte (None = texte entier)
+    cv_chars: Optional[int] = None
+    offer_chars: Optional[int] = None
+    # Passe OCR du two-step
+    ocr_temperature: float = 0.05
+    ocr_top_p: float = 0.8
+
+    def output_tokens(self, expected: int) -> int:
+        return min(expected, self.max_tokens) if self.max_tokens else expected
+
+    def clip_cv(self, text: str) -> str:
+        return text[:self.cv_chars] if self.cv_chars else text
+
+    def clip_offer(self, text: str) -> str:
+        return text[:self.offer_chars] if self.offer_chars else text
+
+    def image(self, source):
+        """Image à envoyer : réduite si image_pixels le demande, sinon la source telle quelle"""
+        if not self.image_pixels:
+            return source
+        try:
+            return downscale_image(source, self.image_pixels) or source
+        except Exception as e:
+            print(f"⚠️ Réduction impossible ({e}), image envoyée telle quelle")
+            return source
+
+    def changes(self) -> Dict[str, object]:
+        """Réglages différents des valeurs historiques"""
+        return {name: value for name, value in self._asdict().items() if value != self._field_defaults[name]}
+
+    def label(self) -> str:
+        changes = self.changes()
+        return " ".join(f"{name}={value}" for name, value in changes.items()) or "historique"
+
+
+DEFAULT_PROFILE = GenerationProfile()
+
+# Grilles balayées par défaut
+DEFAULT_GRID = {
+    "image_pixels": [None, 1_500_000, 1_000_000, 500_000],
+    "temperature": [0.0, 0.1],
+    "max_tokens": [None, 600],
+}
+TWO_STEP_GRID = {
+    **DEFAULT_GRID,
+    "cv_chars": [None, 1500],
+}
+
+
+def load_profile(path: Optional[str], mode: str, min_agreement: Optional[float] = None) -> Optional[GenerationProfile]:
+    """
+    Profil d'un mode dans un fichier écrit par le balayage, None si absent
+    min_agreement : réglage Pareto le plus rapide atteignant cet accord
+                    (défaut : profil retenu lors du balayage)
+    """
+    if not path:
+        return None
+    try:
+        data = json.loads(Path(path).read_text(encoding='utf-8'))
+    except (OSError, ValueError) as e:
+        print(f"⚠️ Profil illisible {path}: {e}")
+        return None
+    entry = data.get(mode)
+    if not entry:
+        return None
+    params = entry.get("profil", {})
+    if min_agreement is not None:
+        eligible = [point for point in entry.get("pareto", []) if point["accord"] >= min_agreement]
+        if eligible:
+            params = min(eligible, key=lambda point: point["latence_s"])["params"]
+    known = {k: v for k, v in params.items() if k in GenerationProfile._fields}
+    return GenerationProfile(**known)
+
+
+# ---------------------- Accord avec la référence ----------------------
+def _normalize(value) -> str:
+    text = unicodedata.normalize("NFKD", str(value or "")).casefold()
+    return " ".join("".join(c for c in text if not unicodedata.combining(c)).split())
+
+
+def agreement(analysis: Optional[dict], reference: dict) -> float:
+    """
+    Accord (0 à 1) d'une analyse avec les scores et champs attendus ; 0 si pas d'analyse.
+    Chaque champ tronqué (sortie trop courte) compte comme un désaccord.
+    """
+    if not analysis:
+        return 0.0
+    partial = analysis.get(PARTIAL_KEY, {})
+    parts = [0.0 for how in partial.values() if how == TRUNCATED]
+    for name, limit in SCORE_LIMITS.items():
+        if name not in reference:
+            continue
+        value = analysis.get(name)
+        if isinstance(value, (int, float)):
+            parts.append(max(0.0, 1 - abs(value - reference[name]) / limit))
+        else:
+            parts.append(0.0)
+    for name in MATCHED_FIELDS:
+        if name in reference:
+            parts.append(1.0 if _normalize(analysis.get(name)) == _normalize(reference[name]) else 0.0)
+    return sum(parts) / len(parts) if parts else 0.0
+
+
+def pareto_front(points: List[dict]) -> List[dict]:
+    """Points non dominés (latence plus faible, accord plus élevé), par latence croissante"""
+    front = []
+    for point in sorted(points, key=lambda p: (p["latence_s"], -p["accord"])):
+        if not front or point["accord"] > front[-1]["accord"]:
+            front.append(point)
+    return front
+
+
+def choose(front: List[dict], tolerance: float = DEFAULT_TOLERANCE) -> dict:
+    """Le plus rapide des réglages à moins de `tolerance` de l'accord maximal"""
+    best = max(point["accord"] for point in front)
+    return min((point for point in front if point["accord"] >= best - tolerance), key=lambda p: p["latence_s"])
+
+
+# ---------------------- Balayage ----------------------
+def parse_grid(spec: Optional[str], mode: str) -> Dict[str, list]:
+    """Grille "nom=v1,v2;nom2=v3" (none = valeur absente), sinon grille par défaut du mode"""
+    if not spec:
+        grid = dict(TWO_STEP_GRID if mode == "two-step" else DEFAULT_GRID)
+    else:
+        grid = {}
+        for part in spec.split(";"):
+            if not part.strip():
+                continue
+            name, _, values = part.partition("=")
+            name = name.strip()
+            if name not in GenerationProfile._fields:
+                raise ValueError(f"Réglage inconnu: {name} ({', '.join(GenerationProfile._fields)})")
+            grid[name] = [_parse_value(v) for v in values.split(",") if v.strip()]
+    if Image is None and "image_pixels" in grid:
+        print("⚠️ Pillow absent : image_pixels retiré de la grille (images envoyées telles quelles)")
+        del grid["image_pixels"]
+    return grid
+
+
+def _parse_value(text: str):
+    text = text.strip().lower()
+    if text in ("none", "auto", ""):
+        return None
+    number = float(text)
+    return int(number) if number.is_integer() and "." not in text else number
+
+
+def candidate_profiles(grid: Dict[str, list], max_configs: int = DEFAULT_MAX_CONFIGS,
+                       seed: int = 0) -> List[GenerationProfile]:
+    """Combinaisons de la grille (tirées au hasard au-delà de max_configs), profil historique en tête"""
+    names = list(grid)
+    profiles = [DEFAULT_PROFILE._replace(**dict(zip(names, values)))
+                for values in itertools.product(*(grid[n] for n in names))]
+    profiles = [p for p in dict.fromkeys(profiles) if p != DEFAULT_PROFILE]
+    if len(profiles) > max_configs - 1:
+        profiles = random.Random(seed).sample(profiles, max_configs - 1)
+    return [DEFAULT_PROFILE] + profiles
+
+
+class TuningCase(NamedTuple):
+    path: str
+    reference: Optional[dict]
+
+
+class Measure(NamedTuple):
+    latency: float
+    tokens: int
+    analysis: Optional[dict]
+
+
+def _analyze(analyzer, mode: str, path: str, job_offer: str) -> Measure:
+    """Un CV analysé avec un analyseur déjà configuré (latence, tokens générés estimés, analyse)"""
+    start = time.perf_counter()
+    if mode == "two-step":
+        text = analyzer.extract_cv_text(path)
+        raw = analyzer.analyze_cv_rh(text, job_offer) if text else None
+        generated = (text or "") + (raw or "")
+    elif mode == "oneshot":
+        raw = generated = analyzer.analyze_cv_oneshot(path, job_offer)
+    else:
+        raw = generated = analyzer.analyze_oneshot(path, job_offer)
+    latency = time.perf_counter() - start
+    # Pas de continuation : on mesure la réponse telle que produite par le réglage
+    return Measure(latency, estimate_tokens(generated or ""), recover_analysis(raw))
+
+
+class Tuner:
+    def __init__(self, mode: str, job_offer: str, cases: List[TuningCase], base_url: Optional[str] = None,
+                 repeat: int = 1, verbose: bool = False):
+        """
+        Balayage des réglages d'un mode sur un jeu de CV de référence
+        cases   : CV et réponses attendues (None = à établir avec reference_profile)
+        repeat  : passages par CV et par réglage (latence médiane)
+        verbose : messages des analyseurs (masqués par défaut)
+        """
+        self.mode = mode
+        self.job_offer = job_offer
+        self.cases = cases
+        self.base_url = base_url
+        self.repeat = max(1, repeat)
+        self.verbose = verbose
+
+    def _quiet(self):
+        return contextlib.nullcontext() if self.verbose else contextlib.redirect_stdout(io.StringIO())
+
+    def _analyzer(self, profile: GenerationProfile):
+        from cv_batch import build_analyzer
+
+        analyzer = build_analyzer(self.mode, base_url=self.base_url, profile=profile)
+        with self._quiet():
+            connected = analyzer.check_connection()
+        if not connected:
+            raise RuntimeError(f"Serveur modèle indisponible pour le mode {self.mode}")
+        return analyzer
+
+    def reference(self, profile: GenerationProfile) -> Dict[str, dict]:
+        """
+        Réponses du réglage `profile` comme référence (scores et champs comparés)
+        Seuls les CV sans référence sont analysés : les références fournies
+        (éventuellement corrigées à la main) sont gardées telles quelles.
+        Renvoie uniquement les références nouvellement établies.
+        """
+        analyzer = self._analyzer(profile)
+        references = {}
+        for case in self.cases:
+            if case.reference is not None:
+                continue
+            with self._quiet():
+                measure = _analyze(analyzer, self.mode, case.path, self.job_offer)
+            if measure.analysis:
+                references[case.path] = {name: measure.analysis[name]
+                                         for name in (*SCORE_LIMITS, *MATCHED_FIELDS) if name in measure.analysis}
+            else:
+                print(f"⚠️ Pas de référence pour {case.path} (analyse en échec)")
+        self.cases = [c if c.reference is not None else TuningCase(c.path, references[c.path])
+                      for c in self.cases if c.reference is not None or c.path in references]
+        return references
+
+    def measure(self, profile: GenerationProfile) -> dict:
+        """Latence médiane par CV, tokens générés par CV et accord moyen d'un réglage"""
+        analyzer = self._analyzer(profile)
+        latencies, tokens, scores, failed = [], [], [], 0
+        for case in self.cases:
+            for _ in range(self.repeat):
+                with self._quiet():
+                    measure = _analyze(analyzer, self.mode, case.path, self.job_offer)
+                latencies.append(measure.latency)
+                tokens.append(measure.tokens)
+                scores.append(agreement(measure.analysis, case.reference))
+                failed += measure.analysis is None
+        return {
+            "params": profile._asdict(),
+            "latence_s": round(statistics.median(latencies), 3),
+            "tokens": round(statistics.mean(tokens)),
+            "accord": round(statistics.mean(scores), 4),
+            "echecs": failed,
+        }
+
+    def sweep(self, profiles: List[GenerationProfile]) -> List[dict]:
+        points = []
+        print(f"{'#':>3} {'latence (s)':>11} {'tokens':>7} {'accord':>7} {'échecs':>7}  réglage")
+        for i, profile in enumerate(profiles, 1):
+            point = self.measure(profile)
+            points.append(point)
+            print(f"{i:>3} {point['latence_s']:>11.2f} {point['tokens']:>7} {point['accord']:>7.3f} "
+                  f"{point['echecs']:>7}  {profile.label()}")
+        return points
+
+
+def save_profiles(path: str, mode: str, front: List[dict], chosen: dict, cases: List[TuningCase]):
+    """Profil retenu et front de Pareto du mode, les autres modes du fichier sont conservés"""
+    p = Path(path)
+    try:
+        data = json.loads(p.read_text(encoding='utf-8')) if p.exists() else {}
+    except ValueError:
+        data = {}
+    data[mode] = {
+        "profil": chosen["params"],
+        "pareto": front,
+        "cv": [case.path for case in cases],
+        "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    p.write_text(json.dumps(data, indent=2, ensure_ascii=False), encoding='utf-8')
+
+
+def main():
+    from cv_batch import MODES, collect_images
+
+    parser = argparse.ArgumentParser(description="Auto-réglage latence / précision des analyseurs")
+    parser.add_argument("inputs", nargs="+", help="images ou dossiers de CV de référence, puis l'offre d'emploi")
+    parser.add_argument("--mode", choices=[m for m in MODES if m != "auto"], default="oneshot")
+    parser.add_argument("--base-url", help="serveur modèle (ou proxy cv_cassette.py)")
+    parser.add_argument("--reference", help="réponses attendues {fichier: {score_global, nom_prenom, ...}} ; "
+                                            "créé à partir du réglage le plus soigné s'il n'existe pas")
+    parser.add_argument("--grid", help='réglages balayés, ex. "image_pixels=none,1000000;temperature=0,0.1"')
+    parser.add_argument("--max-configs", type=int, default=DEFAULT_MAX_CONFIGS)
+    parser.add_argument("--repeat", type=int, default=1, help="passages par CV et par réglage")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="perte d'accord acceptée pour le profil retenu")
+    parser.add_argument("--output", default=DEFAULT_PROFILE_PATH, help="fichier de profils")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--verbose", action="store_true", help="messages des analyseurs")
+    args = parser.parse_args()
+
+    if len(args.inputs) < 2:
+        parser.error("il faut au moins une image/un dossier et l'offre d'emploi")
+    *inputs, job_offer = args.inputs
+    paths = []
+    for path in collect_images(inputs):
+        if path.lower().endswith(".pdf"):
+            print(f"⚠️ Ignoré (PDF : convertir en image d'abord): {path}")
+        else:
+            paths.append(path)
+    if not paths:
+        parser.error("aucune image de CV")
+
+    references = {}
+    if args.reference and Path(args.reference).exists():
+        references = json.loads(Path(args.reference).read_text(encoding='utf-8'))
+    cases = [TuningCase(path, references.get(path) or references.get(Path(path).name)) for path in paths]
+    tuner = Tuner(args.mode, job_offer, cases, base_url=args.base_url, repeat=args.repeat, verbose=args.verbose)
+    try:
+        grid = parse_grid(args.grid, args.mode)
+        if any(case.reference is None for case in cases):
+            print("📐 Référence établie avec le réglage le plus soigné (pleine résolution, température 0)")
+            established = tuner.reference(DEFAULT_PROFILE._replace(temperature=0.0, ocr_temperature=0.0))
+            references.update({Path(path).name: ref for path, ref in established.items()})
+            if args.reference:
+                Path(args.reference).write_text(json.dumps(references, indent=2, ensure_ascii=False), encoding='utf-8')
+                print(f"💾 Référence enregistrée (à relire): {args.reference}")
+        if not tuner.cases:
+            print("❌ Aucun CV de référence exploitable")
+            return
+        profiles = candidate_profiles(grid, args.max_configs, args.seed)
+        print(f"🎛️ {len(profiles)} réglages x {len(tuner.cases)} CV x {tuner.repeat} passage(s), mode {args.mode}")
+        points = tuner.sweep(profiles)
+    except (RuntimeError, ValueError) as e:
+        print(f"❌ {e}")
+        return
+
+    front = pareto_front(points)
+    chosen = choose(front, args.tolerance)
+    print(f"\n🏅 Front de Pareto ({len(front)} réglages):")
+    for point in front:
+        mark = "👉" if point is chosen else "  "
+        print(f" {mark} {point['latence_s']:>7.2f}s  accord {point['accord']:.3f}  {point['tokens']:>5} tokens  "
+              f"{GenerationProfile(**point['params']).label()}")
+    baseline = points[0]
+    print(f"🎯 Retenu: {chosen['latence_s']:.2f}s au lieu de {baseline['latence_s']:.2f}s (réglage historique), "
+          f"accord {chosen['accord']:.3f} au lieu de {baseline['accord']:.3f}")
+    save_profiles(args.output, args.mode, front, chosen, tuner.cases)
+    print(f"💾 Profils: {args.output} (cv_batch.py --profile {args.output})")
+
+
+if __name__ == "__main__":
+    main()
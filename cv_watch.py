@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+👀 SURVEILLANCE DE DOSSIERS DE CV (DÉMON)
+
+Surveille un ou plusieurs dossiers de dépôt et analyse automatiquement
+chaque nouveau CV (ou CV modifié) avec l'offre associée au dossier.
+
+- Manifeste JSON : chemin, taille, date de modification et empreinte
+  SHA-256 de chaque fichier déjà vu ; un fichier inchangé n'est même pas relu
+- Anti-rebond : un fichier n'est pris qu'après être resté identique
+  (taille + date) pendant `settle` secondes, pour ne pas lire une copie en cours
+- Traitement par BatchRunner (cv_batch.py) avec le journal de reprise :
+  après un redémarrage, rien de ce qui a déjà été noté n'est refait
+- Un CV en échec n'est retenté que s'il est modifié (ou retiré du manifeste)
+- L'offre de chaque dossier est compilée une fois en profil d'exigences (cv_offer.py)
+
+Configuration (cv_watch.json) :
+{
+  "interval": 5,
+  "settle": 3,
+  "folders": [
+    {"path": "inbox/python", "offer": "Développeur Python Junior"},
+    {"path": "inbox/data", "offer_file": "offres/data.txt", "mode": "oneshot"}
+  ]
+}
+Sans "offer" ni "offer_file", l'offre est lue dans le fichier offre.txt du dossier.
+
+Usage:
+python cv_watch.py --config cv_watch.json
+python cv_watch.py inbox/ "Développeur Python Junior"
+python cv_watch.py inbox/ "Développeur Python Junior" --once    # un seul passage
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional
+
+from cv_batch import IMAGE_EXTENSIONS, STATUS_ICONS, BatchRunner, build_analyzer
+from cv_journal import CheckpointJournal, file_sha256, text_sha256
+from cv_offer import DEFAULT_CACHE, OfferCompiler, completion_for
+from cv_scheduler import BULK
+
+OFFER_FILENAME = "offre.txt"
+DEFAULT_MANIFEST = "cv_watch_manifest.json"
+
+
+class WatchedFolder(NamedTuple):
+    path: Path
+    offer: str
+    mode: str = "two-step"
+
+
+class Candidate(NamedTuple):
+    folder: WatchedFolder
+    path: str
+    size: int
+    mtime: float
+
+
+def load_config(config_path: str) -> dict:
+    """Configuration JSON, offres résolues pour chaque dossier"""
+    config = json.loads(Path(config_path).read_text(encoding='utf-8'))
+    base = Path(config_path).parent
+    folders = []
+    for entry in config.get("folders", []):
+        folder = (base / entry["path"]).resolve()
+        if "offer" in entry:
+            offer = entry["offer"]
+        else:
+            offer_file = base / entry["offer_file"] if "offer_file" in entry else folder / OFFER_FILENAME
+            offer = offer_file.read_text(encoding='utf-8').strip()
+        folders.append(WatchedFolder(folder, offer, entry.get("mode", config.get("mode", "two-step"))))
+    config["folders"] = folders
+    return config
+
+
+class Manifest:
+    def __init__(self, path: str):
+        """Fichiers déjà vus : chemin -> taille, date, empreinte, offre, statut"""
+        self.path = Path(path)
+        self.entries: Dict[str, dict] = {}
+        if self.path.exists():
+            try:
+                self.entries = json.loads(self.path.read_text(encoding='utf-8'))
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"⚠️ Manifeste illisible, reconstruit ({e})")
+
+    def unchanged(self, path: str, size: int, mtime: float, offer_sha256: str) -> bool:
+        entry = self.entries.get(path)
+        return bool(entry and entry["size"] == size and entry["mtime"] == mtime
+                    and entry["offer_sha256"] == offer_sha256)
+
+    def update(self, path: str, **fields):
+        self.entries[path] = dict(self.entries.get(path, {}), **fields)
+
+    def save(self):
+        """Écriture atomique (fichier temporaire puis remplacement)"""
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        tmp.write_text(json.dumps(self.entries, indent=2, ensure_ascii=False), encoding='utf-8')
+        os.replace(tmp, self.path)
+
+
+class FolderWatcher:
+    def __init__(self, folders: List[WatchedFolder], manifest: Manifest, settle: float = 3.0):
+        """
+        Détection des fichiers nouveaux ou modifiés
+        settle : durée pendant laquelle un fichier doit rester identique avant d'être pris
+        """
+        self.folders = folders
+        self.manifest = manifest
+        self.settle = settle
+        self._offer_sha = {f.path: text_sha256(f.offer) for f in folders}
+        # Fichiers en cours d'écriture : chemin -> (taille, date, vu depuis)
+        self._pending: Dict[str, tuple] = {}
+
+    def scan(self) -> List[Candidate]:
+        """Fichiers stables, nouveaux ou modifiés depuis le dernier passage"""
+        now = time.time()
+        ready = []
+        for folder in self.folders:
+            try:
+                entries = list(os.scandir(folder.path))
+            except OSError as e:
+                print(f"⚠️ Dossier inaccessible {folder.path}: {e}")
+                continue
+            for entry in sorted(entries, key=lambda e: e.name):
+                if not entry.is_file() or Path(entry.name).suffix.lower() not in IMAGE_EXTENSIONS:
+                    continue
+                st = entry.stat()
+                path = str(Path(entry.path).resolve())
+                if self.manifest.unchanged(path, st.st_size, st.st_mtime, self._offer_sha[folder.path]):
+                    self._pending.pop(path, None)
+                    continue
+                signature = (st.st_size, st.st_mtime)
+                pending = self._pending.get(path)
+                if pending is None or pending[:2] != signature:
+                    # Nouveau ou encore en cours d'écriture : on attend qu'il se stabilise
+                    self._pending[path] = signature + (now,)
+                    if now - st.st_mtime < self.settle:
+                        continue
+                elif now - pending[2] < self.settle:
+                    continue
+                del self._pending[path]
+                ready.append(Candidate(folder, path, st.st_size, st.st_mtime))
+        return ready
+
+    def offer_sha256(self, folder: WatchedFolder) -> str:
+        return self._offer_sha[folder.path]
+
+
+class WatchDaemon:
+    def __init__(self, folders: List[WatchedFolder], journal: CheckpointJournal, manifest: Manifest,
+                 interval: float = 5.0, settle: float = 3.0, workers: int = 1,
+                 base_url: Optional[str] = None, priority: str = BULK, save: bool = True,
+                 offer_cache: Optional[str] = DEFAULT_CACHE):
+        """
+        Démon de surveillance
+        interval    : pause entre deux passages (s)
+        workers     : CV analysés en parallèle
+        offer_cache : profils d'offres compilés (None = offre brute dans les prompts)
+        """
+        self.watcher = FolderWatcher(folders, manifest, settle)
+        self.journal = journal
+        self.manifest = manifest
+        self.interval = interval
+        self.workers = max(1, workers)
+        self.base_url = base_url
+        self.priority = priority
+        self.save = save
+        self.offer_cache = offer_cache
+        self._analyzers: Dict[str, object] = {}
+        self._runners: Dict[tuple, BatchRunner] = {}
+        self._lock = threading.Lock()
+
+    def _runner(self, folder: WatchedFolder) -> BatchRunner:
+        """Un exécuteur par (mode, offre), analyseurs partagés entre dossiers"""
+        key = (folder.mode, folder.offer)
+        with self._lock:
+            if key not in self._runners:
+                if folder.mode not in self._analyzers:
+                    analyzer = build_analyzer(folder.mode, base_url=self.base_url, priority=self.priority)
+                    if not analyzer.check_connection():
+                        raise RuntimeError(f"Serveur modèle indisponible pour le mode {folder.mode}")
+                    self._analyzers[folder.mode] = analyzer
+                analyzer = self._analyzers[folder.mode]
+                prompt_offer = None
+                if self.offer_cache:
+                    compiler = OfferCompiler(completion_for(analyzer), self.offer_cache)
+                    prompt_offer = compiler.prompt_text(folder.offer)
+                self._runners[key] = BatchRunner({folder.mode: analyzer}, folder.mode, folder.offer,
+                                                 self.journal, save=self.save, prompt_offer=prompt_offer)
+            return self._runners[key]
+
+    def _handle(self, candidate: Candidate) -> str:
+        folder = candidate.folder
+        try:
+            image_sha256 = file_sha256(candidate.path)
+        except OSError as e:
+            print(f"❌ Lecture impossible {candidate.path}: {e}")
+            return "failed"
+        offer_sha256 = self.watcher.offer_sha256(folder)
+        previous = self.manifest.entries.get(candidate.path)
+        if (previous and previous.get("sha256") == image_sha256
+                and previous.get("offer_sha256") == offer_sha256 and previous.get("status") not in ("failed", "timeout")):
+            # Fichier touché mais contenu identique
+            status = "skipped"
+        else:
+            status = self._runner(folder).process(candidate.path, resume=True, image_sha256=image_sha256)
+        # Un échec n'est retenté que si le fichier change (ou après suppression de son entrée)
+        self.manifest.update(candidate.path, size=candidate.size, mtime=candidate.mtime,
+                             sha256=image_sha256, offer_sha256=offer_sha256, status=status,
+                             seen_at=time.strftime("%Y-%m-%dT%H:%M:%S"))
+        return status
+
+    def run_once(self) -> Dict[str, int]:
+        """Un passage : analyser tous les fichiers prêts"""
+        counts = {"done": 0, "skipped": 0, "failed": 0, "timeout": 0}
+        candidates = self.watcher.scan()
+        if not candidates:
+            return counts
+        print(f"📥 {len(candidates)} CV à traiter")
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for candidate, status in zip(candidates, pool.map(self._handle, candidates)):
+                counts[status] += 1
+                print(f"{STATUS_ICONS[status]} {candidate.path}")
+        self.manifest.save()
+        return counts
+
+    def run_forever(self):
+        print(f"👀 Surveillance de {len(self.watcher.folders)} dossier(s), passage toutes les {self.interval:.0f}s "
+              "(Ctrl+C pour arrêter)")
+        try:
+            while True:
+                try:
+                    self.run_once()
+                except RuntimeError as e:
+                    # Serveur modèle arrêté : les fichiers seront repris au prochain passage
+                    print(f"⚠️ {e}")
+                    self.manifest.save()
+                time.sleep(self.interval)
+        except KeyboardInterrupt:
+            print("\n🛑 Arrêt demandé")
+        finally:
+            self.manifest.save()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyse automatique des CV déposés dans des dossiers")
+    parser.add_argument("folder", nargs="?", help="dossier surveillé (sans --config)")
+    parser.add_argument("offer", nargs="?", help="offre d'emploi du dossier (sinon offre.txt)")
+    parser.add_argument("--config", help="configuration JSON (plusieurs dossiers)")
+    parser.add_argument("--mode", choices=("two-step", "oneshot", "ollama"), default="two-step")
+    parser.add_argument("--interval", type=float)
+    parser.add_argument("--settle", type=float, help="secondes de stabilité avant lecture d'un fichier")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--manifest", default=DEFAULT_MANIFEST)
+    parser.add_argument("--journal", default="cv_batch_journal.jsonl")
+    parser.add_argument("--priority", default=os.environ.get("CV_PRIORITY", BULK))
+    parser.add_argument("--base-url", default=os.environ.get("CV_BASE_URL"))
+    parser.add_argument("--no-save", action="store_true", help="ne pas écrire les fichiers par CV")
+    parser.add_argument("--once", action="store_true", help="un seul passage puis arrêt")
+    parser.add_argument("--raw-offer", action="store_true",
+                        help="offre brute dans chaque prompt (sans profil compilé)")
+    args = parser.parse_args()
+
+    if args.config:
+        config = load_config(args.config)
+    elif args.folder:
+        folder = Path(args.folder).resolve()
+        offer = args.offer or (folder / OFFER_FILENAME).read_text(encoding='utf-8').strip()
+        config = {"folders": [WatchedFolder(folder, offer, args.mode)]}
+    else:
+        parser.error("indiquer un dossier ou --config")
+    if not config["folders"]:
+        parser.error("aucun dossier à surveiller")
+
+    interval = args.interval if args.interval is not None else config.get("interval", 5.0)
+    settle = args.settle if args.settle is not None else config.get("settle", 0.0 if args.once else 3.0)
+
+    with CheckpointJournal(args.journal) as journal:
+        daemon = WatchDaemon(config["folders"], journal, Manifest(args.manifest), interval=interval,
+                             settle=settle, workers=args.workers, base_url=args.base_url,
+                             priority=args.priority, save=not args.no_save,
+                             offer_cache=None if args.raw_offer else DEFAULT_CACHE)
+        try:
+            if args.once:
+                counts = daemon.run_once()
+                print(f"📊 {counts['done']} analysés, {counts['skipped']} déjà faits, {counts['failed']} échecs, "
+                      f"{counts['timeout']} hors délai")
+            else:
+                daemon.run_forever()
+        except RuntimeError as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,440 @@
+#!/usr/bin/env python3
+"""
+🛰️ FILE DE TRAVAIL PARTAGÉE ENTRE PLUSIEURS POSTES
+
+Chaque poste a son GPU et son LM Studio (ou Ollama) : au lieu de répartir
+les dossiers de CV à la main, tous les postes puisent dans une même file
+SQLite posée sur un partage réseau (ou un disque local pour plusieurs
+GPU d'une même machine).
+
+- add    : inscrire des CV (et l'offre) dans la file
+- work   : un poste réclame des CV un par un, les analyse avec les
+           analyseurs habituels (BatchRunner, journal local de reprise) et
+           écrit le résultat dans la file
+- status : avancement, postes actifs, baux expirés
+- report : rapport CSV / JSONL et classement à partir des résultats centralisés
+
+Réclamation avec bail : un CV réclamé porte le nom du poste et une date
+d'expiration, prolongée par un battement de cœur tant que le poste
+travaille. Un poste planté cesse de battre : à l'expiration du bail, ses
+CV redeviennent disponibles pour les autres. Un CV qui a épuisé ses
+tentatives (il fait tomber les postes, par exemple) passe en échec.
+
+Les chemins des CV situés sous le dossier de la file sont enregistrés
+relativement à celui-ci : chaque poste peut monter le partage ailleurs.
+
+SQLite sur partage réseau : mode de journal DELETE (verrous de fichier),
+le mode WAL exige que tous les processus soient sur la même machine
+(--wal pour plusieurs GPU d'un seul poste). Les baux comparent les
+horloges des postes : garder des baux longs devant leur décalage.
+
+Usage:
+python cv_workqueue.py add //nas/cv/file.db //nas/cv/mars/ "Développeur Python Junior"
+python cv_workqueue.py work //nas/cv/file.db --workers 2 --mode oneshot
+python cv_workqueue.py status //nas/cv/file.db
+python cv_workqueue.py report //nas/cv/file.db --report resultats_mars
+"""
+import argparse
+import json
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional
+
+from cv_batch import MODES, STATUS_ICONS, BatchRunner, build_analyzer, collect_images
+from cv_journal import CheckpointJournal, entry_key, file_sha256, text_sha256
+from cv_offer import DEFAULT_CACHE, OfferCompiler, completion_for
+from cv_report import ReportWriter
+from cv_scheduler import BULK
+
+PENDING = "pending"
+CLAIMED = "claimed"
+DONE = "done"
+FAILED = "failed"
+
+DEFAULT_LEASE = 300.0
+# Tentatives d'un CV avant échec définitif (baux expirés compris)
+MAX_ATTEMPTS = 3
+# Attente des verrous SQLite (partage réseau lent, plusieurs postes)
+BUSY_TIMEOUT_MS = 30_000
+POLL_SECONDS = 5.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS offers (
+    offer_sha256 TEXT PRIMARY KEY,
+    job_offer TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS jobs (
+    key TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    image_sha256 TEXT NOT NULL,
+    offer_sha256 TEXT NOT NULL REFERENCES offers(offer_sha256),
+    state TEXT NOT NULL,
+    worker TEXT,
+    lease_until REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    mode TEXT,
+    analysis TEXT,
+    reason TEXT,
+    updated_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs(state, lease_until);
+CREATE TABLE IF NOT EXISTS workers (
+    worker TEXT PRIMARY KEY,
+    heartbeat REAL,
+    done INTEGER NOT NULL DEFAULT 0,
+    failed INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+
+class QueueJob(NamedTuple):
+    key: str
+    path: str
+    image_sha256: str
+    offer_sha256: str
+    attempts: int
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class WorkQueue:
+    def __init__(self, path: str, lease: float = DEFAULT_LEASE, max_attempts: int = MAX_ATTEMPTS,
+                 wal: bool = False):
+        """
+        File SQLite partagée
+        lease        : durée d'un bail (s), prolongée par heartbeat()
+        max_attempts : réclamations d'un CV avant échec définitif
+        wal          : mode WAL (tous les processus sur la même machine uniquement)
+        """
+        self.path = Path(path)
+        self.root = self.path.resolve().parent
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.wal = wal
+        self._local = threading.local()
+        # executescript valide lui-même chaque instruction
+        self._db().executescript(SCHEMA)
+
+    def _db(self) -> sqlite3.Connection:
+        # Une connexion par thread (sqlite3 ne partage pas les connexions entre threads)
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(str(self.path), timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None)
+            db.row_factory = sqlite3.Row
+            db.execute(f"PRAGMA journal_mode={'WAL' if self.wal else 'DELETE'}")
+            db.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+            self._local.db = db
+        return db
+
+    @contextmanager
+    def _transaction(self):
+        """Transaction en écriture (BEGIN IMMEDIATE : verrou pris d'emblée, pas d'interblocage)"""
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            yield db
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+
+    # ---------------------- Chemins ----------------------
+    def _stored_path(self, path: str) -> str:
+        """Chemin relatif au dossier de la file si possible (partage monté ailleurs sur chaque poste)"""
+        resolved = Path(path).resolve()
+        try:
+            return resolved.relative_to(self.root).as_posix()
+        except ValueError:
+            return str(resolved)
+
+    def local_path(self, stored: str) -> str:
+        p = Path(stored)
+        return str(p if p.is_absolute() else self.root / p)
+
+    # ---------------------- Inscription ----------------------
+    def add(self, paths: List[str], job_offer: str) -> int:
+        """Inscrire des CV pour une offre, renvoie le nombre de CV nouveaux"""
+        offer_sha256 = text_sha256(job_offer)
+        rows = []
+        for path in paths:
+            try:
+                image_sha256 = file_sha256(path)
+            except OSError as e:
+                print(f"⚠️ Ignoré ({e}): {path}")
+                continue
+            rows.append((entry_key(image_sha256, offer_sha256), self._stored_path(path), image_sha256,
+                         offer_sha256, PENDING, time.time()))
+        with self._transaction() as db:
+            db.execute("INSERT OR IGNORE INTO offers (offer_sha256, job_offer) VALUES (?, ?)",
+                       (offer_sha256, job_offer))
+            before = db.total_changes
+            db.executemany("INSERT OR IGNORE INTO jobs (key, path, image_sha256, offer_sha256, state, updated_at) "
+                           "VALUES (?, ?, ?, ?, ?, ?)", rows)
+            return db.total_changes - before
+
+    def offer(self, offer_sha256: str) -> Optional[str]:
+        row = self._db().execute("SELECT job_offer FROM offers WHERE offer_sha256 = ?",
+                                 (offer_sha256,)).fetchone()
+        return row["job_offer"] if row else None
+
+    # ---------------------- Réclamation ----------------------
+    def claim(self, worker: str) -> Optional[QueueJob]:
+        """Réclamer un CV libre ou dont le bail a expiré, None si rien à faire"""
+        now = time.time()
+        with self._transaction() as db:
+            while True:
+                row = db.execute(
+                    "SELECT key, path, image_sha256, offer_sha256, attempts, state FROM jobs "
+                    "WHERE state = ? OR (state = ? AND lease_until < ?) ORDER BY attempts, rowid LIMIT 1",
+                    (PENDING, CLAIMED, now)).fetchone()
+                if row is None:
+                    return None
+                if row["attempts"] >= self.max_attempts:
+                    # Bail expiré à chaque tentative : le CV fait sans doute tomber les postes
+                    db.execute("UPDATE jobs SET state = ?, reason = ?, worker = NULL, updated_at = ? WHERE key = ?",
+                               (FAILED, f"abandonné après {row['attempts']} tentatives", now, row["key"]))
+                    continue
+                if row["state"] == CLAIMED:
+                    print(f"♻️ Bail expiré repris: {row['path']}")
+                db.execute("UPDATE jobs SET state = ?, worker = ?, lease_until = ?, attempts = attempts + 1, "
+                           "updated_at = ? WHERE key = ?", (CLAIMED, worker, now + self.lease, now, row["key"]))
+                return QueueJob(row["key"], self.local_path(row["path"]), row["image_sha256"],
+                                row["offer_sha256"], row["attempts"] + 1)
+
+    def heartbeat(self, worker: str) -> int:
+        """Prolonger les baux du poste, renvoie le nombre de CV en cours"""
+        now = time.time()
+        with self._transaction() as db:
+            db.execute("INSERT INTO workers (worker, heartbeat) VALUES (?, ?) "
+                       "ON CONFLICT(worker) DO UPDATE SET heartbeat = excluded.heartbeat", (worker, now))
+            return db.execute("UPDATE jobs SET lease_until = ? WHERE worker = ? AND state = ?",
+                              (now + self.lease, worker, CLAIMED)).rowcount
+
+    def complete(self, key: str, worker: str, analysis: dict, mode: str = ""):
+        """Résultat central d'un CV (le premier résultat reçu est gardé)"""
+        with self._transaction() as db:
+            db.execute("UPDATE jobs SET state = ?, analysis = ?, mode = ?, worker = ?, reason = NULL, "
+                       "updated_at = ? WHERE key = ? AND state != ?",
+                       (DONE, json.dumps(analysis, ensure_ascii=False), mode, worker, time.time(), key, DONE))
+            db.execute("UPDATE workers SET done = done + 1 WHERE worker = ?", (worker,))
+
+    def fail(self, key: str, worker: str, reason: str, retry: bool = False):
+        """Échec d'un CV ; retry : remis en file tant qu'il reste des tentatives (échéance dépassée)"""
+        with self._transaction() as db:
+            db.execute("UPDATE jobs SET state = CASE WHEN ? AND attempts < ? THEN ? ELSE ? END, reason = ?, "
+                       "worker = NULL, lease_until = NULL, updated_at = ? WHERE key = ? AND worker = ? AND state = ?",
+                       (retry, self.max_attempts, PENDING, FAILED, reason, time.time(), key, worker, CLAIMED))
+            db.execute("UPDATE workers SET failed = failed + 1 WHERE worker = ?", (worker,))
+
+    def release(self, worker: str) -> int:
+        """Rendre les CV en cours du poste (arrêt propre), renvoie leur nombre"""
+        with self._transaction() as db:
+            return db.execute("UPDATE jobs SET state = ?, worker = NULL, lease_until = NULL, "
+                              "attempts = MAX(attempts - 1, 0) WHERE worker = ? AND state = ?",
+                              (PENDING, worker, CLAIMED)).rowcount
+
+    # ---------------------- Suivi ----------------------
+    def counts(self) -> Dict[str, int]:
+        counts = {PENDING: 0, CLAIMED: 0, DONE: 0, FAILED: 0}
+        rows = self._db().execute("SELECT state, COUNT(*) AS n FROM jobs GROUP BY state").fetchall()
+        counts.update({row["state"]: row["n"] for row in rows})
+        return counts
+
+    def idle(self) -> bool:
+        """Plus rien à réclamer ni en cours ailleurs"""
+        counts = self.counts()
+        return counts[PENDING] == 0 and counts[CLAIMED] == 0
+
+    def status(self) -> str:
+        now = time.time()
+        counts = self.counts()
+        expired = self._db().execute("SELECT COUNT(*) FROM jobs WHERE state = ? AND lease_until < ?",
+                                     (CLAIMED, now)).fetchone()[0]
+        lines = [f"🛰️ {self.path}: {counts[DONE]} analysés, {counts[CLAIMED]} en cours"
+                 f"{f' (dont {expired} bail expiré)' if expired else ''}, {counts[PENDING]} en attente, "
+                 f"{counts[FAILED]} échecs"]
+        for row in self._db().execute("SELECT * FROM workers ORDER BY heartbeat DESC"):
+            age = now - (row["heartbeat"] or 0)
+            icon = "🟢" if age < self.lease else "⚪"
+            lines.append(f"  {icon} {row['worker']:<32} {row['done']:>5} analysés {row['failed']:>4} échecs "
+                         f"(vu il y a {age:.0f}s)")
+        for row in self._db().execute("SELECT path, reason FROM jobs WHERE state = ? LIMIT 10", (FAILED,)):
+            lines.append(f"  ❌ {row['path']}: {row['reason']}")
+        return "\n".join(lines)
+
+    def results(self):
+        """(chemin, mode, analyse) des CV terminés"""
+        for row in self._db().execute("SELECT path, mode, analysis FROM jobs WHERE state = ? ORDER BY rowid",
+                                      (DONE,)):
+            yield row["path"], row["mode"] or "", json.loads(row["analysis"])
+
+
+class QueueWorker:
+    def __init__(self, queue: WorkQueue, journal: CheckpointJournal, mode: str = "two-step",
+                 workers: int = 1, worker_id: Optional[str] = None, base_url: Optional[str] = None,
+                 priority: str = BULK, save: bool = False, offer_cache: Optional[str] = DEFAULT_CACHE):
+        """
+        Poste de travail : réclame des CV dans la file et les analyse localement
+        journal     : journal local de reprise (texte OCR déjà obtenu, analyses faites)
+        workers     : CV analysés en parallèle sur ce poste
+        offer_cache : profils d'offres compilés (None = offre brute dans les prompts)
+        """
+        self.queue = queue
+        self.journal = journal
+        self.mode = mode
+        self.workers = max(1, workers)
+        self.worker_id = worker_id or default_worker_id()
+        self.base_url = base_url
+        self.priority = priority
+        self.save = save
+        self.offer_cache = offer_cache
+        self.analyzer = None
+        self._runners: Dict[str, BatchRunner] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self.counts = {"done": 0, "skipped": 0, "failed": 0, "timeout": 0}
+
+    def _runner(self, offer_sha256: str) -> BatchRunner:
+        """Un exécuteur par offre, même analyseur (le serveur modèle local)"""
+        with self._lock:
+            if offer_sha256 not in self._runners:
+                job_offer = self.queue.offer(offer_sha256)
+                prompt_offer = None
+                if self.offer_cache:
+                    prompt_offer = OfferCompiler(completion_for(self.analyzer), self.offer_cache).prompt_text(job_offer)
+                self._runners[offer_sha256] = BatchRunner({self.mode: self.analyzer}, self.mode, job_offer,
+                                                          self.journal, save=self.save, prompt_offer=prompt_offer)
+            return self._runners[offer_sha256]
+
+    def _handle(self, job: QueueJob) -> str:
+        status = self._runner(job.offer_sha256).process(job.path, resume=True, image_sha256=job.image_sha256)
+        entry = self.journal.get(job.key) or {}
+        if status in ("done", "skipped") and entry.get("analysis") is not None:
+            self.queue.complete(job.key, self.worker_id, entry["analysis"], entry.get("mode") or self.mode)
+        else:
+            # Échéance dépassée : un autre passage (ou un autre poste) peut réussir
+            self.queue.fail(job.key, self.worker_id, entry.get("reason") or status, retry=status == "timeout")
+        return status
+
+    def _loop(self):
+        while not self._stop.is_set():
+            job = self.queue.claim(self.worker_id)
+            if job is None:
+                if self.queue.idle():
+                    return
+                # CV encore réclamés ailleurs : attendre leur fin ou l'expiration de leur bail
+                self._stop.wait(POLL_SECONDS)
+                continue
+            try:
+                status = self._handle(job)
+            except Exception as e:
+                # Un CV qui plante ne doit pas emporter le worker : rendu à la file tant qu'il reste des tentatives
+                self.queue.fail(job.key, self.worker_id, f"{type(e).__name__}: {e}", retry=True)
+                status = "failed"
+            with self._lock:
+                self.counts[status] += 1
+            print(f"{STATUS_ICONS[status]} {job.path}" + (f" (tentative {job.attempts})" if job.attempts > 1 else ""))
+
+    def _heartbeat(self):
+        while not self._stop.wait(self.queue.lease / 3):
+            try:
+                self.queue.heartbeat(self.worker_id)
+            except sqlite3.Error as e:
+                # Partage momentanément indisponible : le bail laisse de la marge
+                print(f"⚠️ Battement de cœur impossible: {e}")
+
+    def run(self) -> dict:
+        print(f"🛰️ Poste {self.worker_id}: {self.workers} worker(s), mode {self.mode}, file {self.queue.path}")
+        # Vérifié une seule fois, avant les threads : un serveur absent arrête le poste proprement
+        self.analyzer = build_analyzer(self.mode, base_url=self.base_url, priority=self.priority)
+        if not self.analyzer.check_connection():
+            raise RuntimeError(f"Serveur modèle indisponible pour le mode {self.mode}")
+        self.queue.heartbeat(self.worker_id)
+        beat = threading.Thread(target=self._heartbeat, daemon=True, name="heartbeat")
+        beat.start()
+        threads = [threading.Thread(target=self._loop, name=f"queue-{i}") for i in range(self.workers)]
+        try:
+            for t in threads:
+                t.start()
+            for t in threads:
+                while t.is_alive():
+                    t.join(timeout=1.0)
+        except KeyboardInterrupt:
+            print("\n🛑 Arrêt demandé, CV en cours rendus à la file")
+        finally:
+            self._stop.set()
+            released = self.queue.release(self.worker_id)
+            if released:
+                print(f"↩️ {released} CV rendu(s) à la file")
+        print(f"📊 Poste: {self.counts['done']} analysés, {self.counts['skipped']} déjà faits, "
+              f"{self.counts['failed']} échecs, {self.counts['timeout']} hors délai")
+        return self.counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="File de travail partagée entre plusieurs postes")
+    sub = parser.add_subparsers(dest="command", required=True)
+    add = sub.add_parser("add", help="inscrire des CV dans la file")
+    add.add_argument("queue")
+    add.add_argument("inputs", nargs="+", help="images ou dossiers, puis l'offre d'emploi")
+    work = sub.add_parser("work", help="analyser les CV de la file sur ce poste")
+    work.add_argument("queue")
+    work.add_argument("--mode", choices=[m for m in MODES if m != "auto"], default="two-step")
+    work.add_argument("--workers", type=int, default=1)
+    work.add_argument("--worker-id", help="nom du poste (défaut : machine-pid)")
+    work.add_argument("--journal", default="cv_queue_journal.jsonl", help="journal local de reprise")
+    work.add_argument("--base-url", default=os.environ.get("CV_BASE_URL"))
+    work.add_argument("--priority", default=os.environ.get("CV_PRIORITY", BULK))
+    work.add_argument("--save", action="store_true", help="écrire aussi les fichiers par CV sur ce poste")
+    work.add_argument("--raw-offer", action="store_true", help="offre brute dans chaque prompt")
+    status = sub.add_parser("status", help="avancement de la file")
+    status.add_argument("queue")
+    report = sub.add_parser("report", help="rapport à partir des résultats de la file")
+    report.add_argument("queue")
+    report.add_argument("--report", default="cv_queue_report", help="préfixe des rapports .csv et .jsonl")
+    report.add_argument("--top", type=int, default=10)
+    for p in (add, work, status, report):
+        p.add_argument("--lease", type=float, default=DEFAULT_LEASE, help="durée d'un bail (s)")
+        p.add_argument("--wal", action="store_true", help="mode WAL (file sur disque local uniquement)")
+    args = parser.parse_args()
+
+    queue = WorkQueue(args.queue, lease=args.lease, wal=args.wal)
+    if args.command == "add":
+        if len(args.inputs) < 2:
+            parser.error("il faut au moins une image/un dossier et l'offre d'emploi")
+        *inputs, job_offer = args.inputs
+        paths = collect_images(inputs)
+        print(f"📥 {queue.add(paths, job_offer)} CV ajoutés sur {len(paths)}")
+        print(queue.status())
+    elif args.command == "work":
+        with CheckpointJournal(args.journal) as journal:
+            worker = QueueWorker(queue, journal, mode=args.mode, workers=args.workers, worker_id=args.worker_id,
+                                 base_url=args.base_url, priority=args.priority, save=args.save,
+                                 offer_cache=None if args.raw_offer else DEFAULT_CACHE)
+            try:
+                counts = worker.run()
+            except RuntimeError as e:
+                print(f"❌ {e}")
+                sys.exit(1)
+        print(queue.status())
+        sys.exit(1 if counts["failed"] else 0)
+    elif args.command == "status":
+        print(queue.status())
+    else:
+        with ReportWriter(f"{args.report}.csv", f"{args.report}.jsonl", top_k=args.top, live=0) as reporter:
+            for path, mode, analysis in queue.results():
+                reporter.add(path, analysis, mode=mode)
+            print(reporter.leaderboard.render())
+            print(f"📄 Rapport: {', '.join(reporter.paths)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+from cv_journal import ANALYSIS_DONE, OCR_DONE, CheckpointJournal
+
+
+def test_record_after_truncated_tail_survives_reload(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    with CheckpointJournal(path) as journal:
+        journal.record("k1", ANALYSIS_DONE)
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write('{"ts": "2026-01-01T00:00:00", "key": "k2", "sta')
+
+    with CheckpointJournal(path) as journal:
+        assert journal.get("k2") is None
+        journal.record("k3", OCR_DONE, ocr_text="texte")
+
+    with CheckpointJournal(path) as journal:
+        assert journal.get("k1")["state"] == ANALYSIS_DONE
+        assert journal.get("k3")["ocr_text"] == "texte"
+
+
+def test_valid_unterminated_tail_is_kept(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    path.write_text('{"key": "k1", "state": "queued"}', encoding='utf-8')
+
+    with CheckpointJournal(path) as journal:
+        journal.record("k2", OCR_DONE)
+
+    with CheckpointJournal(path) as journal:
+        assert journal.get("k1")["state"] == "queued"
+        assert journal.get("k2")["state"] == OCR_DONE